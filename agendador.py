@@ -0,0 +1,191 @@
+# agendador.py
+"""
+Agenda dos prazos das assinaturas, usada pela checagem no lugar do loop fixo.
+
+Cada assinatura ATIVA gera até três eventos: lembrete de 3 dias, lembrete do dia
+da expiração e remoção (dia seguinte à expiração). Os eventos ficam num min-heap
+por horário; a checagem dorme até o próximo prazo e processa só os usuários
+cujos eventos venceram.
+
+Renovações e mudanças de status não mexem no heap: o usuário ganha uma versão
+nova e as entradas antigas são descartadas quando chegam ao topo (e o heap é
+compactado quando as entradas obsoletas passam da metade).
+"""
+import datetime
+import heapq
+import itertools
+import logging
+import threading
+
+import database
+
+# Horário do dia em que os eventos vencem
+HORA_EVENTOS = datetime.time(9, 0)
+DIAS_AVISO = 3
+
+AVISO_3_DIAS = "AVISO_3_DIAS"
+AVISO_HOJE = "AVISO_HOJE"
+REMOCAO = "REMOCAO"
+
+logger = logging.getLogger(__name__)
+
+class AgendaAssinaturas:
+    """
+    Min-heap de eventos (quando, seq, user_id, versão, tipo), seguro entre threads:
+    as escritas do database.py notificam a agenda a partir do executor do banco.
+    """
+
+    def __init__(self, dias_aviso: int = DIAS_AVISO, hora: datetime.time = HORA_EVENTOS, ao_mudar=None):
+        self.dias_aviso = dias_aviso
+        self.hora = hora
+        self.ao_mudar = ao_mudar
+        self._lock = threading.Lock()
+        self._heap = []
+        self._seq = itertools.count()
+        self._versoes = {}     # user_id -> versão válida
+        self._pendentes = {}   # user_id -> eventos válidos ainda no heap
+        self._obsoletos = 0
+        self._durante_reconstrucao = None
+
+    def eventos_de(self, data_expiracao: datetime.date) -> list:
+        """[(quando, tipo)] dos eventos de uma assinatura que expira na data informada"""
+        def no_dia(dia):
+            return datetime.datetime.combine(dia, self.hora)
+        return [
+            (no_dia(data_expiracao - datetime.timedelta(days=self.dias_aviso)), AVISO_3_DIAS),
+            (no_dia(data_expiracao), AVISO_HOJE),
+            (no_dia(data_expiracao + datetime.timedelta(days=1)), REMOCAO),
+        ]
+
+    def _invalidar(self, user_id: int):
+        self._versoes[user_id] = self._versoes.get(user_id, 0) + 1
+        self._obsoletos += self._pendentes.pop(user_id, 0)
+
+    def _agendar(self, user_id: int, data_expiracao: datetime.date, agora: datetime.datetime):
+        self._invalidar(user_id)
+        versao = self._versoes[user_id]
+        quantidade = 0
+        for quando, tipo in self.eventos_de(data_expiracao):
+            if quando <= agora:
+                # Prazo que já passou: só vale se ainda é o dia dele (ou se é a remoção)
+                if tipo != REMOCAO and quando.date() != agora.date():
+                    continue
+                quando = agora
+            heapq.heappush(self._heap, (quando, next(self._seq), user_id, versao, tipo))
+            quantidade += 1
+        if quantidade:
+            self._pendentes[user_id] = quantidade
+
+    def _compactar_se_preciso(self):
+        if self._obsoletos > 1000 and self._obsoletos * 2 > len(self._heap):
+            self._heap = [e for e in self._heap if self._versoes.get(e[2]) == e[3]]
+            heapq.heapify(self._heap)
+            self._obsoletos = 0
+
+    def _avisar(self):
+        if self.ao_mudar is not None:
+            try:
+                self.ao_mudar()
+            except Exception as e:
+                logger.debug(f"Falha ao avisar mudança na agenda: {e}")
+
+    def agendar(self, user_id: int, data_expiracao, agora: datetime.datetime = None):
+        """(Re)agenda os eventos do usuário para a data de expiração (date ou datetime)"""
+        if isinstance(data_expiracao, datetime.datetime):
+            data_expiracao = data_expiracao.date()
+        agora = agora or datetime.datetime.now()
+        with self._lock:
+            if self._durante_reconstrucao is not None:
+                self._durante_reconstrucao[user_id] = data_expiracao
+            self._agendar(user_id, data_expiracao, agora)
+            self._compactar_se_preciso()
+        self._avisar()
+
+    def cancelar(self, user_id: int):
+        """Descarta os eventos pendentes do usuário (assinatura encerrada)"""
+        with self._lock:
+            if self._durante_reconstrucao is not None:
+                self._durante_reconstrucao[user_id] = None
+            self._invalidar(user_id)
+            self._compactar_se_preciso()
+
+    def atualizar(self, user_id: int, data_expiracao=None, status: str = None):
+        """Ouvinte das escritas do banco: nova data reagenda, status diferente de ATIVA cancela"""
+        if status is not None and status != "ATIVA":
+            self.cancelar(user_id)
+        elif data_expiracao is not None:
+            self.agendar(user_id, data_expiracao)
+
+    def proximo_prazo(self):
+        """Horário do próximo evento válido (None se a agenda está vazia)"""
+        with self._lock:
+            while self._heap:
+                quando, _, user_id, versao, _ = self._heap[0]
+                if self._versoes.get(user_id) == versao:
+                    return quando
+                heapq.heappop(self._heap)
+                self._obsoletos -= 1
+            return None
+
+    def retirar_vencidos(self, agora: datetime.datetime = None) -> list:
+        """Remove e retorna [(quando, tipo, user_id)] dos eventos válidos com prazo até agora"""
+        agora = agora or datetime.datetime.now()
+        vencidos = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= agora:
+                quando, _, user_id, versao, tipo = heapq.heappop(self._heap)
+                if self._versoes.get(user_id) != versao:
+                    self._obsoletos -= 1
+                    continue
+                restantes = self._pendentes.get(user_id, 0) - 1
+                if restantes > 0:
+                    self._pendentes[user_id] = restantes
+                else:
+                    self._pendentes.pop(user_id, None)
+                vencidos.append((quando, tipo, user_id))
+        return vencidos
+
+    def reconstruir(self, assinaturas, agora: datetime.datetime = None) -> int:
+        """
+        Monta a agenda do zero a partir de registros Assinatura ATIVOS (pode ser um gerador).
+        Mudanças que chegarem enquanto os registros são lidos são reaplicadas no fim.
+        Retorna quantos eventos ficaram agendados.
+        """
+        agora = agora or datetime.datetime.now()
+        with self._lock:
+            self._durante_reconstrucao = {}
+
+        nova = AgendaAssinaturas(self.dias_aviso, self.hora)
+        try:
+            for assinatura in assinaturas:
+                if assinatura.data_expiracao is None or assinatura.status != "ATIVA":
+                    continue
+                nova._agendar(assinatura.user_id, assinatura.data_expiracao.date(), agora)
+        finally:
+            with self._lock:
+                mudancas, self._durante_reconstrucao = self._durante_reconstrucao, None
+
+        with self._lock:
+            for user_id, data_expiracao in mudancas.items():
+                if data_expiracao is None:
+                    nova._invalidar(user_id)
+                else:
+                    nova._agendar(user_id, data_expiracao, agora)
+            self._heap = nova._heap
+            self._versoes = nova._versoes
+            self._pendentes = nova._pendentes
+            self._obsoletos = nova._obsoletos
+            self._seq = nova._seq
+            total = len(self._heap) - self._obsoletos
+        self._avisar()
+        return total
+
+    def __len__(self):
+        with self._lock:
+            return len(self._heap) - self._obsoletos
+
+def reconstruir_do_banco(agenda: AgendaAssinaturas) -> int:
+    """Lê as assinaturas ATIVAS em streaming e reconstrói a agenda (roda no executor do banco)"""
+    total = agenda.reconstruir(database.iterar_assinaturas(status="ATIVA", como_registro=True))
+    logger.info(f"Agenda de assinaturas reconstruída: {total} eventos")
+    return total
@@ -0,0 +1,104 @@
+# apelidos.py
+"""
+Data de expiração escrita no apelido ("Nome | dd/mm/aaaa").
+
+O índice guarda, por membro, o último apelido visto e a data já extraída dele:
+a chave efetiva é (member.id, nick), então um apelido novo invalida sozinho a
+entrada antiga. A checagem, a migração e o utils.py usam o mesmo índice, e o
+on_member_update da cog o mantém em dia. A data é lida com um parser próprio
+(posições fixas), sem regex nem strptime por membro.
+"""
+import datetime
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+SEPARADOR = " | "
+FORMATO_DATA = "%d/%m/%Y"
+# Sufixo " | dd/mm/aaaa" do apelido (para trocar a data mantendo o nome)
+PADRAO_SUFIXO_DATA = re.compile(r"\s*\|\s*\d{2}/\d{2}/\d{4}$")
+
+_DIGITOS = frozenset("0123456789")
+
+def parse_data(data_str: str):
+    """'dd/mm/aaaa' -> date; None se o texto não estiver no formato ou a data não existir"""
+    if (
+        len(data_str) != 10
+        or data_str[2] != "/"
+        or data_str[5] != "/"
+        or not _DIGITOS.issuperset(data_str[:2] + data_str[3:5] + data_str[6:])
+    ):
+        return None
+    try:
+        return datetime.date(int(data_str[6:]), int(data_str[3:5]), int(data_str[:2]))
+    except ValueError:
+        return None
+
+def extrair_data(nick):
+    """
+    (data_str, date) do apelido no formato "Nome | dd/mm/aaaa", ou None.
+    Mesma regra que a checagem sempre usou: o trecho depois do primeiro "|".
+    """
+    if not nick or SEPARADOR not in nick:
+        return None
+    data_str = nick.split("|", 2)[1].strip()
+    data = parse_data(data_str)
+    if data is None:
+        return None
+    return data_str, data
+
+def limpar_apelido(nome: str) -> str:
+    """Nome sem o sufixo " | dd/mm/aaaa" """
+    return PADRAO_SUFIXO_DATA.sub("", nome).strip()
+
+def apelido_com_data(nome: str, data) -> str:
+    """Apelido com a nova data no lugar da antiga"""
+    return f"{limpar_apelido(nome)}{SEPARADOR}{data.strftime(FORMATO_DATA)}"
+
+class IndiceApelidos:
+    """Cache (member.id, nick) -> (data_str, date) ou None, uma entrada por membro"""
+
+    def __init__(self):
+        self._entradas = {}  # user_id -> (nick, resultado)
+        self.acertos = 0
+        self.falhas = 0
+
+    def data_de(self, user_id: int, nick):
+        """Data do apelido do membro, extraída só quando o apelido muda"""
+        entrada = self._entradas.get(user_id)
+        if entrada is not None and entrada[0] == nick:
+            self.acertos += 1
+            return entrada[1]
+        self.falhas += 1
+        resultado = extrair_data(nick)
+        if resultado is None and nick and SEPARADOR in nick:
+            logger.debug(f"Apelido sem data válida: {nick}")
+        self._entradas[user_id] = (nick, resultado)
+        return resultado
+
+    def data_do_membro(self, member):
+        return self.data_de(member.id, member.nick)
+
+    def atualizar(self, user_id: int, nick):
+        """Apelido mudou (evento do Discord ou edição feita pelo bot)"""
+        entrada = self._entradas.get(user_id)
+        if entrada is None or entrada[0] != nick:
+            self._entradas[user_id] = (nick, extrair_data(nick))
+
+    def esquecer(self, user_id: int):
+        self._entradas.pop(user_id, None)
+
+    def limpar(self):
+        self._entradas.clear()
+
+    def estatisticas(self) -> dict:
+        total = self.acertos + self.falhas
+        return {
+            'tamanho': len(self._entradas),
+            'acertos': self.acertos,
+            'falhas': self.falhas,
+            'taxa_acerto': (self.acertos / total) if total else 0.0,
+        }
+
+indice = IndiceApelidos()
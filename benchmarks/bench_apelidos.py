@@ -0,0 +1,75 @@
+# benchmarks/bench_apelidos.py
+"""
+Extração da data do apelido de 100k membros: regra antiga (split + re.match +
+strptime por membro) contra o índice de apelidos frio (primeira varredura) e
+quente (varreduras seguintes, apelidos inalterados).
+
+Uso: python benchmarks/bench_apelidos.py [quantidade_de_membros]
+"""
+import datetime
+import os
+import random
+import re
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import apelidos
+
+
+def extrair_antigo(nick):
+    """Mesmo código que a checagem e a migração tinham antes do índice"""
+    if not nick or " | " not in nick:
+        return None
+    partes = nick.split("|")
+    if len(partes) < 2:
+        return None
+    data_str = partes[1].strip()
+    if not re.match(r"\d{2}/\d{2}/\d{4}$", data_str):
+        return None
+    try:
+        return data_str, datetime.datetime.strptime(data_str, "%d/%m/%Y").date()
+    except ValueError:
+        return None
+
+
+def medir(nome, funcao, membros):
+    inicio = time.perf_counter()
+    encontrados = sum(1 for user_id, nick in membros if funcao(user_id, nick) is not None)
+    duracao = time.perf_counter() - inicio
+    print(f"{nome:<28} {duracao * 1000:8.1f} ms  ({encontrados} com data)")
+    return duracao
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    random.seed(7)
+    hoje = datetime.date.today()
+    membros = []
+    for i in range(quantidade):
+        sorteio = random.random()
+        if sorteio < 0.7:
+            data = hoje + datetime.timedelta(days=random.randint(-30, 60))
+            nick = f"user{i} | {data.strftime('%d/%m/%Y')}"
+        elif sorteio < 0.8:
+            nick = f"user{i} | 31/02/2025"
+        else:
+            nick = None if sorteio < 0.9 else f"user{i}"
+        membros.append((100_000 + i, nick))
+
+    print(f"{quantidade} apelidos\n")
+    antigo = medir("antigo (regex + strptime)", lambda _id, nick: extrair_antigo(nick), membros)
+    sem_cache = medir("parser próprio, sem cache", lambda _id, nick: apelidos.extrair_data(nick), membros)
+    indice = apelidos.IndiceApelidos()
+    frio = medir("índice frio", indice.data_de, membros)
+    quente = medir("índice quente", indice.data_de, membros)
+    print()
+    print(f"parser próprio: {antigo / sem_cache:.1f}x | índice quente: {antigo / quente:.1f}x "
+          f"(frio: {antigo / frio:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# benchmarks/bench_calendario.py
+"""
+Coorte de um dia ("quem vence em 3 dias") com 200k assinaturas: varredura com
+função de data sobre a coluna TEXT, faixa do índice de epoch e o calendário
+de expiração. Também mede o custo dos triggers na gravação em lote.
+
+Uso: python benchmarks/bench_calendario.py [quantidade_de_assinaturas]
+"""
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import database
+
+
+def medir(nome, funcao, repeticoes=20):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        resultado = funcao()
+    duracao = (time.perf_counter() - inicio) / repeticoes
+    print(f"{nome:<30} {duracao * 1000:8.2f} ms  ({len(resultado)} usuários)")
+    return resultado
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    random.seed(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "calendario.db")
+        database.fechar_conexoes()
+        database.init_db()
+        agora = datetime.datetime.now()
+        registros = [
+            (
+                100_000 + i,
+                f"user{i}",
+                agora + datetime.timedelta(days=random.randint(-30, 60), hours=random.randint(-12, 12)),
+                "Plano 30 dias",
+            )
+            for i in range(quantidade)
+        ]
+        inicio = time.perf_counter()
+        database.adicionar_assinaturas_em_lote(registros)
+        com_triggers = time.perf_counter() - inicio
+
+        dia = agora.date() + datetime.timedelta(days=3)
+        inicio_dia = database.para_epoch(datetime.datetime.combine(dia, datetime.time(0, 0)))
+        print(f"{quantidade} assinaturas, coorte de {dia.strftime('%d/%m/%Y')}\n")
+
+        def por_funcao_de_data():
+            with database.obter_gerenciador().leitura() as conn:
+                return conn.execute(
+                    "SELECT user_id FROM assinaturas WHERE status = 'ATIVA' AND date(data_expiracao) = ?",
+                    (dia.isoformat(),),
+                ).fetchall()
+
+        def por_faixa_epoch():
+            with database.obter_gerenciador().leitura() as conn:
+                return conn.execute(
+                    "SELECT user_id FROM assinaturas WHERE status = 'ATIVA' "
+                    "AND data_expiracao_epoch >= ? AND data_expiracao_epoch < ?",
+                    (inicio_dia, inicio_dia + 86400),
+                ).fetchall()
+
+        a = medir("date() sobre TEXT (varredura)", por_funcao_de_data)
+        b = medir("faixa do índice epoch", por_faixa_epoch)
+        c = medir("calendário (obter_coorte)", lambda: database.obter_coorte(dia))
+        assert {u for (u,) in a} == {u for (u,) in b} == set(c)
+
+        # Mesma gravação sem os triggers, para comparar
+        with database.obter_gerenciador().escrita() as conn:
+            conn.execute("DELETE FROM assinaturas")
+            for trigger in ("trg_calendario_inserir", "trg_calendario_atualizar", "trg_calendario_apagar"):
+                conn.execute(f"DROP TRIGGER {trigger}")
+        inicio = time.perf_counter()
+        database.adicionar_assinaturas_em_lote(registros)
+        sem_triggers = time.perf_counter() - inicio
+        print(f"\ngravação em lote: {com_triggers * 1000:.0f} ms com triggers, "
+              f"{sem_triggers * 1000:.0f} ms sem")
+        database.fechar_conexoes()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# benchmarks/bench_conexoes.py
+"""
+Compara o custo de abrir uma conexão por chamada (comportamento antigo)
+com o gerenciador de conexões persistentes do database.py.
+
+Uso: python benchmarks/bench_conexoes.py [caminho_do_banco]
+Por padrão copia o assinaturas.db do projeto para um diretório temporário.
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import database
+
+
+def obter_assinatura_por_chamada(caminho, user_id):
+    """Reproduz o padrão antigo: connect + SELECT + close a cada chamada"""
+    conn = sqlite3.connect(caminho)
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM assinaturas WHERE user_id = ?', (user_id,))
+    resultado = cursor.fetchone()
+    conn.close()
+    return resultado
+
+
+def medir(rotulo, func, ids, repeticoes=3):
+    melhor = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        for user_id in ids:
+            func(user_id)
+        duracao = time.perf_counter() - inicio
+        melhor = duracao if melhor is None else min(melhor, duracao)
+    por_chamada_us = melhor / len(ids) * 1_000_000
+    print(f"{rotulo:<28} {melhor * 1000:9.1f} ms  ({por_chamada_us:7.1f} µs/chamada)")
+    return melhor
+
+
+def main():
+    origem = sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT_DIR, "assinaturas.db")
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, "bench.db")
+        shutil.copy2(origem, caminho)
+
+        database.DB_PATH = caminho
+        database.fechar_conexoes()
+        database.init_db()
+
+        with database.obter_gerenciador().leitura() as conn:
+            ids = [row[0] for row in conn.execute("SELECT user_id FROM assinaturas")]
+        print(f"Linhas em assinaturas: {len(ids)}\n")
+
+        antigo = medir("connect por chamada", lambda uid: obter_assinatura_por_chamada(caminho, uid), ids)
+        novo = medir("gerenciador (pool)", database.obter_assinatura, ids)
+        print(f"\nGanho: {antigo / novo:.1f}x")
+
+        database.fechar_conexoes()
+
+
+if __name__ == "__main__":
+    main()
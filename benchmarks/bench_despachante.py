@@ -0,0 +1,114 @@
+# benchmarks/bench_despachante.py
+"""
+Despacha 1.000 ações da checagem (DM, remoção de cargo, kick) contra uma camada
+HTTP falsa com latência e limites por rota do lado do "servidor" (429 com
+Retry-After quando estourados), comparando:
+  - sequencial com asyncio.sleep(3) entre chamadas (comportamento antigo, estimado)
+  - Despachante com concorrência e baldes por rota
+
+O tempo é comprimido por ESCALA (0.02 = 50x mais rápido) para o benchmark rodar
+em segundos; os resultados são mostrados na escala real.
+
+Uso: python benchmarks/bench_despachante.py [quantidade_de_acoes]
+"""
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import discord
+
+from despachante import LIMITES_ROTAS, Despachante
+
+ESCALA = 0.02
+LATENCIA = 0.120  # segundos (escala real) por requisição
+# Limites do "servidor": acima dos baldes; com o tempo comprimido o jitter do loop ainda gera alguns 429
+LIMITES_SERVIDOR = {rota: (taxa * 1.5, capacidade) for rota, (taxa, capacidade) in LIMITES_ROTAS.items()}
+
+
+class ServidorFalso:
+    """Janela deslizante por rota; acima do limite responde 429 com Retry-After."""
+
+    def __init__(self):
+        self.chamadas = {rota: [] for rota in LIMITES_SERVIDOR}
+        self.respostas_429 = 0
+
+    async def requisitar(self, rota):
+        await asyncio.sleep(LATENCIA * ESCALA * random.uniform(0.5, 1.5))
+        taxa, capacidade = LIMITES_SERVIDOR[rota]
+        janela = capacidade / taxa * ESCALA
+        agora = time.monotonic()
+        recentes = [t for t in self.chamadas[rota] if agora - t < janela]
+        if len(recentes) >= capacidade:
+            self.chamadas[rota] = recentes
+            self.respostas_429 += 1
+            retry_after = (janela - (agora - recentes[0])) / ESCALA
+            resposta = SimpleNamespace(status=429, reason="Too Many Requests",
+                                       headers={"Retry-After": f"{retry_after:.3f}"})
+            raise discord.HTTPException(resposta, "rate limited")
+        recentes.append(agora)
+        self.chamadas[rota] = recentes
+
+
+def planejar(quantidade):
+    """Mistura típica de uma rodada: 60% avisos (2 chamadas), 40% remoções (4 chamadas)"""
+    random.seed(42)
+    acoes = []
+    for i in range(quantidade):
+        if random.random() < 0.6:
+            acoes.append((i, ["dm_criar", "mensagem"]))
+        else:
+            acoes.append((i, ["dm_criar", "mensagem", "membro_editar", "kick"]))
+    return acoes
+
+
+async def rodar_despachante(acoes):
+    servidor = ServidorFalso()
+    relogio = lambda: time.monotonic() / ESCALA  # noqa: E731
+
+    async def dormir(segundos):
+        await asyncio.sleep(segundos * ESCALA)
+
+    despachante = Despachante(relogio=relogio, dormir=dormir)
+
+    async def processar(user_id, rotas):
+        for rota in rotas:
+            await despachante.chamar(rota, servidor.requisitar, rota, user_id=user_id)
+
+    inicio = time.perf_counter()
+    await despachante.executar_todas(processar(user_id, rotas) for user_id, rotas in acoes)
+    return (time.perf_counter() - inicio) / ESCALA, despachante.resumo(), servidor.respostas_429
+
+
+def main():
+    logging.basicConfig(level=logging.ERROR)
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    acoes = planejar(quantidade)
+    chamadas = sum(len(rotas) for _, rotas in acoes)
+    # O loop antigo dormia 3s depois de cada DM enviada, remoção de cargo e kick
+    pausas = sum(len(rotas) - 1 for _, rotas in acoes)
+    sequencial = chamadas * LATENCIA + pausas * 3
+
+    print(f"{quantidade} ações ({chamadas} chamadas ao Discord)\n")
+    print(f"{'sequencial + sleep(3) (estimado)':<34} {sequencial / 60:8.1f} min")
+
+    duracao, resumo, respostas_429 = asyncio.run(rodar_despachante(acoes))
+    print(f"{'despachante (baldes por rota)':<34} {duracao / 60:8.1f} min  ({sequencial / duracao:.1f}x)")
+
+    print(
+        f"\nchamadas: {resumo['acoes']} | ok: {resumo['ok']} | falhas: {resumo['falhas']} | "
+        f"429 recebidos: {respostas_429} | repetidas: {resumo['limitadas']}"
+    )
+    for rota, contagem in sorted(resumo["por_rota"].items()):
+        print(f"  {rota:<14} ok: {contagem['ok']:5}  falhas: {contagem['falhas']}")
+
+
+if __name__ == "__main__":
+    main()
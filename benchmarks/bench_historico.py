@@ -0,0 +1,64 @@
+# benchmarks/bench_historico.py
+"""
+Mede eventos/segundo ao registrar avisos de uma rodada de checagem:
+  - imediato=True: histórico gravado na transação de cada aviso (um commit por evento)
+  - padrão: histórico no BufferHistorico, gravado em lotes (group commit)
+
+Uso: python benchmarks/bench_historico.py [quantidade_de_eventos]
+"""
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import database
+
+
+def preparar_banco(tmp, nome, quantidade):
+    database.DB_PATH = os.path.join(tmp, nome)
+    database.fechar_conexoes()
+    database.init_db()
+    data_exp = datetime.datetime.now() + datetime.timedelta(days=3)
+    database.adicionar_assinaturas_em_lote(
+        [(100_000 + i, f"user{i}", data_exp, "Plano 30 dias") for i in range(quantidade)]
+    )
+
+
+def relatar(rotulo, eventos, duracao):
+    print(f"{rotulo:<28} {duracao * 1000:9.1f} ms  {eventos / duracao:12,.0f} eventos/s")
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    print(f"Registrando {quantidade} avisos\n")
+    with tempfile.TemporaryDirectory() as tmp:
+        preparar_banco(tmp, "imediato.db", quantidade)
+        inicio = time.perf_counter()
+        for i in range(quantidade):
+            database.registrar_aviso(100_000 + i, "AVISO_3_DIAS", imediato=True)
+        relatar("imediato (commit por evento)", quantidade, time.perf_counter() - inicio)
+
+        preparar_banco(tmp, "buffer.db", quantidade)
+        antes = database.estatisticas_historico()
+        inicio = time.perf_counter()
+        for i in range(quantidade):
+            database.registrar_aviso(100_000 + i, "AVISO_3_DIAS")
+        database.descarregar_historico()
+        relatar("bufferizado (group commit)", quantidade, time.perf_counter() - inicio)
+
+        stats = database.estatisticas_historico()
+        print(
+            f"\ndescargas: {stats['descargas'] - antes['descargas']} | "
+            f"lote médio: {stats['lote_medio']:.1f} | maior lote: {stats['maior_lote']} | "
+            f"latência média: {stats['latencia_media_ms']:.2f} ms | máx: {stats['latencia_max_ms']:.2f} ms"
+        )
+        database.fechar_conexoes()
+
+
+if __name__ == "__main__":
+    main()
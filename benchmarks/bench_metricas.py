@@ -0,0 +1,68 @@
+# benchmarks/bench_metricas.py
+"""
+Custo da instrumentação da checagem por membro (busca das métricas do
+contexto, cronômetro do membro, duas escritas no SQLite cronometradas e a
+contagem do ramo): sem instrumentação, com as métricas desligadas e ligadas.
+
+Uso: python benchmarks/bench_metricas.py [quantidade_de_membros]
+"""
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import metricas_checagem
+
+
+def sem_instrumentacao(quantidade):
+    for _ in range(quantidade):
+        pass
+
+
+def instrumentado(quantidade):
+    for _ in range(quantidade):
+        metricas = metricas_checagem.atuais()
+        with metricas.acao("membro"):
+            metricas.contar("vencida")
+            with metricas.acao("sqlite"):
+                pass
+            with metricas.acao("sqlite"):
+                pass
+
+
+def medir(nome, funcao, quantidade, base=None):
+    melhor = min(_cronometrar(funcao, quantidade) for _ in range(5))
+    extra = "" if base is None else f"  ({(melhor - base) / quantidade * 1e9:6.0f} ns/membro a mais)"
+    print(f"{nome:<22} {melhor * 1000:8.1f} ms{extra}")
+    return melhor
+
+
+def _cronometrar(funcao, quantidade):
+    inicio = time.perf_counter()
+    funcao(quantidade)
+    return time.perf_counter() - inicio
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    print(f"{quantidade} membros\n")
+    base = medir("sem instrumentação", sem_instrumentacao, quantidade)
+    medir("métricas desligadas", instrumentado, quantidade, base)
+    metricas = metricas_checagem.MetricasChecagem("bench")
+    token = metricas_checagem.ativar(metricas)
+    try:
+        medir("métricas ligadas", instrumentado, quantidade, base)
+        inicio = time.perf_counter()
+        relatorio = metricas.relatorio()
+        # As 5 repetições acumulam amostras na mesma rodada
+        print(f"\nrelatório ({relatorio['acoes']['sqlite']['n']} amostras de sqlite): "
+              f"{(time.perf_counter() - inicio) * 1000:.1f} ms")
+    finally:
+        metricas_checagem.desativar(token)
+
+
+if __name__ == "__main__":
+    main()
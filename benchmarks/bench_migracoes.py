@@ -0,0 +1,88 @@
+# benchmarks/bench_migracoes.py
+"""
+Mede o tempo das migrações (backup online + passos em SQL de conjunto)
+sobre um banco v0 sintético com muito histórico.
+
+Uso: python benchmarks/bench_migracoes.py [linhas_historico] [linhas_assinaturas]
+"""
+import datetime
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import migracoes
+
+
+def criar_banco_v0(caminho, linhas_historico, linhas_assinaturas):
+    """Schema original (antes das colunas epoch), metade das datas em formato legado"""
+    conn = sqlite3.connect(caminho)
+    conn.execute('''
+        CREATE TABLE assinaturas(
+            user_id INTEGER PRIMARY KEY, username TEXT NOT NULL, data_expiracao TEXT NOT NULL,
+            plano TEXT NOT NULL, data_ativacao TEXT NOT NULL, status TEXT NOT NULL, ultimo_aviso TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE historico(
+            id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, acao TEXT NOT NULL,
+            detalhes TEXT, data_hora TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    base = datetime.datetime(2025, 1, 1)
+    conn.executemany(
+        "INSERT INTO assinaturas VALUES (?, ?, ?, 'Plano 30 dias', ?, 'ATIVA', NULL)",
+        (
+            (
+                i,
+                f"user{i}",
+                (base + datetime.timedelta(days=i % 400)).strftime(
+                    "%Y-%m-%d %H:%M:%S" if i % 2 else "%d/%m/%Y %H:%M:%S"
+                ),
+                base.strftime("%Y-%m-%d %H:%M:%S"),
+            )
+            for i in range(linhas_assinaturas)
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO historico (user_id, acao, detalhes, data_hora) VALUES (?, 'AVISO', 'Tipo: AVISO_3_DIAS', ?)",
+        (
+            (i % linhas_assinaturas, (base + datetime.timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S"))
+            for i in range(linhas_historico)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+def main():
+    linhas_historico = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    linhas_assinaturas = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, "assinaturas.db")
+        inicio = time.perf_counter()
+        criar_banco_v0(caminho, linhas_historico, linhas_assinaturas)
+        print(
+            f"Banco v0 com {linhas_historico:,} linhas de histórico e {linhas_assinaturas:,} assinaturas "
+            f"criado em {time.perf_counter() - inicio:.1f}s"
+        )
+
+        conn = sqlite3.connect(caminho)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        inicio = time.perf_counter()
+        versao = migracoes.aplicar_migracoes(conn)
+        duracao = time.perf_counter() - inicio
+        conn.close()
+
+        print(f"Migrado até v{versao} (incluindo backup) em {duracao:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# benchmarks/bench_parse_datas.py
+"""
+Compara o parser antigo (loop de formatos com strptime + try/except)
+com database.parse_datetime_db (fromisoformat + fallback legado).
+
+Uso: python benchmarks/bench_parse_datas.py [quantidade]
+"""
+import datetime
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from database import DB_DATETIME_FORMAT, LEGACY_DATETIME_FORMAT, parse_datetime_db
+
+
+def parse_antigo(raw):
+    """Mesmo padrão que existia em utils/cogs antes do parser único"""
+    for fmt in (DB_DATETIME_FORMAT, LEGACY_DATETIME_FORMAT):
+        try:
+            return datetime.datetime.strptime(raw, fmt)
+        except ValueError:
+            continue
+    try:
+        return datetime.datetime.strptime(raw[:10], "%d/%m/%Y")
+    except Exception:
+        return None
+
+
+def medir(rotulo, func, valores):
+    inicio = time.perf_counter()
+    for raw in valores:
+        func(raw)
+    duracao = time.perf_counter() - inicio
+    print(f"  {rotulo:<22} {duracao * 1000:8.1f} ms  ({duracao / len(valores) * 1e9:6.0f} ns/valor)")
+    return duracao
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    base = datetime.datetime(2025, 1, 1)
+    datas = [base + datetime.timedelta(minutes=i) for i in range(quantidade)]
+    cenarios = {
+        "100% ISO": [d.strftime(DB_DATETIME_FORMAT) for d in datas],
+        "100% legado": [d.strftime(LEGACY_DATETIME_FORMAT) for d in datas],
+    }
+
+    for nome, valores in cenarios.items():
+        print(f"{nome} ({quantidade:,} valores)")
+        antigo = medir("antigo (strptime loop)", parse_antigo, valores)
+        novo = medir("parse_datetime_db", parse_datetime_db, valores)
+        print(f"  ganho: {antigo / novo:.1f}x\n")
+
+
+if __name__ == "__main__":
+    main()
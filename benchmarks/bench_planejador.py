@@ -0,0 +1,56 @@
+# benchmarks/bench_planejador.py
+"""
+Tempo do modo de planejamento (dry-run) da checagem com 100k assinaturas:
+expirações espalhadas de -30 a +60 dias, todas ATIVAS (pior caso: nenhuma
+vencida foi encerrada ainda), com os índices das migrações.
+
+Uso: python benchmarks/bench_planejador.py [quantidade_de_assinaturas]
+"""
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import database
+import planejador
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    random.seed(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "planejador.db")
+        database.fechar_conexoes()
+        database.init_db()
+        agora = datetime.datetime.now()
+        database.adicionar_assinaturas_em_lote([
+            (
+                100_000 + i,
+                f"user{i}",
+                agora + datetime.timedelta(days=random.randint(-30, 60), hours=random.randint(-12, 12)),
+                "Plano 30 dias",
+            )
+            for i in range(quantidade)
+        ])
+        membros = set(range(100_000, 100_000 + quantidade))
+
+        print(f"{quantidade} assinaturas\n")
+        for rodada in range(3):
+            inicio = time.perf_counter()
+            plano = planejador.planejar_checagem(presente=membros.__contains__)
+            duracao = time.perf_counter() - inicio
+            print(f"rodada {rodada + 1}: {duracao * 1000:8.1f} ms")
+
+        print()
+        print(planejador.formatar_plano(plano))
+        database.fechar_conexoes()
+
+
+if __name__ == "__main__":
+    main()
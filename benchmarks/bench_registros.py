@@ -0,0 +1,79 @@
+# benchmarks/bench_registros.py
+"""
+Compara a representação das assinaturas lidas do banco:
+  - dicionário de 7 chaves com datas em texto (obter_todas_assinaturas)
+    + o parse_datetime_db que cada consumidor fazia depois
+  - registro Assinatura (__slots__) montado pelo row factory, com as datas já convertidas
+
+Mede memória por registro (tracemalloc) e tempo de leitura+conversão.
+
+Uso: python benchmarks/bench_registros.py [quantidade_de_linhas]
+"""
+import datetime
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import database
+
+
+def ler_dicts():
+    dicts = database.obter_todas_assinaturas()
+    # o que o embed/relatório/checagem faziam com cada dicionário
+    for assinatura in dicts:
+        database.parse_datetime_db(assinatura['data_expiracao'])
+        database.parse_datetime_db(assinatura['data_ativacao'])
+        database.parse_datetime_db(assinatura['ultimo_aviso'])
+    return dicts
+
+
+def ler_registros():
+    return list(database.iterar_assinaturas(como_registro=True))
+
+
+def medir(rotulo, funcao, quantidade):
+    database.fechar_conexoes()
+    inicio = time.perf_counter()
+    funcao()
+    duracao = time.perf_counter() - inicio
+
+    database.fechar_conexoes()
+    tracemalloc.start()
+    resultado = funcao()
+    atual, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del resultado
+    print(
+        f"{rotulo:<34} {duracao * 1000:8.1f} ms  "
+        f"{duracao / quantidade * 1e6:6.2f} µs/linha  {atual / quantidade:7.0f} bytes/registro"
+    )
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    database.logger.setLevel("WARNING")
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "registros.db")
+        database.fechar_conexoes()
+        database.init_db()
+        agora = datetime.datetime.now()
+        database.adicionar_assinaturas_em_lote([
+            (i, f"user{i}", agora + datetime.timedelta(minutes=i), "Plano 30 dias") for i in range(quantidade)
+        ])
+        # o cache só guarda CACHE_TAMANHO_MAXIMO linhas; não entra na conta por registro
+        database._cache.tamanho_maximo = 0
+
+        print(f"{quantidade:,} assinaturas\n")
+        medir("dict + parse_datetime_db", ler_dicts, quantidade)
+        medir("Assinatura (__slots__, row factory)", ler_registros, quantidade)
+        database.fechar_conexoes()
+
+
+if __name__ == "__main__":
+    main()
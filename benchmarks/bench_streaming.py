@@ -0,0 +1,60 @@
+# benchmarks/bench_streaming.py
+"""
+Compara o pico de memória (tracemalloc) ao percorrer todas as assinaturas:
+  - obter_todas_assinaturas: lista com um dicionário por linha
+  - iterar_todas_assinaturas: gerador com fetchmany, um lote por vez
+
+Uso: python benchmarks/bench_streaming.py [quantidade ...]   (padrão: 100000 1000000)
+"""
+import datetime
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import database
+
+
+def preparar_banco(tmp, quantidade):
+    database.DB_PATH = os.path.join(tmp, f"streaming_{quantidade}.db")
+    database.fechar_conexoes()
+    database.init_db()
+    agora = datetime.datetime.now()
+    lote = 50_000
+    for inicio in range(0, quantidade, lote):
+        database.adicionar_assinaturas_em_lote([
+            (i, f"user{i}", agora + datetime.timedelta(minutes=i), "Plano 30 dias")
+            for i in range(inicio, min(inicio + lote, quantidade))
+        ])
+
+
+def medir(rotulo, funcao):
+    database.fechar_conexoes()  # conexões e cache frios nos dois casos
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    total = funcao()
+    duracao = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {rotulo:<26} {total:>9,} linhas  {duracao:7.2f} s  pico {pico / 1024 / 1024:9.1f} MiB")
+
+
+def main():
+    quantidades = [int(q) for q in sys.argv[1:]] or [100_000, 1_000_000]
+    database.logger.setLevel("WARNING")
+    with tempfile.TemporaryDirectory() as tmp:
+        for quantidade in quantidades:
+            print(f"{quantidade:,} assinaturas")
+            preparar_banco(tmp, quantidade)
+            medir("obter_todas_assinaturas", lambda: len(database.obter_todas_assinaturas()))
+            medir("iterar_todas_assinaturas", lambda: sum(1 for _ in database.iterar_todas_assinaturas()))
+            database.fechar_conexoes()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# benchmarks/bench_upsert.py
+"""
+Mede linhas/segundo ao gravar assinaturas:
+  - padrão antigo: connect + SELECT + UPDATE/INSERT + commit por linha
+  - adicionar_assinatura atual: upsert único, conexão persistente, commit por linha
+  - adicionar_assinaturas_em_lote: executemany numa única transação
+
+Uso: python benchmarks/bench_upsert.py [quantidade_de_linhas]
+"""
+import datetime
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import database
+
+
+def adicionar_assinatura_antigo(caminho, user_id, username, data_expiracao, plano):
+    """Reproduz o adicionar_assinatura original (SELECT e depois UPDATE ou INSERT)"""
+    conn = sqlite3.connect(caminho)
+    cursor = conn.cursor()
+    data_exp_str = data_expiracao.strftime(database.DB_DATETIME_FORMAT)
+    data_ativacao = datetime.datetime.now().strftime(database.DB_DATETIME_FORMAT)
+    cursor.execute('SELECT user_id FROM assinaturas WHERE user_id = ?', (user_id,))
+    if cursor.fetchone():
+        cursor.execute('''
+            UPDATE assinaturas
+            SET username = ?, data_expiracao = ?, plano = ?, data_ativacao = ?, status = ?, ultimo_aviso = NULL
+            WHERE user_id = ?
+        ''', (username, data_exp_str, plano, data_ativacao, "ATIVA", user_id))
+    else:
+        cursor.execute('''
+            INSERT INTO assinaturas
+            (user_id, username, data_expiracao, plano, data_ativacao, status)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (user_id, username, data_exp_str, plano, data_ativacao, "ATIVA"))
+    conn.commit()
+    conn.close()
+
+
+def preparar_banco(tmp, nome):
+    database.DB_PATH = os.path.join(tmp, nome)
+    database.fechar_conexoes()
+    database.init_db()
+    return database.DB_PATH
+
+
+def relatar(rotulo, linhas, duracao):
+    print(f"{rotulo:<34} {duracao * 1000:9.1f} ms  {linhas / duracao:12,.0f} linhas/s")
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    data_exp = datetime.datetime.now() + datetime.timedelta(days=30)
+    registros = [(100_000 + i, f"user{i}", data_exp, "Importado (nickname)") for i in range(quantidade)]
+    logging_nivel = database.logger.level
+    database.logger.setLevel("WARNING")  # um log INFO por linha distorceria a medição
+
+    print(f"Gravando {quantidade} assinaturas\n")
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = preparar_banco(tmp, "antigo.db")
+        database.fechar_conexoes()  # o padrão antigo não usa o gerenciador
+        inicio = time.perf_counter()
+        for registro in registros:
+            adicionar_assinatura_antigo(caminho, *registro)
+        relatar("antigo (connect+SELECT+commit)", quantidade, time.perf_counter() - inicio)
+
+        preparar_banco(tmp, "upsert.db")
+        inicio = time.perf_counter()
+        for registro in registros:
+            database.adicionar_assinatura(*registro)
+        relatar("adicionar_assinatura (upsert)", quantidade, time.perf_counter() - inicio)
+
+        preparar_banco(tmp, "lote.db")
+        inicio = time.perf_counter()
+        database.adicionar_assinaturas_em_lote(registros)
+        relatar("adicionar_assinaturas_em_lote", quantidade, time.perf_counter() - inicio)
+
+        database.fechar_conexoes()
+    database.logger.setLevel(logging_nivel)
+
+
+if __name__ == "__main__":
+    main()
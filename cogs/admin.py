@@ -1,13 +1,34 @@
 # cogs/admin.py
 import discord
 from discord.ext import commands
+import datetime
+import io
 import logging
+import metricas_checagem
+import outbox
+import planejador
+import retencao_historico
+from config import NOTIFICACAO_CHANNEL_ID, SERVER_ID
 from cogs.tasks import ChecagemAssinaturas
-from database import obter_resumo_assinaturas
+from database import estatisticas_cache, estatisticas_historico
+from database_async import (
+    contar_coortes,
+    contar_pendentes,
+    descarregar_historico,
+    executar,
+    obter_resumo_assinaturas,
+    reconstruir_calendario,
+    verificar_calendario,
+)
 from utils import criar_embed_assinaturas, gerar_arquivo_assinaturas
 
 logger = logging.getLogger(__name__)
 
+# Acima disso a lista completa do plano vai como arquivo
+LIMITE_ACOES_MENSAGEM_PLANO = 15
+# Acima disso o histórico do membro vai como arquivo
+LIMITE_LINHAS_HISTORICO = 20
+
 class AdminCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -17,7 +38,7 @@ class AdminCog(commands.Cog):
     async def ver_assinaturas(self, ctx):
         """Mostra um resumo completo das assinaturas (apenas admin)"""
         try:
-            resumo = obter_resumo_assinaturas()
+            resumo = await obter_resumo_assinaturas()
             
             if not resumo:
                 await ctx.send("❌ Erro ao obter informações das assinaturas.")
@@ -27,7 +48,7 @@ class AdminCog(commands.Cog):
             await ctx.send(embed=embed)
             
             # Arquivo detalhado
-            if resumo.get("ativas") or resumo.get("expiradas"):
+            if resumo.get("total_ativas") or resumo.get("total_expiradas"):
                 arquivo = await gerar_arquivo_assinaturas(resumo)
                 await ctx.send(file=arquivo)
                 
@@ -40,11 +61,15 @@ class AdminCog(commands.Cog):
     # =====================================================
     @commands.command(name="check_assinaturas")
     @commands.has_permissions(administrator=True)
-    async def check_assinaturas(self, ctx):
+    async def check_assinaturas(self, ctx, modo: str = None):
         """
-        Roda manualmente a rotina de checagem de assinaturas.
-        Usa o método _rodar_checar_assinaturas_uma_vez da cog ChecagemAssinaturas
+        Roda manualmente a checagem completa (fallback da checagem incremental).
+        Usa o método varredura_completa da cog ChecagemAssinaturas.
+        `!check_assinaturas apelido` força a varredura completa pelos apelidos.
         """
+        if modo not in (None, "banco", "apelido"):
+            await ctx.send("Modo inválido. Use `banco` ou `apelido`.")
+            return
         
         cog: ChecagemAssinaturas = self.bot.get_cog("ChecagemAssinaturas")
         
@@ -58,7 +83,7 @@ class AdminCog(commands.Cog):
         msg = await ctx.send("Rodando checagem de assinaturas, aguarde...")
         
         try: 
-            await cog._rodar_checar_assinaturas_uma_vez()
+            await cog.varredura_completa(modo=modo)
         except Exception as e:
             logger.error(f"Erro ao rodar checagem manual de assinaturas: {e}")
             await msg.edit(content="Ocorreu um erro ao rodar a checagem de assinaturas.")
@@ -66,6 +91,166 @@ class AdminCog(commands.Cog):
         
         await msg.edit(content="Checagem de assinaturas executada com sucesso.")
         
+    # =====================================================
+    # PLANO DA CHECAGEM (DRY-RUN)
+    # =====================================================
+    @commands.command(name="planejar_checagem")
+    @commands.has_permissions(administrator=True)
+    async def planejar_checagem(self, ctx, formato: str = None):
+        """
+        Mostra o que a checagem faria agora, sem executar nada: ações por tipo
+        e tempo estimado pelos limites do despachante. Publica no canal de notificações;
+        a lista completa vai como arquivo quando é grande (ou com `!planejar_checagem arquivo`).
+        """
+        guild = ctx.guild or self.bot.get_guild(SERVER_ID)
+        if guild is None:
+            await ctx.send("Servidor não encontrado.")
+            return
+
+        def presente(user_id):
+            member = guild.get_member(user_id)
+            return member is not None and not member.bot
+
+        plano = await executar(planejador.planejar_checagem, presente=presente)
+        if plano is None:
+            await ctx.send("❌ Erro ao planejar a checagem.")
+            return
+
+        mensagem = planejador.formatar_plano(plano)
+        total_acoes = sum(len(lista) for lista in plano['acoes'].values())
+        arquivo = None
+        if formato == "arquivo" or total_acoes > LIMITE_ACOES_MENSAGEM_PLANO:
+            conteudo = planejador.escrever_plano(plano).encode("utf-8")
+            arquivo = discord.File(io.BytesIO(conteudo), filename="plano_checagem.txt")
+        elif total_acoes:
+            detalhes = [
+                f"{tipo}: " + ", ".join(f"<@{user_id}>" for user_id, _ in lista)
+                for tipo, lista in plano['acoes'].items() if lista
+            ]
+            mensagem += "\n\n" + "\n".join(detalhes)
+
+        canal = guild.get_channel(NOTIFICACAO_CHANNEL_ID) or ctx.channel
+        try:
+            if arquivo:
+                await canal.send(mensagem, file=arquivo)
+            else:
+                await canal.send(mensagem)
+        except Exception as e:
+            logger.error(f"Erro ao publicar plano da checagem: {e}")
+            await ctx.send("❌ Não foi possível publicar o plano no canal de notificações.")
+            return
+        if canal != ctx.channel:
+            await ctx.send(f"Plano publicado em {canal.mention}.")
+
+    # =====================================================
+    # CALENDÁRIO DE EXPIRAÇÃO
+    # =====================================================
+    @commands.command(name="calendario")
+    @commands.has_permissions(administrator=True)
+    async def calendario(self, ctx, acao: str = None):
+        """
+        Confere o calendário de expiração (dia -> assinaturas) contra a tabela de
+        assinaturas e mostra as coortes de ontem a daqui a 3 dias.
+        `!calendario reconstruir` refaz o calendário a partir das assinaturas.
+        """
+        if acao not in (None, "reconstruir"):
+            await ctx.send("Ação inválida. Use `!calendario` ou `!calendario reconstruir`.")
+            return
+
+        if acao == "reconstruir":
+            total = await reconstruir_calendario()
+            if total < 0:
+                await ctx.send("❌ Erro ao reconstruir o calendário de expiração.")
+                return
+            await ctx.send(f"🗓️ Calendário reconstruído: **{total}** entradas.")
+
+        verificacao = await verificar_calendario()
+        if not verificacao:
+            await ctx.send("❌ Erro ao verificar o calendário de expiração.")
+            return
+        hoje = datetime.date.today()
+        coortes = await contar_coortes(hoje - datetime.timedelta(days=1), hoje + datetime.timedelta(days=3))
+        linhas = [
+            f"{'✅' if not (verificacao['faltando'] or verificacao['sobrando']) else '⚠️'} "
+            f"Calendário: **{verificacao['total']}** entradas | faltando: **{verificacao['faltando']}** | "
+            f"sobrando: **{verificacao['sobrando']}**"
+        ]
+        for dias in range(-1, 4):
+            dia = hoje + datetime.timedelta(days=dias)
+            linhas.append(f"{dia.strftime('%d/%m/%Y')}: **{coortes.get(dia, 0)}** assinatura(s) ativa(s)")
+        if verificacao['faltando'] or verificacao['sobrando']:
+            linhas.append("Use `!calendario reconstruir` para corrigir.")
+        await ctx.send("\n".join(linhas))
+
+    # =====================================================
+    # RELATÓRIO DE TEMPOS DA CHECAGEM
+    # =====================================================
+    @commands.command(name="relatorio_checagem")
+    @commands.has_permissions(administrator=True)
+    async def relatorio_checagem(self, ctx, relatorio_id: int = None):
+        """
+        Tempos da última rodada da checagem (ou da rodada informada): p50/p95/p99
+        por fase e por ação, e contagem por ramo (3 dias, hoje, vencida, importado do apelido).
+        """
+        encontrado = await executar(metricas_checagem.obter_relatorio, relatorio_id)
+        if encontrado is None:
+            await ctx.send("Nenhum relatório da checagem encontrado.")
+            return
+
+        texto = metricas_checagem.formatar_relatorio(*encontrado)
+        if len(texto) + 8 <= 2000:
+            await ctx.send(f"```\n{texto}\n```")
+        else:
+            arquivo = discord.File(io.BytesIO(texto.encode("utf-8")), filename=f"relatorio_checagem_{encontrado[0]}.txt")
+            await ctx.send(f"📊 Relatório #{encontrado[0]} da checagem:", file=arquivo)
+
+    # =====================================================
+    # HISTÓRICO DE UM MEMBRO (AUDITORIA)
+    # =====================================================
+    @commands.command(name="historico")
+    @commands.has_permissions(administrator=True)
+    async def historico(self, ctx, usuario: discord.User):
+        """
+        Histórico de um membro (ativações, avisos, mudanças de status), incluindo os
+        meses já arquivados. Também funciona com quem já saiu do servidor (menção ou id).
+        As últimas linhas vão na mensagem; com muitas linhas, a lista completa vai como arquivo.
+        """
+        # Eventos ainda no buffer entram na consulta
+        await descarregar_historico()
+        linhas = await executar(retencao_historico.obter_historico_usuario, usuario.id)
+        if not linhas:
+            await ctx.send(f"Nenhum registro no histórico de {usuario.mention}.")
+            return
+
+        eventos = [
+            f"{data_hora} | {acao}" + (f" | {detalhes}" if detalhes else "")
+            for _id, _user_id, acao, detalhes, data_hora in linhas
+        ]
+        cabecalho = f"📜 Histórico de {usuario.mention}: **{len(eventos)}** registro(s)"
+        ultimos = eventos[-LIMITE_LINHAS_HISTORICO:]
+        texto = "\n".join(ultimos)
+        if len(eventos) <= LIMITE_LINHAS_HISTORICO and len(cabecalho) + len(texto) + 10 <= 2000:
+            await ctx.send(f"{cabecalho}\n```\n{texto}\n```")
+            return
+
+        conteudo = ("\n".join(eventos) + "\n").encode("utf-8")
+        arquivo = discord.File(io.BytesIO(conteudo), filename=f"historico_{usuario.id}.txt")
+        await ctx.send(f"{cabecalho} (lista completa no arquivo anexo)", file=arquivo)
+
+    # =====================================================
+    # OUTBOX (EFEITOS NO DISCORD QUE FALHARAM DE VEZ)
+    # =====================================================
+    @commands.command(name="reprocessar_efeitos")
+    @commands.has_permissions(administrator=True)
+    async def reprocessar_efeitos(self, ctx, member: discord.Member = None):
+        """
+        Devolve para a fila os efeitos mortos do outbox (DM, cargo, apelido, kick que
+        esgotaram as tentativas ou falharam de vez), de um membro ou de todos.
+        """
+        quantidade = await executar(outbox.reenfileirar_mortos, member.id if member else None)
+        alvo = f" de {member.mention}" if member else ""
+        await ctx.send(f"🔁 {quantidade} efeito(s){alvo} devolvido(s) para a fila do outbox.")
+
     # =====================================================
     # HEALTH CHECK DO BOT / SISTEMA DE ASSINATURAS
     # =====================================================
@@ -84,7 +269,8 @@ class AdminCog(commands.Cog):
         db_detail = ""
         
         try:
-            resumo = obter_resumo_assinaturas()
+            # Só as contagens: o health não precisa de nenhuma linha
+            resumo = await obter_resumo_assinaturas(limite_ativas=0, limite_pendentes=0, limite_expiradas=0)
             if not resumo:
                 db_status = "Sem dados"
                 db_detail = "obter_resumo_assinaturas() não retornou informações."
@@ -112,6 +298,46 @@ class AdminCog(commands.Cog):
             value=f"{db_status}\n{db_detail}" if db_detail else db_status,
             inline=False,
         )
+        cache = estatisticas_cache()
+        embed.add_field(
+            name="Cache de assinaturas",
+            value=(
+                f"{cache['tamanho']} registros | "
+                f"acertos: {cache['acertos']} | falhas: {cache['falhas']} | "
+                f"taxa: {cache['taxa_acerto']:.0%}"
+            ),
+            inline=False,
+        )
+        historico = estatisticas_historico()
+        embed.add_field(
+            name="Buffer do histórico",
+            value=(
+                f"pendentes: {historico['pendentes']} | "
+                f"descargas: {historico['descargas']} | "
+                f"lote médio: {historico['lote_medio']:.1f} | "
+                f"latência média: {historico['latencia_media_ms']:.1f} ms"
+            ),
+            inline=False,
+        )
+        embed.add_field(
+            name="Checagem incremental",
+            value=f"membros pendentes: {await contar_pendentes()}",
+            inline=False,
+        )
+        fila = await executar(outbox.estatisticas_outbox)
+        if fila:
+            mais_antigo = fila['mais_antigo_segundos']
+            embed.add_field(
+                name="Outbox (efeitos no Discord)",
+                value=(
+                    f"na fila: {fila['pendentes']} | em execução: {fila['processando']} | "
+                    f"mortos: {fila['mortos']}\n"
+                    f"concluídos na última hora: {fila['concluidos_janela']} "
+                    f"({fila['vazao_por_minuto']:.1f}/min)"
+                    + (f" | mais antigo na fila: {mais_antigo:.0f} s" if mais_antigo is not None else "")
+                ),
+                inline=False,
+            )
         embed.set_footer(text= f"Conectado em {len(self.bot.guilds)} servidores.")
         
         await ctx.send(embed=embed)
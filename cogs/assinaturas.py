@@ -3,7 +3,8 @@ import discord
 from discord.ext import commands
 import datetime
 import logging
-from database import DB_DATETIME_FORMAT, DISPLAY_FORMAT, LEGACY_DATETIME_FORMAT, obter_assinatura
+from database import DISPLAY_FORMAT
+from database_async import obter_registro_assinatura
 from views import RenovarAssinaturaView
 
 logger = logging.getLogger(__name__)
@@ -23,7 +24,7 @@ class AssinaturasCog(commands.Cog):
     @commands.command(name="minhaassinatura")
     async def minha_assinatura(self, ctx):
         """Mostra informações da assinatura do usuário"""
-        assinatura = obter_assinatura(ctx.author.id)
+        assinatura = await obter_registro_assinatura(ctx.author.id)
         
         if not assinatura:
             await ctx.send("❌ Você não possui uma assinatura ativa.")
@@ -34,28 +35,17 @@ class AssinaturasCog(commands.Cog):
             color=discord.Color.green()
         )
         
-        def parse_datetime_compat(raw: str) -> datetime.datetime:
-            for fmt in (DB_DATETIME_FORMAT, LEGACY_DATETIME_FORMAT):
-                try:
-                    return datetime.datetime.strptime(raw, fmt)
-                except ValueError:
-                    continue
-            try: 
-                return datetime.datetime.strptime(raw[:10], "%d/%m/%Y")
-            except Exception:
-                return None
-        
-        dt_ativacao = parse_datetime_compat(assinatura['data_ativacao']) if assinatura['data_ativacao'] else None
-        dt_expiracao = parse_datetime_compat(assinatura['data_expiracao']) if assinatura['data_expiracao'] else None
+        dt_ativacao = assinatura.data_ativacao
+        dt_expiracao = assinatura.data_expiracao
         
         data_ativacao_str = dt_ativacao.strftime(DISPLAY_FORMAT) if dt_ativacao else "N/D"
         data_expiracao_str = dt_expiracao.strftime(DISPLAY_FORMAT) if dt_expiracao else "N/D"
         
         embed.add_field(name="👤 Usuário", value=ctx.author.mention, inline=True)
         embed.add_field(name="📅 Data de Ativação", value=data_ativacao_str, inline=True)
-        embed.add_field(name="📊 Plano", value=assinatura['plano'], inline=True)
+        embed.add_field(name="📊 Plano", value=assinatura.plano, inline=True)
         embed.add_field(name="⏰ Expira em", value=data_expiracao_str, inline=True)
-        embed.add_field(name="✅ Status", value=assinatura['status'], inline=True)
+        embed.add_field(name="✅ Status", value=assinatura.status, inline=True)
         
         # Calcular dias restantes
         try:
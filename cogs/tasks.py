@@ -2,46 +2,417 @@
 import discord
 from discord.ext import commands, tasks
 import datetime
-import re
 import asyncio
 import logging
+import time
+import uuid
 from config import *
-from database import *
-from views import RenovarAssinaturaView
+import apelidos
+import database
+import execucoes_checagem
+import metricas_checagem
+import outbox
+import retencao_historico
+from agendador import HORA_EVENTOS, AgendaAssinaturas, reconstruir_do_banco
+from despachante import Despachante, criar_baldes
+from publicador_resumo import PublicadorResumo
+from database_async import (
+    adicionar_assinaturas_em_lote,
+    atualizar_status_assinatura,
+    contar_pendentes,
+    descarregar_historico,
+    executar,
+    limpar_pendentes,
+    marcar_pendentes,
+    marcar_pendentes_virada,
+    normalizar_datas_legadas,
+    obter_assinaturas_acionaveis,
+    obter_pendentes,
+    obter_registros_por_ids,
+    registrar_aviso,
+)
 
 logger = logging.getLogger(__name__)
 
+def _novo_resumo() -> dict:
+    return {
+        "processados": 0,
+        "avisos_3": 0,
+        "avisos_hoje": 0,
+        "removidos": 0,
+        "erros_dm": 0,
+        "erros_permissao": 0,
+        "fora_do_servidor": 0,
+        "efeitos_na_fila": 0,
+    }
+
 class ChecagemAssinaturas(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         logger.info("Inicializando checagem de assinaturas...")
+        # Agenda de prazos: atualizada pelas escritas no banco, montada do banco na primeira volta
+        self._agenda = AgendaAssinaturas(ao_mudar=self._acordar_agenda)
+        self._acordar = None
+        self._loop = None
+        self._ultima_reconstrucao = None
+        # Último dia em que a virada (entrada nas janelas de ação) foi marcada
+        self._ultima_virada = None
+        # Baldes por rota do token do bot, compartilhados por todos os despachantes da cog:
+        # checagem, drenagem e resumo no canal juntos ficam dentro dos limites
+        self._baldes = criar_baldes()
+        # Executam os efeitos no Discord gravados no outbox: na hora, pela checagem, e no
+        # loop de fundo. Donos separados: um nunca toma o efeito que o outro está executando
+        self._instancia = uuid.uuid4().hex
+        self._efeitos = outbox.ExecutorEfeitos(
+            bot, Despachante(baldes=self._baldes), instancia=self._instancia, nome="checagem"
+        )
+        self._drenagem = outbox.ExecutorEfeitos(
+            bot, Despachante(baldes=self._baldes), instancia=self._instancia, nome="drenagem"
+        )
+        # Uma rodada por vez: o loop incremental e o !check_assinaturas não se sobrepõem
+        self._lock_rodada = asyncio.Lock()
+        # Guardado para remover exatamente o mesmo ouvinte no cog_unload
+        self._ouvinte = self._agenda.atualizar
+        database.registrar_ouvinte(self._ouvinte)
         self.checar_assinaturas.start()
+        self.drenar_efeitos.start()
+
+        self.normalizar_datas.start()
+        self.manter_historico.start()
 
     def cog_unload(self):
         logger.info("Cancelando checagem de assinaturas...")
         self.checar_assinaturas.cancel()
+        self.drenar_efeitos.cancel()
+        self.normalizar_datas.cancel()
+        self.manter_historico.cancel()
+        database.remover_ouvinte(self._ouvinte)
+
+    def _acordar_agenda(self):
+        """Chamado (de qualquer thread) quando a agenda muda: acorda a espera do loop"""
+        if self._loop is None or self._acordar is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._acordar.set)
+        except RuntimeError:
+            pass  # loop já encerrado
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before, after):
+        """Apelido ou cargos mudaram: o membro entra no conjunto de pendentes"""
+        if after.bot or after.guild.id != SERVER_ID:
+            return
+        if before.nick != after.nick:
+            apelidos.indice.atualizar(after.id, after.nick)
+        if before.nick != after.nick or before.roles != after.roles:
+            await marcar_pendentes([after.id], "ATUALIZACAO_MEMBRO")
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        if member.bot or member.guild.id != SERVER_ID:
+            return
+        await marcar_pendentes([member.id], "ENTRADA")
         
-    async def _rodar_checar_assinaturas_uma_vez(self):
+    def _coletar_candidatos_apelido(self, guild, membros=None):
+        """Membros com data no apelido ('Nome | dd/mm/YYYY'): (member, data_str, data_expiracao)"""
+        candidatos = []
+        for member in (guild.members if membros is None else membros):
+            if member.bot:
+                continue
+            # Índice compartilhado: o apelido só é lido de novo quando muda
+            data = apelidos.indice.data_do_membro(member)
+            if data is None:
+                continue
+            data_str, data_expiracao = data
+            candidatos.append((member, data_str, data_expiracao))
+        return candidatos
+
+    async def _importar_candidatos(self, candidatos):
+        """
+        Busca as assinaturas dos candidatos de uma vez e importa quem tem data
+        no apelido mas não está no banco. Retorna {user_id: Assinatura}.
+        """
+        assinaturas_db = await obter_registros_por_ids([member.id for member, _, _ in candidatos])
+
+        novos = [
+            (
+                member.id,
+                member.name,
+                datetime.datetime.combine(data_expiracao, datetime.time(0, 0)),
+                "Importado (nickname)",
+            )
+            for member, _, data_expiracao in candidatos
+            if member.id not in assinaturas_db
+        ]
+        if novos:
+            await adicionar_assinaturas_em_lote(novos)
+            metricas_checagem.atuais().contar("importado_apelido", len(novos))
+            logger.info(f"{len(novos)} membros com data no apelido importados para o banco")
+        return assinaturas_db
+
+    async def _alvos_por_apelido(self, guild):
+        """Modo antigo: todos os membros com data no apelido, usando a data do apelido"""
+        candidatos = self._coletar_candidatos_apelido(guild)
+        assinaturas_db = await self._importar_candidatos(candidatos)
+        alvos = []
+        for member, data_str, data_expiracao in candidatos:
+            # Registros recém-importados não estão no dict e ainda não têm ultimo_aviso
+            assinatura_db = assinaturas_db.get(member.id)
+            ultimo_aviso = assinatura_db.ultimo_aviso if assinatura_db else None
+            alvos.append((member, data_str, data_expiracao, ultimo_aviso))
+        return alvos
+
+    async def _alvos_do_banco(self, guild, hoje, resumo, user_ids=None):
+        """
+        Só as assinaturas nas janelas de ação (3 dias, hoje, vencidas), por uma
+        consulta no índice, ou só os user_ids informados (eventos vencidos da agenda);
+        cada membro é resolvido com guild.get_member.
+        """
+        if RECONCILIAR_APELIDOS:
+            membros = None
+            if user_ids is not None:
+                membros = [m for m in map(guild.get_member, user_ids) if m is not None]
+            await self._importar_candidatos(self._coletar_candidatos_apelido(guild, membros))
+
+        if user_ids is None:
+            assinaturas = await obter_assinaturas_acionaveis(hoje)
+        else:
+            registros = await obter_registros_por_ids(user_ids)
+            assinaturas = [a for a in registros.values() if a.status == "ATIVA"]
+
+        alvos = []
+        for assinatura in assinaturas:
+            if assinatura.data_expiracao is None:
+                continue
+            data_expiracao = assinatura.data_expiracao.date()
+            member = guild.get_member(assinatura.user_id)
+            if member is None:
+                resumo["fora_do_servidor"] += 1
+                # Vencida e já fora do servidor: só encerra no banco (com o cache completo de membros)
+                if data_expiracao < hoje and getattr(guild, "chunked", False):
+                    await atualizar_status_assinatura(
+                        assinatura.user_id,
+                        "EXPIRADA",
+                        "Assinatura vencida; membro não está mais no servidor",
+                    )
+                continue
+            if member.bot:
+                continue
+            alvos.append((member, data_expiracao.strftime("%d/%m/%Y"), data_expiracao, assinatura.ultimo_aviso))
+        return alvos
+
+    async def _processar_alvo(self, despachante, guild, cargo, alvo, hoje, resumo, execucao, publicador):
+        """
+        Avisa ou remove um membro. Cada decisão é gravada no banco junto com os
+        efeitos no Discord (outbox), que são executados em seguida pelo despachante
+        (limite por rota e 429); membros diferentes rodam em paralelo.
+        Decisões já marcadas (rodada retomada) não são gravadas de novo: só os
+        efeitos ainda não concluídos são executados. Os removidos vão para o publicador do resumo.
+        """
+        member, data_str, data_expiracao, ultimo_aviso = alvo
+        metricas = metricas_checagem.atuais()
+
+        async def marcar(acao):
+            with metricas.acao("sqlite"):
+                await executar(execucao.marcar, member.id, acao)
+
+        async def efetivar(chaves):
+            return await self._efeitos.processar_agora(chaves, membro=member, cargo=cargo, despachante=despachante)
+        logger.debug(f"Data de expiração para {member.name}: {data_expiracao}")
+
+        resumo["processados"] += 1
+
+        dias_restantes = (data_expiracao - hoje).days
+        # Chave de idempotência dos efeitos: uma por usuário, vencimento e efeito
+        prefixo = f"{member.id}:{data_expiracao.isoformat()}"
+
+        if dias_restantes > 0:
+            if dias_restantes == 3:
+                metricas.contar("aviso_3_dias")
+                enviar_aviso = True
+
+                if ultimo_aviso:
+                    horas_desde_ultimo = (datetime.datetime.now() - ultimo_aviso).total_seconds() / 3600
+                    if horas_desde_ultimo < 12:
+                        enviar_aviso = False
+
+                if enviar_aviso:
+                    chave = f"AVISO_3_DIAS:{prefixo}:DM"
+                    if not execucao.feita(member.id, execucoes_checagem.AVISO_3_DIAS):
+                        mensagem = (
+                                f"🔔 Olá {member.name}, sua assinatura expira em **3 dias**!\n"
+                                "Renove seu plano clicando no botão abaixo:"
+                            )
+                        with metricas.acao("sqlite"):
+                            await registrar_aviso(
+                                member.id, "AVISO_3_DIAS",
+                                efeitos=[outbox.efeito_dm(chave, member.id, mensagem, renovar=True)]
+                            )
+                        await marcar(execucoes_checagem.AVISO_3_DIAS)
+                        resumo["avisos_3"] += 1
+                    erro = (await efetivar([chave])).get(chave)
+                    if erro is outbox.NA_FILA:
+                        resumo["efeitos_na_fila"] += 1
+                        logger.info(f"Aviso para {member.name} ficou na fila do outbox")
+                    elif erro is not None:
+                        resumo["erros_dm"] += 1
+                        logger.error(f"Erro ao enviar DM para {member.name}: {erro}")
+                    else:
+                        logger.info(f"Enviado aviso para {member.name} ({dias_restantes} dias restantes)")
+
+        elif dias_restantes == 0:
+            metricas.contar("aviso_hoje")
+            chave = f"AVISO_HOJE:{prefixo}:DM"
+            if execucao.feita(member.id, execucoes_checagem.AVISO_HOJE):
+                await efetivar([chave])
+            elif not ultimo_aviso or (datetime.datetime.now() - ultimo_aviso).total_seconds() >= 43200:
+                mensagem = (
+                    f"⚠️ **ATENÇÃO** {member.name}, sua assinatura **VENCE HOJE**!\n"
+                    "Você será removido do servidor AMANHÃ caso não renove.\n"
+                    "Renove imediatamente clicando no botão abaixo:"
+                )
+                with metricas.acao("sqlite"):
+                    await registrar_aviso(
+                        member.id, "AVISO_EXPIRA_HOJE",
+                        efeitos=[outbox.efeito_dm(chave, member.id, mensagem, renovar=True)]
+                    )
+                await marcar(execucoes_checagem.AVISO_HOJE)
+                resumo["avisos_hoje"] += 1
+                erro = (await efetivar([chave])).get(chave)
+                if erro is outbox.NA_FILA:
+                    resumo["efeitos_na_fila"] += 1
+                    logger.info(f"Aviso final para {member.name} ficou na fila do outbox")
+                elif erro is not None:
+                    resumo["erros_dm"] += 1
+                    logger.error(f"Erro ao enviar DM final para {member.name}: {erro}")
+                else:
+                    logger.info(f"Aviso final enviado para {member.name}")
+
+        elif dias_restantes < 0:
+            metricas.contar("vencida")
+            dias_atras = abs(dias_restantes)
+            if member == guild.owner:
+                logger.warning(f"Tentativa de remover o dono do servidor ({member}). Ignorando.")
+                return
+            chave_dm, chave_cargo, chave_kick = (f"REMOCAO:{prefixo}:{efeito}" for efeito in ("DM", "CARGO", "KICK"))
+            if not execucao.feita(member.id, execucoes_checagem.STATUS_EXPIRADA):
+                if dias_atras == 1:
+                    texto_qtd = "há **1 dia**"
+                else:
+                    texto_qtd = f"há **{dias_atras} dias**"
+                motivo_remocao = f"Assinatura expirada há {dias_atras} dia(s)"
+                # Status e efeitos na mesma transação: o banco nunca fica EXPIRADA sem o kick na fila
+                with metricas.acao("sqlite"):
+                    await atualizar_status_assinatura(
+                        member.id,
+                        "EXPIRADA",
+                        f"Removido do servidor com {dias_atras} dias de atraso após a expiração",
+                        imediato=True,
+                        efeitos=[
+                            outbox.efeito_dm(
+                                chave_dm, member.id,
+                                f"🚨 **SUA ASSINATURA EXPIROU** {member.name}!\n"
+                                f"Sua assinatura está vencida {texto_qtd} e você será removido do servidor.\n"
+                                "Para retornar, renove seu plano clicando no botão abaixo:",
+                                renovar=True,
+                            ),
+                            outbox.efeito_cargo(chave_cargo, member.id, cargo.name, motivo=motivo_remocao),
+                            outbox.efeito_kick(chave_kick, member.id, motivo=motivo_remocao + " - Não renovada"),
+                        ],
+                    )
+                await marcar(execucoes_checagem.STATUS_EXPIRADA)
+
+            resultados = await efetivar([chave_dm, chave_cargo, chave_kick])
+            if resultados.get(chave_dm) not in (None, outbox.NA_FILA):
+                logger.warning(f"Não foi possível enviar DM para {member.name} antes da remoção")
+            erros = [resultados.get(chave_cargo), resultados.get(chave_kick)]
+            if any(isinstance(erro, discord.Forbidden) for erro in erros):
+                resumo["erros_permissao"] += 1
+                logger.error(f"Sem permissão para remover/kick {member.name}.")
+            elif resultados.get(chave_kick, outbox.NA_FILA) is None:
+                resumo["removidos"] += 1
+                await publicador.adicionar_detalhe(
+                    f"👤 {member.mention} ({member.name}) | Expirou em {data_str} | {dias_atras} dia(s) de atraso"
+                )
+                logger.info(
+                    f"Usuário {member.name} removido do servidor (assinatura expirada há {dias_atras} dia(s))"
+                )
+            elif any(erro is outbox.NA_FILA for erro in erros):
+                # Efeito com o loop de fundo (em execução ou aguardando nova tentativa): pendente, não removido
+                resumo["efeitos_na_fila"] += 1
+                logger.info(f"Remoção de {member.name} ficou na fila do outbox")
+            elif any(erros):
+                resumo["efeitos_na_fila"] += 1
+                logger.error(f"Erro ao processar remoção de {member.name}: {next(e for e in erros if e)}")
+
+    async def _alvos_retomados(self, guild, execucao, restantes, resumo, publicador):
+        """
+        [(posicao, alvo)] dos membros que faltaram na rodada interrompida, com a expiração
+        e o último aviso do plano original. Quem já foi expulso só é contado.
+        """
+        alvos = []
+        for posicao, user_id, data_expiracao, ultimo_aviso in restantes:
+            member = guild.get_member(user_id)
+            if member is None:
+                if execucao.feita(user_id, execucoes_checagem.STATUS_EXPIRADA):
+                    resumo["removidos"] += 1
+                    await publicador.adicionar_detalhe(
+                        f"👤 <@{user_id}> | Expirou em {data_expiracao.strftime('%d/%m/%Y')} | removido antes da retomada"
+                    )
+                else:
+                    resumo["fora_do_servidor"] += 1
+                await executar(execucao.concluir_membro, posicao)
+                continue
+            alvos.append((posicao, (member, data_expiracao.strftime("%d/%m/%Y"), data_expiracao, ultimo_aviso)))
+        return alvos
+
+    async def _despachar_alvos(self, despachante, guild, cargo, hoje, resumo, execucao, alvos, publicador):
+        """Processa [(posicao, alvo)] pelo despachante, concluindo cada posição na execução"""
+        metricas = metricas_checagem.atuais()
+
+        async def processar(posicao, alvo):
+            with metricas.acao("membro"):
+                await self._processar_alvo(despachante, guild, cargo, alvo, hoje, resumo, execucao, publicador)
+            with metricas.acao("sqlite"):
+                await executar(execucao.concluir_membro, posicao)
+            await publicador.membro_concluido()
+
+        await despachante.executar_todas(processar(posicao, alvo) for posicao, alvo in alvos)
+
+    async def _rodar_checar_assinaturas_uma_vez(self, modo: str = None, user_ids=None):
         """
         Versão 'unit test' da checagem:
         mesma lógica do loop, mas sem o decorator @tasks.loop
         e sem wait_until_ready. Usada nos testes.
+        modo: "banco" (padrão de MODO_CHECAGEM) ou "apelido" (varre o apelido de todos os membros).
+        user_ids: no modo "banco", checa só esses usuários (usado pela agenda).
+        Com METRICAS_CHECAGEM, grava o relatório de tempos da rodada (rodadas
+        incrementais só quando processaram algum membro).
         """
-        logger.info("Iniciando checagem de assinaturas (uma vez)...")
+        modo = modo or MODO_CHECAGEM
+        if METRICAS_CHECAGEM:
+            metricas = metricas_checagem.MetricasChecagem(modo)
+        else:
+            metricas = metricas_checagem.DESLIGADAS
+        async with self._lock_rodada:
+            token = metricas_checagem.ativar(metricas)
+            try:
+                resumo = await self._rodada_checagem(modo, user_ids, metricas)
+            finally:
+                metricas_checagem.desativar(token)
+        # Rodadas incrementais vazias não gravam: não tiram do !relatorio_checagem as rodadas reais
+        if metricas.ligadas and resumo is not None and (user_ids is None or resumo["processados"]):
+            await executar(metricas_checagem.salvar_relatorio, metricas.relatorio(resumo))
+
+    async def _rodada_checagem(self, modo: str, user_ids, metricas):
+        """Corpo da checagem; retorna o resumo (None se não rodou)"""
+        logger.info(f"Iniciando checagem de assinaturas (uma vez, modo {modo})...")
         guild = self.bot.get_guild(SERVER_ID)
         if not guild:
             logger.error("Servidor não encontrado!")
-            return
+            return None
         
-        resumo = {
-            "processados": 0,
-            "avisos_3": 0,
-            "avisos_hoje": 0,
-            "removidos": 0,
-            "removidos_info": [],
-            "erros_dm": 0,
-            "erros_permissao": 0,
-        }
+        resumo = _novo_resumo()
         
         canal_notificacao = guild.get_channel(NOTIFICACAO_CHANNEL_ID)
 
@@ -50,173 +421,200 @@ class ChecagemAssinaturas(commands.Cog):
         cargo = discord.utils.get(guild.roles, name=CARGO_ASSINANTE_NOME)
         if not cargo:
             logger.error(f"Cargo '{CARGO_ASSINANTE_NOME}' não encontrado!")
-            return
+            return None
 
-        for member in guild.members:
-            if member.bot:
-                continue
-            if not member.nick or " | " not in member.nick:
-                continue
+        despachante = Despachante(baldes=self._baldes)
+        # Progresso e detalhes dos removidos publicados durante a rodada, com despachante
+        # próprio: as edições do progresso não esperam atrás dos membros na fila
+        despachante_canal = Despachante(concorrencia=1, baldes=self._baldes)
+        publicador = PublicadorResumo(canal_notificacao, despachante_canal)
 
-            partes = member.nick.split("|")
-            if len(partes) < 2:
-                logger.warning(f"Formato de nick inesperado para {member.nick}")
-                continue
+        async def despachar(execucao, alvos):
+            publicador.esperar(len(alvos))
+            await self._despachar_alvos(despachante, guild, cargo, hoje, resumo, execucao, alvos, publicador)
 
-            data_str = partes[1].strip()
-            if not re.match(r"\d{2}/\d{2}/\d{4}$", data_str):
-                continue
+        # Rodada do dia interrompida (queda/reinício): termina os membros que faltaram primeiro
+        with metricas.fase("retomada"):
+            retomada = await executar(execucoes_checagem.retomar_execucao, hoje, self._instancia)
+            if retomada is not None:
+                execucao, restantes = retomada
+                alvos_retomados = await self._alvos_retomados(guild, execucao, restantes, resumo, publicador)
+                await despachar(execucao, alvos_retomados)
+                await executar(execucao.finalizar, resumo)
 
-            logger.debug(f"Extraindo data do nick de {member.name}: {data_str}")
-            try:
-                data_expiracao = datetime.datetime.strptime(data_str, "%d/%m/%Y").date()
-            except ValueError as e:
-                logger.error(f"Erro ao converter data para {member.nick}: {e}")
-                continue
+        # Seleção dos alvos: consulta no SQLite (ou apelidos) e resolução dos membros
+        with metricas.fase("alvos"):
+            if modo == "apelido":
+                alvos = await self._alvos_por_apelido(guild)
+            else:
+                alvos = await self._alvos_do_banco(guild, hoje, resumo, user_ids)
 
-            logger.debug(f"Data de expiração para {member.name}: {data_expiracao}")
-            
-            resumo["processados"] += 1
-
-            dias_restantes = (data_expiracao - hoje).days
-            assinatura_db = obter_assinatura(member.id)
-            
-            if not assinatura_db:
-                data_exp_datetime = datetime.datetime.combine(data_expiracao, datetime.time(0,0))
-                adicionar_assinatura(
-                    user_id=member.id,
-                    username=member.name,
-                    data_expiracao = data_exp_datetime,
-                    plano="Imprtado (nickname)"
-                )
-                assinatura_db = obter_assinatura(member.id)
-            ultimo_aviso = None
-            if assinatura_db and assinatura_db['ultimo_aviso']:
-                raw_aviso = assinatura_db['ultimo_aviso']
-                for fmt in (DB_DATETIME_FORMAT, LEGACY_DATETIME_FORMAT):
-                    try:
-                        ultimo_aviso = datetime.datetime.strptime(raw_aviso, fmt)
-                        break
-                    except ValueError:
-                        continue
-
-            # --- a partir daqui é o mesmo código que você já tem ---
-            if dias_restantes > 0:
-                if dias_restantes == 3:
-                    enviar_aviso = True
-
-                    if ultimo_aviso:
-                        horas_desde_ultimo = (datetime.datetime.now() - ultimo_aviso).total_seconds() / 3600
-                        if horas_desde_ultimo < 12:
-                            enviar_aviso = False
-
-                    if enviar_aviso:
-                        try:
-                            dm_channel = await member.create_dm()
-                            
-                            mensagem = (
-                                    f"🔔 Olá {member.name}, sua assinatura expira em **3 dias**!\n"
-                                    "Renove seu plano clicando no botão abaixo:"
-                                )
-                            registrar_aviso(member.id, "AVISO_3_DIAS")
-                            resumo["avisos_3"] += 1
-
-                            await dm_channel.send(mensagem, view=RenovarAssinaturaView(member))
-                            await asyncio.sleep(3)
-                            logger.info(f"Enviado aviso para {member.name} ({dias_restantes} dias restantes)")
-                        except Exception as e:
-                            resumo["erros_dm"] += 1
-                            logger.error(f"Erro ao enviar DM para {member.name}: {e}")
-
-            elif dias_restantes == 0:
-                if not ultimo_aviso or (datetime.datetime.now() - ultimo_aviso).total_seconds() >= 43200:
-                    try:
-                        dm_channel = await member.create_dm()
-                        await dm_channel.send(
-                            f"⚠️ **ATENÇÃO** {member.name}, sua assinatura **VENCE HOJE**!\n"
-                            "Você será removido do servidor AMANHÃ caso não renove.\n"
-                            "Renove imediatamente clicando no botão abaixo:",
-                            view=RenovarAssinaturaView(member)
-                        )
-                        await asyncio.sleep(3)
-                        registrar_aviso(member.id, "AVISO_EXPIRA_HOJE")
-                        resumo["avisos_hoje"] += 1
-                        logger.info(f"Aviso final enviado para {member.name}")
-                    except Exception as e:
-                        resumo["erros_dm"] += 1
-                        logger.error(f"Erro ao enviar DM final para {member.name}: {e}")
+        with metricas.fase("plano"):
+            execucao = await executar(
+                execucoes_checagem.iniciar_execucao,
+                modo,
+                hoje,
+                [(member.id, data_expiracao, ultimo_aviso) for member, _, data_expiracao, ultimo_aviso in alvos],
+                self._instancia,
+            )
+        with metricas.fase("despacho"):
+            await despachar(execucao, list(enumerate(alvos)))
 
-            elif dias_restantes < 0:
-                dias_atras = abs(dias_restantes)
-                if member == guild.owner:
-                    logger.warning(f"Tentativa de remover o dono do servidor ({member}). Ignorando.")
-                    continue
+        # Eventos do histórico desta rodada gravados de uma vez
+        with metricas.fase("historico"):
+            await descarregar_historico()
+            await executar(execucao.finalizar, resumo)
+
+        # Rodadas incrementais (user_ids) sem nenhuma ação não geram resumo no canal
+        houve_acao = any(resumo[chave] for chave in ("avisos_3", "avisos_hoje", "removidos", "erros_dm", "erros_permissao", "efeitos_na_fila"))
+        if canal_notificacao and (user_ids is None or houve_acao or publicador.iniciado):
+            with metricas.fase("resumo"):
                 try:
-                    try:
-                        dm_channel = await member.create_dm()
-                        if dias_atras == 1:
-                            texto_qtd = "há **1 dia**"
-                        else:
-                            texto_qtd = f"há **{dias_atras} dias**"
-                            
-                        await dm_channel.send(
-                            f"🚨 **SUA ASSINATURA EXPIROU** {member.name}!\n"
-                            f"Sua assinatura está vencida {texto_qtd} e você será removido do servidor.\n"
-                            "Para retornar, renove seu plano clicando no botão abaixo:",
-                            view=RenovarAssinaturaView(member)
-                        )
-                        await asyncio.sleep(3)
-                    except Exception:
-                        logger.warning(f"Não foi possível enviar DM para {member.name} antes da remoção")
-                    motivo_remocao = f"Assinatura expirada há {dias_atras} dia(s)"
-                    await member.remove_roles(cargo, reason=motivo_remocao)
-                    await asyncio.sleep(3)
-                    await member.kick(reason=motivo_remocao + " - Não renovada")
-                    await asyncio.sleep(3)
-                    atualizar_status_assinatura(
-                        member.id, 
-                        "EXPIRADA",
-                        f"Removido do servidor com {dias_atras} dias de atraso após a expiração"
-)
-                    resumo["removidos"] += 1
-                    resumo["removidos_info"].append(
-                        f"👤 {member.mention} ({member.name}) | Expirou em {data_str} | {dias_atras} dia(s) de atraso"
-                    )
-                    logger.info(
-                        f"Usuário {member.name} removido do servidor (assinatura expirada há {dias_atras} dia(s))"
+                    msg_resumo = (
+                        "📋 **RESUMO DA CHECAGEM DE ASSINATURAS**\n"
+                        f"👥 Membros com assinatura processados: **{resumo['processados']}**\n"
+                        f"🔔 Avisos enviados: "
+                        f"3d: **{resumo['avisos_3']}**, "
+                        f"hoje: **{resumo['avisos_hoje']}**\n"
+                        f"🚫 Removidos por expiração (1 dia após vencer): **{resumo['removidos']}**\n"
+                        f"⚠️ Falhas de DM: **{resumo['erros_dm']}** | "
+                        f"Falhas de permissão (kick/remover cargo): **{resumo['erros_permissao']}**"
                     )
-
-                except discord.Forbidden:
-                    resumo["erros_permissao"] += 1
-                    logger.error(f"Sem permissão para remover/kick {member.name}.")
+                    despacho = despachante.resumo()
+                    if despacho["acoes"]:
+                        msg_resumo += (
+                            f"\n📨 Chamadas ao Discord: **{despacho['acoes']}** "
+                            f"(falhas: **{despacho['falhas']}**, limitadas (429): **{despacho['limitadas']}**)"
+                        )
+                    if resumo["efeitos_na_fila"]:
+                        msg_resumo += f"\n📤 Avisos e remoções com efeitos na fila do outbox: **{resumo['efeitos_na_fila']}**"
+                    await publicador.finalizar(msg_resumo)
                 except Exception as e:
-                    logger.error(f"Erro ao processar remoção de {member.name}: {e}")
-
-        if canal_notificacao:
-            try:
-                msg_resumo = (
-                    "📋 **RESUMO DA CHECAGEM DE ASSINATURAS**\n"
-                    f"👥 Membros com assinatura processados: **{resumo['processados']}**\n"
-                    f"🔔 Avisos enviados: "
-                    f"3d: **{resumo['avisos_3']}**, "
-                    f"hoje: **{resumo['avisos_hoje']}**\n"
-                    f"🚫 Removidos por expiração (1 dia após vencer): **{resumo['removidos']}**\n"
-                    f"⚠️ Falhas de DM: **{resumo['erros_dm']}** | "
-                    f"Falhas de permissão (kick/remover cargo): **{resumo['erros_permissao']}**"
-                )
-                if resumo["removidos_info"]:
-                    msg_resumo += "\n\n**Detalhes dos removidos:**\n" + "\n".join(resumo["removidos_info"])
-                await canal_notificacao.send(msg_resumo)
-                await asyncio.sleep(3)
-            except Exception as e:
-                logger.error(f"Erro ao enviar resumo da checagem no canal de notificações: {e}")
+                    logger.error(f"Erro ao enviar resumo da checagem no canal de notificações: {e}")
 
+        for usado in (despachante, despachante_canal):
+            metricas.registrar_despacho(usado.resultados)
+        if resumo["fora_do_servidor"]:
+            logger.info(f"{resumo['fora_do_servidor']} assinaturas acionáveis de membros fora do servidor")
         logger.info("Checagem de assinaturas concluída.")
+        return resumo
         
-    @tasks.loop(hours=INTERVALO_CHECAGEM)
+    async def varredura_completa(self, modo: str = None):
+        """
+        Fallback da checagem incremental: reavalia todas as assinaturas nas janelas
+        de ação (ou todos os apelidos, no modo "apelido") e esvazia os pendentes lidos antes.
+        """
+        pendentes = await obter_pendentes()
+        await self._rodar_checar_assinaturas_uma_vez(modo=modo)
+        await limpar_pendentes(pendentes)
+
+    def _proxima_virada(self, agora: datetime.datetime) -> datetime.datetime:
+        """Horário da próxima virada do dia (HORA_EVENTOS, como os eventos da agenda)"""
+        dia = agora.date()
+        if self._ultima_virada == dia:
+            dia += datetime.timedelta(days=1)
+        return datetime.datetime.combine(dia, HORA_EVENTOS)
+
+    async def _rodar_incremental(self):
+        """
+        Checa só os membros pendentes (marcados por eventos e pela virada do dia)
+        e os usuários com eventos vencidos na agenda. As marcações só são apagadas
+        depois da rodada, então uma queda no meio reprocessa os mesmos membros.
+        """
+        agora = datetime.datetime.now()
+        if agora >= self._proxima_virada(agora):
+            await marcar_pendentes_virada(agora.date())
+            self._ultima_virada = agora.date()
+
+        vencidos = self._agenda.retirar_vencidos(agora)
+        pendentes = await obter_pendentes()
+        user_ids = list(dict.fromkeys(
+            [user_id for _, _, user_id in vencidos] + [user_id for user_id, _ in pendentes]
+        ))
+        if not user_ids:
+            return
+        logger.info(
+            f"Checagem incremental: {len(vencidos)} eventos vencidos, {len(pendentes)} membros pendentes "
+            f"({len(user_ids)} usuários)"
+        )
+        await self._rodar_checar_assinaturas_uma_vez(user_ids=user_ids)
+        await limpar_pendentes(pendentes)
+
+    async def _reconstruir_agenda(self):
+        await executar(reconstruir_do_banco, self._agenda)
+        self._ultima_reconstrucao = time.monotonic()
+
+    @tasks.loop(seconds=1)
     async def checar_assinaturas(self):
+        """
+        Dorme até o próximo prazo da agenda (ou até ela mudar) e então checa só os
+        usuários com eventos vencidos e os membros pendentes (no máximo a cada
+        INTERVALO_PENDENTES segundos enquanto houver algum). A agenda é montada do
+        banco na primeira volta e remontada a cada INTERVALO_CHECAGEM horas.
+        """
+        await self.bot.wait_until_ready()
+        if self._acordar is None:
+            self._loop = asyncio.get_running_loop()
+            self._acordar = asyncio.Event()
+        intervalo = INTERVALO_CHECAGEM * 3600
+        if self._ultima_reconstrucao is None or time.monotonic() - self._ultima_reconstrucao >= intervalo:
+            await self._reconstruir_agenda()
+
+        self._acordar.clear()
+        espera = intervalo - (time.monotonic() - self._ultima_reconstrucao)
+        prazo = self._agenda.proximo_prazo()
+        if prazo is not None:
+            espera = min(espera, (prazo - datetime.datetime.now()).total_seconds())
+        agora = datetime.datetime.now()
+        espera = min(espera, (self._proxima_virada(agora) - agora).total_seconds())
+        if await contar_pendentes():
+            espera = min(espera, INTERVALO_PENDENTES)
+        if espera > 0:
+            try:
+                await asyncio.wait_for(self._acordar.wait(), timeout=espera)
+                return  # a agenda mudou: recalcula o próximo prazo
+            except asyncio.TimeoutError:
+                pass
+
+        await self._rodar_incremental()
+
+    @tasks.loop(seconds=INTERVALO_OUTBOX)
+    async def drenar_efeitos(self):
+        """Executa os efeitos prontos do outbox (novas tentativas e o que ficou para trás numa queda)"""
+        await self.bot.wait_until_ready()
+        while await self._drenagem.drenar() >= outbox.LOTE_OUTBOX:
+            pass
+
+    @tasks.loop(seconds=30)
+    async def normalizar_datas(self):
+        """Converte datas legadas para ISO em lotes pequenos; para sozinha quando não há mais nada"""
+        await self.bot.wait_until_ready()
+        alteradas = await normalizar_datas_legadas()
+        if not alteradas:
+            logger.info("Nenhuma data legada restante no banco; normalização encerrada.")
+            self.normalizar_datas.cancel()
+
+    @tasks.loop(hours=INTERVALO_RETENCAO_HISTORICO)
+    async def manter_historico(self):
+        """Compacta avisos repetidos e arquiva o histórico antigo, um lote pequeno por vez"""
         await self.bot.wait_until_ready()
-        await self._rodar_checar_assinaturas_uma_vez()
+        total = {'compactadas': 0, 'arquivadas': 0, 'efeitos': 0}
+        for etapa, chave in (
+            (retencao_historico.compactar_avisos, 'compactadas'),
+            (retencao_historico.arquivar_lote, 'arquivadas'),
+            (outbox.limpar_concluidos, 'efeitos'),
+        ):
+            # Cada lote é uma transação curta; entre eles a escrita fica livre para o bot
+            while True:
+                linhas = await executar(etapa)
+                total[chave] += linhas
+                if not linhas:
+                    break
+        if any(total.values()):
+            logger.info(
+                f"Retenção do histórico: {total['compactadas']} avisos compactados, "
+                f"{total['arquivadas']} linhas arquivadas, {total['efeitos']} efeitos concluídos apagados do outbox"
+            )
 
 async def setup(bot):
     await bot.add_cog(ChecagemAssinaturas(bot))
\ No newline at end of file
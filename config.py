@@ -14,7 +14,21 @@ CARGO_ASSINANTE_NOME = "ASSINANTE"
 # Configurações do bot
 PREFIXO = "!"
 TEMPO_TIMEOUT_VIEW = 172800  # 48 horas em segundos
-INTERVALO_CHECAGEM = 12  # horas
+INTERVALO_CHECAGEM = 12  # horas (a checagem segue a agenda de prazos; nesse intervalo a agenda é remontada do banco)
+INTERVALO_RETENCAO_HISTORICO = 6  # horas
+INTERVALO_PENDENTES = 60  # segundos entre rodadas incrementais enquanto houver membros pendentes
+INTERVALO_OUTBOX = 30  # segundos entre as drenagens do outbox de efeitos no Discord
+# "banco": a checagem consulta só as assinaturas nas janelas de ação (3 dias, hoje, vencidas)
+# "apelido": modo antigo, lê a data do apelido de todos os membros do servidor
+MODO_CHECAGEM = "banco"
+# No modo "banco", também importa quem tem data no apelido e ainda não está no banco
+RECONCILIAR_APELIDOS = False
+# Resumo da checagem no canal: progresso editado no máximo a cada N segundos;
+# detalhes em páginas de embed até MAX_PAGINAS_RESUMO, depois em arquivo anexo
+INTERVALO_PROGRESSO_RESUMO = 10
+MAX_PAGINAS_RESUMO = 10
+# Tempos por fase/ação e contagem por ramo de cada rodada da checagem (!relatorio_checagem)
+METRICAS_CHECAGEM = True
 
 # URLs
 URL_COMPRA = "https://gustavocorrea.com.br/"
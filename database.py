@@ -1,228 +1,1149 @@
 # database.py
+import atexit
 import sqlite3
 import datetime
 from datetime import timedelta
+import json
 import logging
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 
+from migracoes import aplicar_migracoes, sql_texto_iso
+
+DB_PATH = 'assinaturas.db'
 DB_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
 LEGACY_DATETIME_FORMAT = "%d/%m/%Y %H:%M:%S"
 DISPLAY_FORMAT = "%d/%m/%Y"
 
+# Configuração das conexões
+TAMANHO_POOL_LEITURA = 4
+# Espera máxima por uma conexão de leitura livre (pool esgotado vira erro, não trava)
+TIMEOUT_POOL_LEITURA = 30
+BUSY_TIMEOUT_MS = 5000
+CACHE_STATEMENTS = 256
+
+# Quantidade máxima de parâmetros por consulta "IN (...)"
+TAMANHO_LOTE_IN = 500
+
+# Colunas "públicas" de assinaturas, na ordem usada pelo bot desde o início
+COLUNAS_ASSINATURA = "user_id, username, data_expiracao, plano, data_ativacao, status, ultimo_aviso"
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+# Colunas de data/hora que podem ter valores no formato legado
+COLUNAS_DATA_ASSINATURA = ("data_expiracao", "data_ativacao", "ultimo_aviso")
+
+# Cache de assinaturas em memória
+CACHE_TAMANHO_MAXIMO = 5000
+CACHE_TTL_SEGUNDOS = 600
+
+# Buffer do histórico: grava em uma transação quando junta N eventos ou após X segundos
+HISTORICO_LOTE_MAXIMO = 200
+HISTORICO_INTERVALO_SEGUNDOS = 2.0
+
 logger = logging.getLogger(__name__)
 
+class GerenciadorConexoes:
+    """
+    Mantém conexões SQLite abertas durante a vida do bot:
+    uma conexão de escrita (serializada por lock) e um pool pequeno de leitura.
+    Todas são configuradas uma única vez com WAL, synchronous=NORMAL,
+    busy timeout e cache de statements.
+    """
+
+    def __init__(self, caminho: str = DB_PATH, tamanho_pool: int = TAMANHO_POOL_LEITURA):
+        self.caminho = caminho
+        self.tamanho_pool = tamanho_pool
+        self._lock_escrita = threading.Lock()
+        self._lock_pool = threading.Lock()
+        self._conn_escrita = None
+        self._leitores = queue.LifoQueue()
+        self._todas = []
+
+    def _abrir(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.caminho,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            cached_statements=CACHE_STATEMENTS,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        self._todas.append(conn)
+        return conn
+
+    @contextmanager
+    def escrita(self):
+        """Entrega a conexão de escrita; faz commit no fim ou rollback em caso de erro"""
+        with self._lock_escrita:
+            if self._conn_escrita is None:
+                with self._lock_pool:
+                    self._conn_escrita = self._abrir()
+            conn = self._conn_escrita
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    @contextmanager
+    def leitura(self):
+        """Empresta uma conexão de leitura do pool (cria sob demanda até o limite)"""
+        try:
+            conn = self._leitores.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock_pool:
+                if len(self._todas) - (self._conn_escrita is not None) < self.tamanho_pool:
+                    conn = self._abrir()
+            if conn is None:
+                try:
+                    conn = self._leitores.get(timeout=TIMEOUT_POOL_LEITURA)
+                except queue.Empty:
+                    raise TimeoutError(
+                        f"Pool de leitura esgotado: nenhuma das {self.tamanho_pool} conexões "
+                        f"foi devolvida em {TIMEOUT_POOL_LEITURA}s"
+                    ) from None
+        try:
+            yield conn
+        finally:
+            self._leitores.put(conn)
+
+    def fechar(self):
+        """Fecha todas as conexões abertas pelo gerenciador"""
+        with self._lock_escrita, self._lock_pool:
+            for conn in self._todas:
+                try:
+                    conn.close()
+                except Exception as e:
+                    logger.warning(f"Erro ao fechar conexão: {e}")
+            self._todas = []
+            self._conn_escrita = None
+            self._leitores = queue.LifoQueue()
+
+class CacheAssinaturas:
+    """
+    Cache LRU com TTL das linhas de assinaturas (tuplas na ordem de COLUNAS_ASSINATURA).
+    Também guarda "não existe" (None) para evitar consultas repetidas de quem não assina.
+
+    As escritas do database.py atualizam o cache (write-through) enquanto seguram
+    o lock de escrita. Leituras só preenchem o cache se nenhuma escrita aconteceu
+    desde o início da consulta (contador de geração), para não gravar dado velho.
+    """
+
+    _INDICES = {coluna.strip(): i for i, coluna in enumerate(COLUNAS_ASSINATURA.split(","))}
+
+    def __init__(self, tamanho_maximo: int = CACHE_TAMANHO_MAXIMO, ttl: float = CACHE_TTL_SEGUNDOS, relogio=time.monotonic):
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self._relogio = relogio
+        self._dados = OrderedDict()  # user_id -> (expira_em, linha ou None)
+        self._lock = threading.Lock()
+        self.geracao = 0
+        self.acertos = 0
+        self.falhas = 0
+        self.despejos = 0
+
+    def obter(self, user_id: int):
+        """Retorna (encontrado, linha); linha None significa 'sabidamente não existe'"""
+        with self._lock:
+            item = self._dados.get(user_id)
+            if item is None or item[0] < self._relogio():
+                if item is not None:
+                    del self._dados[user_id]
+                self.falhas += 1
+                return False, None
+            self._dados.move_to_end(user_id)
+            self.acertos += 1
+            return True, item[1]
+
+    def _gravar(self, user_id: int, linha):
+        self._dados[user_id] = (self._relogio() + self.ttl, linha)
+        self._dados.move_to_end(user_id)
+        while len(self._dados) > self.tamanho_maximo:
+            self._dados.popitem(last=False)
+            self.despejos += 1
+
+    def guardar(self, user_id: int, linha):
+        """Grava o valor vindo de uma escrita no banco"""
+        with self._lock:
+            self.geracao += 1
+            self._gravar(user_id, linha)
+
+    def preencher(self, user_id: int, linha, geracao: int):
+        """Grava o valor vindo de uma leitura iniciada na geração informada"""
+        with self._lock:
+            if geracao == self.geracao and user_id not in self._dados:
+                self._gravar(user_id, linha)
+
+    def atualizar_campos(self, user_id: int, **campos):
+        """Altera colunas de uma linha em cache (se houver) após um UPDATE"""
+        with self._lock:
+            self.geracao += 1
+            item = self._dados.get(user_id)
+            if item is None or item[1] is None:
+                return
+            linha = list(item[1])
+            for coluna, valor in campos.items():
+                linha[self._INDICES[coluna]] = valor
+            self._dados[user_id] = (item[0], tuple(linha))
+
+    def remover(self, user_id: int):
+        with self._lock:
+            self.geracao += 1
+            self._dados.pop(user_id, None)
+
+    def limpar(self):
+        with self._lock:
+            self.geracao += 1
+            self._dados.clear()
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            total = self.acertos + self.falhas
+            return {
+                'tamanho': len(self._dados),
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'despejos': self.despejos,
+                'taxa_acerto': (self.acertos / total) if total else 0.0,
+            }
+
+_cache = CacheAssinaturas()
+
+def estatisticas_cache() -> dict:
+    """Contadores do cache de assinaturas (tamanho, acertos, falhas, despejos, taxa de acerto)"""
+    return _cache.estatisticas()
+
+SQL_INSERIR_HISTORICO = '''
+    INSERT INTO historico (user_id, acao, detalhes, data_hora)
+    VALUES (?, ?, ?, ?)
+'''
+
+def _evento_historico(user_id: int, acao: str, detalhes: str) -> tuple:
+    """Monta a linha do histórico já com a hora do evento (UTC, como o CURRENT_TIMESTAMP da tabela)"""
+    agora = datetime.datetime.now(datetime.timezone.utc)
+    return (user_id, acao, detalhes, agora.strftime(DB_DATETIME_FORMAT))
+
+class BufferHistorico:
+    """
+    Escritor append-only da tabela historico com group commit.
+    Os eventos ficam em memória e são gravados numa única transação quando o
+    buffer atinge o tamanho máximo, quando o evento mais antigo passa do
+    intervalo configurado (timer em thread daemon) ou no fechamento das conexões.
+    Se a gravação falhar, os eventos voltam para o início do buffer.
+    """
+
+    def __init__(self, lote_maximo: int = HISTORICO_LOTE_MAXIMO, intervalo: float = HISTORICO_INTERVALO_SEGUNDOS):
+        self.lote_maximo = lote_maximo
+        self.intervalo = intervalo
+        self._pendentes = []
+        self._lock = threading.Lock()
+        self._timer = None
+        self.descargas = 0
+        self.eventos_gravados = 0
+        self.falhas = 0
+        self.maior_lote = 0
+        self._lotes = deque(maxlen=256)
+        self._latencias = deque(maxlen=256)
+
+    def adicionar(self, evento: tuple):
+        """Enfileira um evento; descarrega na hora se o lote encheu"""
+        with self._lock:
+            self._pendentes.append(evento)
+            cheio = len(self._pendentes) >= self.lote_maximo
+            if not cheio and self._timer is None:
+                self._timer = threading.Timer(self.intervalo, self.descarregar)
+                self._timer.daemon = True
+                self._timer.start()
+        if cheio:
+            self.descarregar()
+
+    def _cancelar_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def descarregar(self) -> int:
+        """Grava todos os eventos pendentes numa transação; retorna quantos foram gravados"""
+        with self._lock:
+            lote = self._pendentes
+            self._pendentes = []
+            self._cancelar_timer()
+        if not lote:
+            return 0
+
+        inicio = time.perf_counter()
+        try:
+            with obter_gerenciador().escrita() as conn:
+                conn.executemany(SQL_INSERIR_HISTORICO, lote)
+        except Exception as e:
+            logger.error(f"Erro ao gravar {len(lote)} eventos do histórico: {e}")
+            with self._lock:
+                self.falhas += 1
+                self._pendentes[:0] = lote
+            return 0
+        latencia = time.perf_counter() - inicio
+
+        with self._lock:
+            self.descargas += 1
+            self.eventos_gravados += len(lote)
+            self.maior_lote = max(self.maior_lote, len(lote))
+            self._lotes.append(len(lote))
+            self._latencias.append(latencia)
+        return len(lote)
+
+    def descartar(self):
+        """Esquece os eventos pendentes (usado só quando o banco é trocado)"""
+        with self._lock:
+            self._pendentes = []
+            self._cancelar_timer()
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            latencias = sorted(self._latencias)
+            return {
+                'pendentes': len(self._pendentes),
+                'descargas': self.descargas,
+                'eventos_gravados': self.eventos_gravados,
+                'falhas': self.falhas,
+                'maior_lote': self.maior_lote,
+                'lote_medio': (sum(self._lotes) / len(self._lotes)) if self._lotes else 0.0,
+                'latencia_media_ms': (sum(latencias) / len(latencias) * 1000) if latencias else 0.0,
+                'latencia_max_ms': (latencias[-1] * 1000) if latencias else 0.0,
+            }
+
+_historico = BufferHistorico()
+
+def estatisticas_historico() -> dict:
+    """Métricas do buffer do histórico (pendentes, descargas, tamanho de lote, latência)"""
+    return _historico.estatisticas()
+
+def descarregar_historico() -> int:
+    """Força a gravação dos eventos do histórico que estão no buffer"""
+    return _historico.descarregar()
+
+# Scripts que encerram sem chamar fechar_conexoes() não perdem o que está no buffer
+atexit.register(descarregar_historico)
+
+# Ouvintes chamados depois de cada escrita confirmada em assinaturas (ex.: agenda de prazos)
+_ouvintes = []
+
+def registrar_ouvinte(ouvinte):
+    """
+    Registra ouvinte(user_id, data_expiracao, status), chamado depois do commit de
+    adicionar_assinatura(s) (data nova, status ATIVA) e de atualizar_status_assinatura
+    (data None). Roda na thread que fez a escrita.
+    """
+    if ouvinte not in _ouvintes:
+        _ouvintes.append(ouvinte)
+
+def remover_ouvinte(ouvinte):
+    if ouvinte in _ouvintes:
+        _ouvintes.remove(ouvinte)
+
+def _notificar(user_id: int, data_expiracao, status: str):
+    for ouvinte in list(_ouvintes):
+        try:
+            ouvinte(user_id, data_expiracao, status)
+        except Exception as e:
+            logger.warning(f"Erro em ouvinte de assinaturas: {e}")
+
+def para_epoch(dt: datetime.datetime) -> int:
+    """
+    Converte um datetime (horário local, sem fuso) em segundos desde 1970.
+    É o mesmo valor que o SQLite calcula com strftime('%s', texto) sobre as
+    colunas TEXT, então as colunas *_epoch podem ser preenchidas em SQL puro.
+    """
+    return int((dt - _EPOCH).total_seconds())
+
+# Quantas vezes o parser precisou cair no formato legado (deve tender a zero)
+_contador_formato_legado = 0
+_lock_contador_legado = threading.Lock()
+
+def parse_datetime_db(raw):
+    """
+    Converte a data/hora gravada no banco em datetime (None se vazia ou inválida).
+    O caminho normal é ISO via datetime.fromisoformat; o formato legado
+    dd/mm/YYYY só é tentado como fallback e fica registrado no contador.
+    """
+    global _contador_formato_legado
+    if not raw:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(raw)
+    except (TypeError, ValueError):
+        pass
+
+    try:
+        dt = datetime.datetime.strptime(raw, LEGACY_DATETIME_FORMAT)
+    except ValueError:
+        try:
+            dt = datetime.datetime.strptime(raw[:10], DISPLAY_FORMAT)
+        except ValueError:
+            return None
+
+    with _lock_contador_legado:
+        _contador_formato_legado += 1
+        primeira_vez = _contador_formato_legado == 1
+    if primeira_vez:
+        logger.warning(f"Data no formato legado encontrada no banco: {raw!r}")
+    return dt
+
+def contador_formato_legado() -> int:
+    """Total de datas em formato legado lidas desde que o bot iniciou"""
+    return _contador_formato_legado
+
+_gerenciador = None
+_lock_gerenciador = threading.Lock()
+
+def obter_gerenciador() -> GerenciadorConexoes:
+    """Retorna o gerenciador de conexões global (criado na primeira chamada)"""
+    global _gerenciador
+    with _lock_gerenciador:
+        if _gerenciador is None:
+            _gerenciador = GerenciadorConexoes(DB_PATH)
+        return _gerenciador
+
+def fechar_conexoes():
+    """Grava o histórico pendente e fecha o gerenciador global; a próxima chamada abre conexões novas"""
+    global _gerenciador
+    if _gerenciador is not None:
+        _historico.descarregar()
+    _historico.descartar()
+    with _lock_gerenciador:
+        if _gerenciador is not None:
+            _gerenciador.fechar()
+            _gerenciador = None
+    _cache.limpar()
+
 def init_db():
-    """Inicializa o banco de dados SQLite"""
+    """Inicializa o banco de dados SQLite, aplicando as migrações pendentes"""
     try: 
-        conn = sqlite3.connect('assinaturas.db')
-        cursor = conn.cursor()
-    
-        # Tabela principal de assinaturas
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS assinaturas(
-                user_id INTEGER PRIMARY KEY,
-                username TEXT NOT NULL,
-                data_expiracao TEXT NOT NULL,
-                plano TEXT NOT NULL,
-                data_ativacao TEXT NOT NULL,
-                status TEXT NOT NULL,
-                ultimo_aviso TEXT
-            )
-        ''')
-        
-        # Tabela de histórico
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS historico(
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                acao TEXT NOT NULL,
-                detalhes TEXT,
-                data_hora TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        with obter_gerenciador().escrita() as conn:
+            versao = aplicar_migracoes(conn)
+        _cache.limpar()
         
-        conn.commit()
-        conn.close()
-        logger.info("Banco de dados inicializado com sucesso!")
+        logger.info(f"Banco de dados inicializado com sucesso! (schema v{versao})")
         return True
     except Exception as e:
         logger.error(f"Erro ao inicializar Banco de dados: {e}")
         return False
 
-def adicionar_assinatura(user_id: int, username: str, data_expiracao: datetime.datetime, plano: str):
-    """Adiciona ou atualiza uma assinatura no banco de dados"""
+# Insere ou, se o usuário já existir, renova a assinatura (zera o último aviso)
+SQL_UPSERT_ASSINATURA = '''
+    INSERT INTO assinaturas 
+    (user_id, username, data_expiracao, plano, data_ativacao, status, ultimo_aviso,
+     data_expiracao_epoch, data_ativacao_epoch, ultimo_aviso_epoch)
+    VALUES (?, ?, ?, ?, ?, 'ATIVA', NULL, ?, ?, NULL)
+    ON CONFLICT(user_id) DO UPDATE SET
+        username = excluded.username,
+        data_expiracao = excluded.data_expiracao,
+        plano = excluded.plano,
+        data_ativacao = excluded.data_ativacao,
+        status = excluded.status,
+        ultimo_aviso = NULL,
+        data_expiracao_epoch = excluded.data_expiracao_epoch,
+        data_ativacao_epoch = excluded.data_ativacao_epoch,
+        ultimo_aviso_epoch = NULL
+'''
+
+def _parametros_upsert(user_id: int, username: str, data_expiracao: datetime.datetime, plano: str, data_ativacao: datetime.datetime):
+    """Parâmetros do SQL_UPSERT_ASSINATURA; os 5 primeiros também formam a linha em cache"""
+    return (
+        user_id,
+        username,
+        data_expiracao.strftime(DB_DATETIME_FORMAT),
+        plano,
+        data_ativacao.strftime(DB_DATETIME_FORMAT),
+        para_epoch(data_expiracao),
+        para_epoch(data_ativacao),
+    )
+
+def _linha_upsert(parametros) -> tuple:
+    """Linha (na ordem de COLUNAS_ASSINATURA) que o upsert deixa gravada"""
+    return parametros[:5] + ("ATIVA", None)
+
+def adicionar_assinatura(user_id: int, username: str, data_expiracao: datetime.datetime, plano: str, efeitos=None):
+    """
+    Adiciona ou atualiza uma assinatura no banco de dados.
+    efeitos: efeitos no Discord [(chave, tipo, user_id, dados)] enfileirados no outbox na mesma transação.
+    """
     try:
-        conn = sqlite3.connect('assinaturas.db')
-        cursor = conn.cursor()
-        
-        data_exp_str = data_expiracao.strftime(DB_DATETIME_FORMAT)
-        data_ativacao = datetime.datetime.now().strftime(DB_DATETIME_FORMAT)
+        data_ativacao = datetime.datetime.now()
+        parametros = _parametros_upsert(user_id, username, data_expiracao, plano, data_ativacao)
         
-        # VERIFICAR se o usuário já existe
-        cursor.execute('SELECT user_id FROM assinaturas WHERE user_id = ?', (user_id,))
-        existe = cursor.fetchone()
-        
-        if existe:
-            # ATUALIZAR
-            cursor.execute('''
-                UPDATE assinaturas 
-                SET username = ?, data_expiracao = ?, plano = ?, data_ativacao = ?, status = ?, ultimo_aviso = NULL
-                WHERE user_id = ?
-            ''', (username, data_exp_str, plano, data_ativacao, "ATIVA", user_id))
-        else:
-            # INSERIR NOVO
-            cursor.execute('''
-                INSERT INTO assinaturas 
-                (user_id, username, data_expiracao, plano, data_ativacao, status)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (user_id, username, data_exp_str, plano, data_ativacao, "ATIVA"))
+        with obter_gerenciador().escrita() as conn:
+            conn.execute(SQL_UPSERT_ASSINATURA, parametros)
+            _enfileirar_efeitos(conn, efeitos)
+            _cache.guardar(user_id, _linha_upsert(parametros))
+        _notificar(user_id, data_expiracao, "ATIVA")
         
-        conn.commit()
-        conn.close()
         logger.info(f"Assinatura adicionada/atualizada para {username} (ID: {user_id})")
         return True
     except Exception as e:
+        _cache.remover(user_id)
         logger.error(f"Error ao adicionar assinatura: {e}")
         return False
 
-def atualizar_status_assinatura(user_id: int, status: str, motivo: str = ""):
-    """Atualiza o status de uma assinatura"""
+def adicionar_assinaturas_em_lote(registros) -> int:
+    """
+    Adiciona ou atualiza várias assinaturas numa única transação.
+    Cada registro é uma tupla (user_id, username, data_expiracao, plano).
+    Retorna a quantidade de registros gravados (0 em caso de erro).
+    """
     try:
-        conn = sqlite3.connect('assinaturas.db')
-        cursor = conn.cursor()
+        data_ativacao = datetime.datetime.now()
+        parametros = [
+            _parametros_upsert(user_id, username, data_expiracao, plano, data_ativacao)
+            for user_id, username, data_expiracao, plano in registros
+        ]
+        if not parametros:
+            return 0
         
-        cursor.execute('''
-            UPDATE assinaturas SET status = ? WHERE user_id = ?
-        ''', (status, user_id))
-
-        # Registrar no histórico
-        cursor.execute('''
-            INSERT INTO historico (user_id, acao, detalhes)
-            VALUES (?, ?, ?)
-        ''', (user_id, f"STATUS_{status}", motivo))
+        with obter_gerenciador().escrita() as conn:
+            conn.executemany(SQL_UPSERT_ASSINATURA, parametros)
+            for parametro in parametros:
+                _cache.guardar(parametro[0], _linha_upsert(parametro))
+        if _ouvintes:
+            for parametro in parametros:
+                _notificar(parametro[0], _EPOCH + timedelta(seconds=parametro[5]), "ATIVA")
+        
+        logger.info(f"{len(parametros)} assinaturas adicionadas/atualizadas em lote")
+        return len(parametros)
+    except Exception as e:
+        _cache.limpar()
+        logger.error(f"Erro ao adicionar assinaturas em lote: {e}")
+        return 0
+
+def atualizar_status_assinatura(user_id: int, status: str, motivo: str = "", imediato: bool = False,
+                                efeitos=None):
+    """
+    Atualiza o status de uma assinatura.
+    O evento do histórico vai para o buffer; com imediato=True ele é gravado
+    na mesma transação da mudança de status. Os efeitos (outbox) sempre entram nela.
+    """
+    try:
+        evento = _evento_historico(user_id, f"STATUS_{status}", motivo)
+        with obter_gerenciador().escrita() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                UPDATE assinaturas SET status = ? WHERE user_id = ?
+            ''', (status, user_id))
+            _enfileirar_efeitos(conn, efeitos)
+
+            # Registrar no histórico
+            if imediato:
+                cursor.execute(SQL_INSERIR_HISTORICO, evento)
+            _cache.atualizar_campos(user_id, status=status)
+        if not imediato:
+            _historico.adicionar(evento)
+        _notificar(user_id, None, status)
         
-        conn.commit()
-        conn.close()
         logger.info(f"Status atualizado para usuário {user_id}: {status}")
         return True
     except Exception as e:
+        _cache.remover(user_id)
         logger.error(f"Erro ao atualizar status: {e}")
         return False
 
-def registrar_aviso(user_id: int, tipo_aviso: str):
-    """Registra quando um aviso foi enviado"""
+def registrar_aviso(user_id: int, tipo_aviso: str, imediato: bool = False, efeitos=None):
+    """
+    Registra quando um aviso foi enviado (histórico bufferizado, como em atualizar_status_assinatura).
+    efeitos: a DM do aviso, enfileirada no outbox na mesma transação.
+    """
     try:
-        conn = sqlite3.connect('assinaturas.db')
-        cursor = conn.cursor()
-        
-        data_aviso =  datetime.datetime.now().strftime(DB_DATETIME_FORMAT)
-        cursor.execute('''
-            UPDATE assinaturas SET ultimo_aviso = ? WHERE user_id = ?
-        ''', (data_aviso, user_id))
-        
-        # Registrar no histórico
-        cursor.execute('''
-            INSERT INTO historico (user_id, acao, detalhes)
-            VALUES (?, ?, ?)
-        ''', (user_id, "AVISO", f"Tipo: {tipo_aviso}"))
+        agora = datetime.datetime.now()
+        data_aviso = agora.strftime(DB_DATETIME_FORMAT)
+        evento = _evento_historico(user_id, "AVISO", f"Tipo: {tipo_aviso}")
+        with obter_gerenciador().escrita() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                UPDATE assinaturas SET ultimo_aviso = ?, ultimo_aviso_epoch = ? WHERE user_id = ?
+            ''', (data_aviso, para_epoch(agora), user_id))
+            _enfileirar_efeitos(conn, efeitos)
+            
+            # Registrar no histórico
+            if imediato:
+                cursor.execute(SQL_INSERIR_HISTORICO, evento)
+            _cache.atualizar_campos(user_id, ultimo_aviso=data_aviso)
+        if not imediato:
+            _historico.adicionar(evento)
         
-        conn.commit()
-        conn.close()
         return True
     except Exception as e:
+        _cache.remover(user_id)
         logger.error(f"Erro ao registrar aviso: {e}")
         return False
 
+class Assinatura:
+    """
+    Registro compacto de uma assinatura, com as datas já convertidas em datetime.
+    Usa __slots__ (sem __dict__ por instância) e é montado direto pelo row factory
+    fabrica_assinatura. O acesso por índice segue a ordem de COLUNAS_ASSINATURA,
+    para o código que ainda trata a linha como tupla.
+    """
+
+    __slots__ = ('user_id', 'username', 'data_expiracao', 'plano', 'data_ativacao', 'status', 'ultimo_aviso')
+
+    def __init__(self, user_id, username, data_expiracao, plano, data_ativacao, status, ultimo_aviso):
+        self.user_id = user_id
+        self.username = username
+        self.data_expiracao = data_expiracao
+        self.plano = plano
+        self.data_ativacao = data_ativacao
+        self.status = status
+        self.ultimo_aviso = ultimo_aviso
+
+    @classmethod
+    def da_linha(cls, linha):
+        """Monta o registro a partir de uma tupla na ordem de COLUNAS_ASSINATURA (datas em texto)"""
+        return cls(
+            linha[0], linha[1], parse_datetime_db(linha[2]), linha[3],
+            parse_datetime_db(linha[4]), linha[5], parse_datetime_db(linha[6]),
+        )
+
+    @classmethod
+    def do_dict(cls, dados: dict):
+        """Monta o registro a partir do dicionário de obter_assinatura (chaves ausentes viram None)"""
+        return cls.da_linha([dados.get(coluna) for coluna in cls.__slots__])
+
+    def __getitem__(self, indice):
+        return getattr(self, self.__slots__[indice])
+
+    def __eq__(self, outro):
+        if not isinstance(outro, Assinatura):
+            return NotImplemented
+        return all(getattr(self, c) == getattr(outro, c) for c in self.__slots__)
+
+    def __repr__(self):
+        return f"Assinatura(user_id={self.user_id!r}, username={self.username!r}, status={self.status!r})"
+
+def fabrica_assinatura(cursor, linha):
+    """Row factory do sqlite3 para consultas que selecionam COLUNAS_ASSINATURA"""
+    return Assinatura.da_linha(linha)
+
+def como_assinatura(valor):
+    """Normaliza Assinatura, tupla do banco ou dicionário para Assinatura (None continua None)"""
+    if valor is None or isinstance(valor, Assinatura):
+        return valor
+    if isinstance(valor, dict):
+        return Assinatura.do_dict(valor)
+    return Assinatura.da_linha(valor)
+
+def _linha_para_dict(resultado) -> dict:
+    """Converte uma linha da tabela assinaturas no dicionário usado pelo bot"""
+    return {
+        'user_id': resultado[0],
+        'username': resultado[1],
+        'data_expiracao': resultado[2],
+        'plano': resultado[3],
+        'data_ativacao': resultado[4],
+        'status': resultado[5],
+        'ultimo_aviso': resultado[6]
+    }
+
+def _obter_linha(user_id: int):
+    """Tupla da assinatura (do cache, quando possível) ou None"""
+    encontrado, resultado = _cache.obter(user_id)
+    if not encontrado:
+        geracao = _cache.geracao
+        with obter_gerenciador().leitura() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT {COLUNAS_ASSINATURA} FROM assinaturas WHERE user_id = ?', (user_id,))
+            resultado = cursor.fetchone()
+        _cache.preencher(user_id, resultado, geracao)
+    return resultado
+
+def _obter_linhas_por_ids(user_ids) -> dict:
+    """{user_id: tupla} das assinaturas existentes; cache primeiro, o resto em lotes de IN (...)"""
+    linhas = {}
+    faltantes = []
+    for user_id in dict.fromkeys(user_ids):
+        encontrado, linha = _cache.obter(user_id)
+        if not encontrado:
+            faltantes.append(user_id)
+        elif linha is not None:
+            linhas[user_id] = linha
+
+    if faltantes:
+        geracao = _cache.geracao
+        do_banco = {}
+        with obter_gerenciador().leitura() as conn:
+            cursor = conn.cursor()
+            for inicio in range(0, len(faltantes), TAMANHO_LOTE_IN):
+                lote = faltantes[inicio:inicio + TAMANHO_LOTE_IN]
+                marcadores = ",".join("?" * len(lote))
+                cursor.execute(
+                    f'SELECT {COLUNAS_ASSINATURA} FROM assinaturas WHERE user_id IN ({marcadores})', lote
+                )
+                for resultado in cursor.fetchall():
+                    do_banco[resultado[0]] = resultado
+        for user_id in faltantes:
+            linha = do_banco.get(user_id)
+            _cache.preencher(user_id, linha, geracao)
+            if linha is not None:
+                linhas[user_id] = linha
+    return linhas
+
 def obter_assinatura(user_id: int):
-    """Obtém informações de uma assinatura específica"""
+    """Obtém informações de uma assinatura específica (do cache, quando possível)"""
     try:
-        conn = sqlite3.connect('assinaturas.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM assinaturas WHERE user_id = ?', (user_id,))
-        resultado = cursor.fetchone()
-        conn.close()
-        
+        resultado = _obter_linha(user_id)
         if resultado:
-            return {
-                'user_id': resultado[0],
-                'username': resultado[1],
-                'data_expiracao': resultado[2],
-                'plano': resultado[3],
-                'data_ativacao': resultado[4],
-                'status': resultado[5],
-                'ultimo_aviso': resultado[6]
-            }
+            return _linha_para_dict(resultado)
+        return None
+    except Exception as e:
+        logger.error(f"Erro ao obter assinatura: {e}")
+        return None
+
+def obter_registro_assinatura(user_id: int):
+    """Como obter_assinatura, mas devolve um Assinatura com as datas já convertidas"""
+    try:
+        resultado = _obter_linha(user_id)
+        if resultado:
+            return Assinatura.da_linha(resultado)
         return None
     except Exception as e:
         logger.error(f"Erro ao obter assinatura: {e}")
         return None
 
+def obter_assinaturas_por_ids(user_ids) -> dict:
+    """Obtém várias assinaturas de uma vez, em lotes de IN (...); retorna {user_id: assinatura}"""
+    try:
+        return {user_id: _linha_para_dict(linha) for user_id, linha in _obter_linhas_por_ids(user_ids).items()}
+    except Exception as e:
+        logger.error(f"Erro ao obter assinaturas por ids: {e}")
+        return {}
+
+def obter_registros_por_ids(user_ids) -> dict:
+    """Como obter_assinaturas_por_ids, mas com registros Assinatura: {user_id: Assinatura}"""
+    try:
+        return {user_id: Assinatura.da_linha(linha) for user_id, linha in _obter_linhas_por_ids(user_ids).items()}
+    except Exception as e:
+        logger.error(f"Erro ao obter assinaturas por ids: {e}")
+        return {}
+
 def obter_todas_assinaturas():
-    """Obtém todas as assinaturas do banco de dados"""
+    """Obtém todas as assinaturas do banco de dados (e aquece o cache com elas)"""
     try:
-        conn = sqlite3.connect('assinaturas.db')
-        cursor = conn.cursor()
+        geracao = _cache.geracao
+        with obter_gerenciador().leitura() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT {COLUNAS_ASSINATURA} FROM assinaturas ORDER BY data_expiracao_epoch')
+            resultados = cursor.fetchall()
         
-        cursor.execute('SELECT * FROM assinaturas ORDER BY data_expiracao')
-        resultados = cursor.fetchall()
-        conn.close()
-        
-        assinaturas = []
         for resultado in resultados:
-            assinaturas.append({
-                'user_id': resultado[0],
-                'username': resultado[1],
-                'data_expiracao': resultado[2],
-                'plano': resultado[3],
-                'data_ativacao': resultado[4],
-                'status': resultado[5],
-                'ultimo_aviso': resultado[6]
-            })
-        return assinaturas
+            _cache.preencher(resultado[0], resultado, geracao)
+        return [_linha_para_dict(resultado) for resultado in resultados]
     except Exception as e:
         logger.error(f"Erro ao obter assinaturas: {e}")
         return []
 
-def obter_resumo_assinaturas():
-    """Obtém um resumo completo das assinaturas"""
+def obter_resumo_assinaturas(limite_ativas: int = 10, limite_pendentes: int = 5, limite_expiradas: int = 5):
+    """
+    Obtém um resumo das assinaturas: as contagens saem de uma única consulta
+    agregada e as listas trazem só os primeiros registros Assinatura de cada grupo
+    (o relatório completo é lido em streaming com iterar_assinaturas).
+    """
     try:
-        conn = sqlite3.connect('assinaturas.db')
-        cursor = conn.cursor()
-        
-        # Contagem por status
-        cursor.execute('SELECT status, COUNT(*) FROM assinaturas GROUP BY status')
-        status_counts = dict(cursor.fetchall())
-        
-        # Assinaturas ativas
-        cursor.execute('SELECT * FROM assinaturas WHERE status = "ATIVA" ORDER BY data_expiracao')
-        ativas = cursor.fetchall()
-        
-        # Assinaturas expiradas
-        cursor.execute('SELECT * FROM assinaturas WHERE status = "EXPIRADA" ORDER BY data_expiracao')
-        expiradas = cursor.fetchall()
-        
-        # Assinaturas pendentes (a expirar em até 5 dias)
+        # Assinaturas pendentes (a expirar em até 5 dias, ou seja, antes do 6º dia)
         hoje = datetime.datetime.now().date()
-        limite = (hoje + timedelta(days=5)).strftime("%Y-%m-%d")
+        limite = para_epoch(datetime.datetime.combine(hoje + timedelta(days=6), datetime.time(0, 0)))
         
-        cursor.execute('''
-            SELECT * FROM assinaturas 
-            WHERE status = "ATIVA" 
-            AND date(data_expiracao) <= ?
-            ORDER BY data_expiracao
-        ''', (limite,))
-        pendentes = cursor.fetchall()
-        
-        conn.close()
+        with obter_gerenciador().leitura() as conn:
+            cursor = conn.cursor()
+            
+            # Contagem por status e de pendentes numa só passada pelo índice
+            cursor.execute('''
+                SELECT status, COUNT(*), SUM(data_expiracao_epoch < ?)
+                FROM assinaturas GROUP BY status
+            ''', (limite,))
+            contagens = {status: (total, pendentes or 0) for status, total, pendentes in cursor.fetchall()}
+            
+            # As listas vêm como registros Assinatura, com as datas já convertidas
+            cursor.row_factory = fabrica_assinatura
+            
+            # Primeiras assinaturas ativas (as que vencem antes)
+            ativas = []
+            if limite_ativas:
+                cursor.execute(f'''
+                    SELECT {COLUNAS_ASSINATURA} FROM assinaturas
+                    WHERE status = 'ATIVA' ORDER BY data_expiracao_epoch LIMIT ?
+                ''', (limite_ativas,))
+                ativas = cursor.fetchall()
+            
+            # Expiradas mais recentes
+            expiradas = []
+            if limite_expiradas:
+                cursor.execute(f'''
+                    SELECT {COLUNAS_ASSINATURA} FROM assinaturas
+                    WHERE status = 'EXPIRADA' ORDER BY data_expiracao_epoch DESC LIMIT ?
+                ''', (limite_expiradas,))
+                expiradas = cursor.fetchall()
+            
+            pendentes = []
+            if limite_pendentes:
+                cursor.execute(f'''
+                    SELECT {COLUNAS_ASSINATURA} FROM assinaturas 
+                    WHERE status = 'ATIVA' 
+                    AND data_expiracao_epoch < ?
+                    ORDER BY data_expiracao_epoch LIMIT ?
+                ''', (limite, limite_pendentes))
+                pendentes = cursor.fetchall()
         
         return {
-            'total_ativas': status_counts.get('ATIVA', 0),
-            'total_expiradas': status_counts.get('EXPIRADA', 0),
-            'total_pendentes': len(pendentes),
+            'total_ativas': contagens.get('ATIVA', (0, 0))[0],
+            'total_expiradas': contagens.get('EXPIRADA', (0, 0))[0],
+            'total_pendentes': contagens.get('ATIVA', (0, 0))[1],
             'ativas': ativas,
             'expiradas': expiradas,
             'pendentes': pendentes
         }
     except Exception as e:
         logger.error(f"Erro ao obter resumo: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def obter_assinaturas_acionaveis(hoje: datetime.date = None, dias_aviso: int = 3) -> list:
+    """
+    Assinaturas ATIVAS que pedem alguma ação da checagem: vencem daqui a dias_aviso dias,
+    vencem hoje ou já venceram. Uma faixa do índice (status, data_expiracao_epoch),
+    então o custo acompanha o número de assinaturas nessas janelas, não o tamanho do servidor.
+    Retorna registros Assinatura ordenados pela expiração.
+    """
+    try:
+        hoje = hoje or datetime.datetime.now().date()
+        inicio = datetime.datetime.combine(hoje, datetime.time(0, 0))
+        amanha = para_epoch(inicio + timedelta(days=1))
+        aviso_de = para_epoch(inicio + timedelta(days=dias_aviso))
+        aviso_ate = para_epoch(inicio + timedelta(days=dias_aviso + 1))
+        with obter_gerenciador().leitura() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = fabrica_assinatura
+            cursor.execute(f'''
+                SELECT {COLUNAS_ASSINATURA} FROM assinaturas
+                WHERE status = 'ATIVA' AND data_expiracao_epoch < ?
+                AND (data_expiracao_epoch < ? OR data_expiracao_epoch >= ?)
+                ORDER BY data_expiracao_epoch
+            ''', (aviso_ate, amanha, aviso_de))
+            return cursor.fetchall()
+    except Exception as e:
+        logger.error(f"Erro ao obter assinaturas acionáveis: {e}")
+        return []
+
+# =====================================================
+# MEMBROS PENDENTES (dirty set da checagem)
+# Cada marcação incrementa a versão do usuário; a checagem só apaga a
+# versão que leu, então uma marcação feita durante a rodada não se perde.
+# =====================================================
+
+SQL_MARCAR_PENDENTE = '''
+    INSERT INTO membros_pendentes (user_id, motivo, versao, marcado_em)
+    VALUES (?, ?, 1, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+        motivo = excluded.motivo,
+        versao = membros_pendentes.versao + 1,
+        marcado_em = excluded.marcado_em
+'''
+
+def marcar_pendentes(user_ids, motivo: str) -> int:
+    """Marca usuários para reavaliação na próxima checagem. Retorna quantos foram marcados"""
+    try:
+        agora = datetime.datetime.now().strftime(DB_DATETIME_FORMAT)
+        parametros = [(user_id, motivo, agora) for user_id in dict.fromkeys(user_ids)]
+        if not parametros:
+            return 0
+        with obter_gerenciador().escrita() as conn:
+            conn.executemany(SQL_MARCAR_PENDENTE, parametros)
+        return len(parametros)
+    except Exception as e:
+        logger.error(f"Erro ao marcar membros pendentes: {e}")
+        return 0
+
+def marcar_pendentes_virada(hoje: datetime.date = None, dias_aviso: int = 3) -> int:
+    """
+    Virada do dia: marca as assinaturas ATIVAS que acabaram de entrar numa janela
+    de ação (vencem em dias_aviso dias, vencem hoje, venceram ontem).
+    Três coortes do calendário de expiração, num único INSERT ... SELECT.
+    """
+    try:
+        hoje = hoje or datetime.datetime.now().date()
+        dias = [dia_calendario(hoje + timedelta(days=d)) for d in (dias_aviso, 0, -1)]
+        agora = datetime.datetime.now().strftime(DB_DATETIME_FORMAT)
+        with obter_gerenciador().escrita() as conn:
+            cursor = conn.execute('''
+                INSERT INTO membros_pendentes (user_id, motivo, versao, marcado_em)
+                SELECT user_id, 'VIRADA_DIA', 1, ? FROM calendario_expiracao
+                WHERE dia IN (?, ?, ?) AND status = 'ATIVA'
+                ON CONFLICT(user_id) DO UPDATE SET
+                    motivo = excluded.motivo,
+                    versao = membros_pendentes.versao + 1,
+                    marcado_em = excluded.marcado_em
+            ''', (agora, *dias))
+            marcados = cursor.rowcount
+        if marcados:
+            logger.info(f"Virada do dia {hoje}: {marcados} assinaturas entraram numa janela de ação")
+        return marcados
+    except Exception as e:
+        logger.error(f"Erro ao marcar pendentes da virada do dia: {e}")
+        return 0
+
+def obter_pendentes(limite: int = None) -> list:
+    """[(user_id, versao)] dos membros marcados, dos mais antigos para os mais novos"""
+    try:
+        with obter_gerenciador().leitura() as conn:
+            return conn.execute('''
+                SELECT user_id, versao FROM membros_pendentes
+                ORDER BY marcado_em LIMIT ?
+            ''', (-1 if limite is None else limite,)).fetchall()
+    except Exception as e:
+        logger.error(f"Erro ao obter membros pendentes: {e}")
+        return []
+
+def limpar_pendentes(pendentes) -> int:
+    """Apaga as marcações [(user_id, versao)] já processadas (só se a versão não mudou)"""
+    try:
+        pendentes = list(pendentes)
+        if not pendentes:
+            return 0
+        with obter_gerenciador().escrita() as conn:
+            cursor = conn.executemany(
+                "DELETE FROM membros_pendentes WHERE user_id = ? AND versao = ?", pendentes
+            )
+            return cursor.rowcount
+    except Exception as e:
+        logger.error(f"Erro ao limpar membros pendentes: {e}")
+        return 0
+
+def contar_pendentes() -> int:
+    """Quantidade de membros marcados para reavaliação"""
+    try:
+        with obter_gerenciador().leitura() as conn:
+            return conn.execute("SELECT COUNT(*) FROM membros_pendentes").fetchone()[0]
+    except Exception as e:
+        logger.error(f"Erro ao contar membros pendentes: {e}")
+        return 0
+
+# =====================================================
+# CALENDÁRIO DE EXPIRAÇÃO
+# Tabela calendario_expiracao (dia, user_id, status), mantida por triggers
+# em assinaturas (migração v8): toda escrita, inclusive renovação e mudança
+# de status, atualiza o calendário na mesma transação. A coorte de um dia
+# é uma faixa da chave primária (dia, user_id).
+# =====================================================
+
+SEGUNDOS_DIA = 86400
+
+def dia_calendario(data) -> int:
+    """Número do dia no calendário (mesma conta dos triggers: epoch / 86400)"""
+    if isinstance(data, datetime.datetime):
+        data = data.date()
+    return para_epoch(datetime.datetime.combine(data, datetime.time(0, 0))) // SEGUNDOS_DIA
+
+def obter_coorte(data, status: str = 'ATIVA') -> list:
+    """user_ids que expiram no dia (com o status informado; None = qualquer status)"""
+    try:
+        dia = dia_calendario(data)
+        with obter_gerenciador().leitura() as conn:
+            if status is None:
+                linhas = conn.execute(
+                    "SELECT user_id FROM calendario_expiracao WHERE dia = ?", (dia,)
+                ).fetchall()
+            else:
+                linhas = conn.execute(
+                    "SELECT user_id FROM calendario_expiracao WHERE dia = ? AND status = ?", (dia, status)
+                ).fetchall()
+        return [user_id for (user_id,) in linhas]
+    except Exception as e:
+        logger.error(f"Erro ao obter coorte de expiração de {data}: {e}")
+        return []
+
+def contar_coortes(de, ate, status: str = 'ATIVA') -> dict:
+    """{date: quantidade} dos dias de 'de' a 'ate' (inclusive) que têm alguma expiração"""
+    try:
+        with obter_gerenciador().leitura() as conn:
+            linhas = conn.execute('''
+                SELECT dia, COUNT(*) FROM calendario_expiracao
+                WHERE dia BETWEEN ? AND ? AND status = ?
+                GROUP BY dia
+            ''', (dia_calendario(de), dia_calendario(ate), status)).fetchall()
+        return {(_EPOCH + timedelta(days=dia)).date(): quantidade for dia, quantidade in linhas}
+    except Exception as e:
+        logger.error(f"Erro ao contar coortes de expiração: {e}")
+        return {}
+
+SQL_CALENDARIO_ESPERADO = '''
+    SELECT data_expiracao_epoch / 86400, user_id, status FROM assinaturas
+    WHERE data_expiracao_epoch IS NOT NULL
+'''
+
+def verificar_calendario() -> dict:
+    """
+    Compara o calendário com as assinaturas:
+    {'faltando': entradas esperadas ausentes, 'sobrando': entradas sem assinatura
+     correspondente, 'total': entradas no calendário}. Retorna {} em caso de erro.
+    """
+    try:
+        with obter_gerenciador().leitura() as conn:
+            faltando = conn.execute(f'''
+                SELECT COUNT(*) FROM ({SQL_CALENDARIO_ESPERADO}
+                EXCEPT SELECT dia, user_id, status FROM calendario_expiracao)
+            ''').fetchone()[0]
+            sobrando = conn.execute(f'''
+                SELECT COUNT(*) FROM (SELECT dia, user_id, status FROM calendario_expiracao
+                EXCEPT {SQL_CALENDARIO_ESPERADO})
+            ''').fetchone()[0]
+            total = conn.execute("SELECT COUNT(*) FROM calendario_expiracao").fetchone()[0]
+        return {'faltando': faltando, 'sobrando': sobrando, 'total': total}
+    except Exception as e:
+        logger.error(f"Erro ao verificar calendário de expiração: {e}")
+        return {}
+
+def reconstruir_calendario() -> int:
+    """Refaz o calendário a partir das assinaturas numa transação. Retorna o total de entradas (-1 em erro)"""
+    try:
+        with obter_gerenciador().escrita() as conn:
+            conn.execute("DELETE FROM calendario_expiracao")
+            cursor = conn.execute(
+                "INSERT INTO calendario_expiracao (dia, user_id, status) " + SQL_CALENDARIO_ESPERADO
+            )
+            total = cursor.rowcount
+        logger.info(f"Calendário de expiração reconstruído: {total} entradas")
+        return total
+    except Exception as e:
+        logger.error(f"Erro ao reconstruir calendário de expiração: {e}")
+        return -1
+
+# =====================================================
+# OUTBOX (efeitos no Discord)
+# Cada efeito é uma tupla (chave, tipo, user_id, dados) gravada na mesma
+# transação da mudança de estado que o originou. A chave é a chave de
+# idempotência: enfileirar de novo a mesma chave não faz nada.
+# =====================================================
+
+SQL_ENFILEIRAR_EFEITO = '''
+    INSERT OR IGNORE INTO outbox (chave, tipo, user_id, dados, status, tentativas, proxima_tentativa, criado_em)
+    VALUES (?, ?, ?, ?, 'PENDENTE', 0, 0, ?)
+'''
+
+def _enfileirar_efeitos(conn, efeitos) -> int:
+    """Insere os efeitos no outbox usando a conexão (e a transação) de quem chama"""
+    if not efeitos:
+        return 0
+    agora = datetime.datetime.now().strftime(DB_DATETIME_FORMAT)
+    cursor = conn.executemany(SQL_ENFILEIRAR_EFEITO, [
+        (chave, tipo, user_id, json.dumps(dados), agora)
+        for chave, tipo, user_id, dados in efeitos
+    ])
+    return cursor.rowcount
+
+def enfileirar_efeitos(efeitos) -> int:
+    """Enfileira efeitos sem mudança de estado junto (ex.: nova tentativa de uma chamada que falhou)"""
+    try:
+        with obter_gerenciador().escrita() as conn:
+            return _enfileirar_efeitos(conn, list(efeitos))
+    except Exception as e:
+        logger.error(f"Erro ao enfileirar efeitos no outbox: {e}")
+        return 0
+
+# Ordenações aceitas por iterar_assinaturas (nome -> coluna indexada)
+ORDENS_ASSINATURAS = {
+    'expiracao': 'data_expiracao_epoch',
+    'ativacao': 'data_ativacao_epoch',
+    'user_id': 'user_id',
+}
+
+def iterar_lotes_assinaturas(status: str = None, expira_de: datetime.datetime = None,
+                             expira_ate: datetime.datetime = None, plano: str = None,
+                             ordem: str = 'expiracao', decrescente: bool = False,
+                             tamanho_lote: int = 500, como_registro: bool = False):
+    """
+    Gera listas de até tamanho_lote assinaturas (tuplas na ordem de COLUNAS_ASSINATURA,
+    ou registros Assinatura com como_registro=True) buscadas com fetchmany.
+    Filtros e ordenação vão para o SQL: status, janela de expiração [expira_de, expira_ate) e plano.
+    A conexão de leitura fica emprestada até o gerador terminar ou ser fechado.
+    """
+    if ordem not in ORDENS_ASSINATURAS:
+        raise ValueError(f"Ordenação inválida: {ordem!r} (use {', '.join(ORDENS_ASSINATURAS)})")
+
+    filtros = []
+    parametros = []
+    if status is not None:
+        filtros.append("status = ?")
+        parametros.append(status)
+    if expira_de is not None:
+        filtros.append("data_expiracao_epoch >= ?")
+        parametros.append(para_epoch(expira_de))
+    if expira_ate is not None:
+        filtros.append("data_expiracao_epoch < ?")
+        parametros.append(para_epoch(expira_ate))
+    if plano is not None:
+        filtros.append("plano = ?")
+        parametros.append(plano)
+    where = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+    order_by = f"ORDER BY {ORDENS_ASSINATURAS[ordem]}{' DESC' if decrescente else ''}"
+    
+    with obter_gerenciador().leitura() as conn:
+        cursor = conn.cursor()
+        if como_registro:
+            cursor.row_factory = fabrica_assinatura
+        cursor.execute(
+            f'SELECT {COLUNAS_ASSINATURA} FROM assinaturas {where} {order_by}',
+            parametros,
+        )
+        try:
+            while True:
+                lote = cursor.fetchmany(tamanho_lote)
+                if not lote:
+                    break
+                yield lote
+        finally:
+            cursor.close()
+
+def iterar_assinaturas(**filtros):
+    """
+    Gera as assinaturas uma a uma (tuplas), em memória constante.
+    Aceita os mesmos filtros de iterar_lotes_assinaturas.
+    """
+    for lote in iterar_lotes_assinaturas(**filtros):
+        yield from lote
+
+def iterar_todas_assinaturas(**filtros):
+    """
+    Versão em streaming de obter_todas_assinaturas: gera os dicionários sob demanda.
+    Não aquece o cache, para uma varredura grande não despejar as entradas úteis.
+    """
+    filtros['como_registro'] = False
+    for linha in iterar_assinaturas(**filtros):
+        yield _linha_para_dict(linha)
+
+def normalizar_datas_legadas(tamanho_lote: int = 500) -> int:
+    """
+    Reescreve em ISO um lote de assinaturas que ainda têm datas no formato legado.
+    Pensada para rodar em segundo plano, lote a lote, até devolver 0.
+    Retorna quantas linhas foram alteradas.
+    """
+    try:
+        filtro = " OR ".join(f"{coluna} LIKE '__/__/____%'" for coluna in COLUNAS_DATA_ASSINATURA)
+        atribuicoes = ", ".join(f"{coluna} = {sql_texto_iso(coluna)}" for coluna in COLUNAS_DATA_ASSINATURA)
+        with obter_gerenciador().escrita() as conn:
+            cursor = conn.execute(f'''
+                UPDATE assinaturas SET {atribuicoes}
+                WHERE user_id IN (SELECT user_id FROM assinaturas WHERE {filtro} LIMIT ?)
+            ''', (tamanho_lote,))
+            alteradas = cursor.rowcount
+            if alteradas:
+                _cache.limpar()
+        if alteradas:
+            logger.info(f"{alteradas} assinaturas com datas legadas convertidas para ISO")
+        return alteradas
+    except Exception as e:
+        logger.error(f"Erro ao normalizar datas legadas: {e}")
+        return 0
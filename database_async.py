@@ -0,0 +1,87 @@
+# database_async.py
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+
+logger = logging.getLogger(__name__)
+
+# Threads dedicadas ao banco: o event loop do Discord nunca espera por I/O de disco.
+# A escrita continua serializada pelo lock do GerenciadorConexoes; as leituras
+# podem rodar em paralelo até o tamanho do pool de leitura. O executor tem mais
+# threads que o pool: iteradores abertos seguram conexões de leitura entre um
+# await e outro, e as escritas e devoluções ao pool não podem ficar sem thread.
+THREADS_EXTRAS = 4
+_executor = ThreadPoolExecutor(
+    max_workers=database.TAMANHO_POOL_LEITURA + THREADS_EXTRAS,
+    thread_name_prefix="database",
+)
+
+def _assincrono(nome: str):
+    """Cria a versão awaitable de database.<nome>, executada no executor do banco"""
+    async def wrapper(*args, **kwargs):
+        # Resolve a função na hora da chamada para respeitar monkeypatch em database
+        func = getattr(database, nome)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+    wrapper.__name__ = nome
+    wrapper.__qualname__ = nome
+    wrapper.__doc__ = f"Versão assíncrona de database.{nome}"
+    return wrapper
+
+init_db = _assincrono("init_db")
+adicionar_assinatura = _assincrono("adicionar_assinatura")
+adicionar_assinaturas_em_lote = _assincrono("adicionar_assinaturas_em_lote")
+atualizar_status_assinatura = _assincrono("atualizar_status_assinatura")
+registrar_aviso = _assincrono("registrar_aviso")
+obter_assinatura = _assincrono("obter_assinatura")
+obter_assinaturas_por_ids = _assincrono("obter_assinaturas_por_ids")
+obter_registro_assinatura = _assincrono("obter_registro_assinatura")
+obter_registros_por_ids = _assincrono("obter_registros_por_ids")
+obter_assinaturas_acionaveis = _assincrono("obter_assinaturas_acionaveis")
+obter_todas_assinaturas = _assincrono("obter_todas_assinaturas")
+obter_resumo_assinaturas = _assincrono("obter_resumo_assinaturas")
+normalizar_datas_legadas = _assincrono("normalizar_datas_legadas")
+descarregar_historico = _assincrono("descarregar_historico")
+marcar_pendentes = _assincrono("marcar_pendentes")
+marcar_pendentes_virada = _assincrono("marcar_pendentes_virada")
+obter_pendentes = _assincrono("obter_pendentes")
+limpar_pendentes = _assincrono("limpar_pendentes")
+contar_pendentes = _assincrono("contar_pendentes")
+enfileirar_efeitos = _assincrono("enfileirar_efeitos")
+obter_coorte = _assincrono("obter_coorte")
+contar_coortes = _assincrono("contar_coortes")
+verificar_calendario = _assincrono("verificar_calendario")
+reconstruir_calendario = _assincrono("reconstruir_calendario")
+
+async def executar(func, *args, **kwargs):
+    """Roda uma função síncrona qualquer que use o banco no executor do banco"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+async def iterar_assinaturas(**filtros):
+    """
+    Versão assíncrona de database.iterar_assinaturas: cada lote do fetchmany
+    é buscado no executor do banco e as linhas são entregues uma a uma.
+    """
+    loop = asyncio.get_running_loop()
+    lotes = database.iterar_lotes_assinaturas(**filtros)
+    try:
+        while True:
+            lote = await loop.run_in_executor(_executor, next, lotes, None)
+            if lote is None:
+                break
+            for linha in lote:
+                yield linha
+    finally:
+        # Devolve a conexão de leitura ao pool mesmo se o consumidor parar no meio
+        await loop.run_in_executor(_executor, lotes.close)
+
+def encerrar():
+    """Aguarda as operações pendentes e fecha as conexões do banco"""
+    _executor.shutdown(wait=True)
+    database.fechar_conexoes()
+    logger.info("Executor do banco encerrado.")
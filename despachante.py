@@ -0,0 +1,207 @@
+# despachante.py
+"""
+Despachante das ações da checagem no Discord (DMs, remoção de cargo, kick).
+
+As ações de membros diferentes rodam em paralelo, até CONCORRENCIA_DESPACHO por vez;
+cada chamada passa pelo balde de tokens da sua rota, no lugar dos
+asyncio.sleep(3) fixos. Um 429 (discord.RateLimited ou HTTPException com
+status 429) pausa a rota pelo retry-after informado e a chamada é repetida.
+Cada chamada vira um ResultadoAcao, resumido no relatório da checagem.
+
+Os baldes são do token do bot, não de cada despachante: quem chama o Discord
+em paralelo (checagem, drenagem do outbox, resumo no canal) recebe os mesmos
+baldes de criar_baldes, e a soma das chamadas fica dentro dos limites.
+"""
+import asyncio
+import logging
+import time
+
+import discord
+
+CONCORRENCIA_DESPACHO = 8
+MAX_TENTATIVAS = 3
+# Espera usada quando um 429 chega sem retry-after
+ESPERA_PADRAO_429 = 1.0
+# Latência típica de uma chamada à API (só para estimativas)
+LATENCIA_MEDIA = 0.15
+
+# rota -> (tokens por segundo, capacidade do balde); abaixo dos limites do Discord
+LIMITES_ROTAS = {
+    "dm_criar": (2.0, 5),        # POST /users/@me/channels
+    "mensagem": (4.0, 5),        # POST /channels/{id}/messages (DMs)
+    "canal": (1.0, 5),           # POST/PATCH /channels/{id}/messages no canal de notificações
+    "membro_editar": (4.0, 10),  # PATCH/DELETE /guilds/{id}/members/{id}(/roles)
+    "kick": (2.0, 5),            # DELETE /guilds/{id}/members/{id}
+}
+
+logger = logging.getLogger(__name__)
+
+def estimar_duracao(chamadas_por_rota: dict, concorrencia: int = CONCORRENCIA_DESPACHO,
+                    limites: dict = None, latencia: float = LATENCIA_MEDIA) -> float:
+    """
+    Segundos estimados para despachar as chamadas {rota: quantidade}: o maior entre
+    a rota mais lenta (rajada inicial + taxa do balde) e a latência dividida pela concorrência.
+    """
+    limites = limites or LIMITES_ROTAS
+    por_rota = 0.0
+    for rota, quantidade in chamadas_por_rota.items():
+        taxa, capacidade = limites[rota]
+        por_rota = max(por_rota, max(quantidade - capacidade, 0) / taxa)
+    total = sum(chamadas_por_rota.values())
+    return max(por_rota, total * latencia / concorrencia)
+
+class BaldeTokens:
+    """Balde de tokens assíncrono: até 'capacidade' chamadas seguidas, depois 'taxa' por segundo"""
+
+    def __init__(self, taxa: float, capacidade: int, relogio=time.monotonic, dormir=asyncio.sleep):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self._tokens = float(capacidade)
+        self._relogio = relogio
+        self._dormir = dormir
+        self._atualizado = relogio()
+        self._pausado_ate = 0.0
+        self._lock = asyncio.Lock()
+
+    def _repor(self):
+        agora = self._relogio()
+        self._tokens = min(self.capacidade, self._tokens + (agora - self._atualizado) * self.taxa)
+        self._atualizado = agora
+        return agora
+
+    async def adquirir(self):
+        # O lock mantém a ordem de chegada: quem chegou primeiro sai primeiro
+        async with self._lock:
+            while True:
+                agora = self._repor()
+                if agora < self._pausado_ate:
+                    await self._dormir(self._pausado_ate - agora)
+                    continue
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await self._dormir((1 - self._tokens) / self.taxa)
+
+    def pausar(self, segundos: float):
+        """Segura a rota (429): ninguém adquire token até o retry-after passar"""
+        self._pausado_ate = max(self._pausado_ate, self._relogio() + segundos)
+        self._tokens = 0.0
+
+def criar_baldes(limites: dict = None, relogio=time.monotonic, dormir=asyncio.sleep) -> dict:
+    """{rota: BaldeTokens} com os limites por rota, para compartilhar entre despachantes"""
+    return {
+        rota: BaldeTokens(taxa, capacidade, relogio, dormir)
+        for rota, (taxa, capacidade) in (limites or LIMITES_ROTAS).items()
+    }
+
+class ResultadoAcao:
+    """Resultado de uma chamada despachada"""
+
+    __slots__ = ('rota', 'user_id', 'ok', 'erro', 'tentativas', 'duracao')
+
+    def __init__(self, rota, user_id, ok, erro, tentativas, duracao):
+        self.rota = rota
+        self.user_id = user_id
+        self.ok = ok
+        self.erro = erro
+        self.tentativas = tentativas
+        self.duracao = duracao
+
+def _retry_after(erro):
+    """Segundos de espera pedidos por um 429 (None se o erro não é 429)"""
+    if isinstance(erro, discord.RateLimited):
+        return erro.retry_after
+    if isinstance(erro, discord.HTTPException) and erro.status == 429:
+        headers = getattr(erro.response, "headers", None) or {}
+        try:
+            return float(headers.get("Retry-After", ESPERA_PADRAO_429))
+        except (TypeError, ValueError):
+            return ESPERA_PADRAO_429
+    return None
+
+class Despachante:
+    """
+    Executa as tarefas da checagem com concorrência limitada e limita cada chamada
+    ao Discord pelo balde da rota. Guarda um ResultadoAcao por chamada.
+    Sem 'baldes', cria os seus a partir de 'limites' (não compartilhados).
+    """
+
+    def __init__(self, concorrencia: int = CONCORRENCIA_DESPACHO, limites: dict = None,
+                 max_tentativas: int = MAX_TENTATIVAS, relogio=time.monotonic, dormir=asyncio.sleep,
+                 baldes: dict = None):
+        self.concorrencia = concorrencia
+        self.max_tentativas = max_tentativas
+        self._relogio = relogio
+        self._dormir = dormir
+        self._baldes = baldes if baldes is not None else criar_baldes(limites, relogio, dormir)
+        self.resultados = []
+        self.limitadas = 0
+
+    async def chamar(self, rota: str, funcao, *args, user_id: int = None, **kwargs):
+        """
+        Chama funcao(*args, **kwargs) respeitando o balde da rota e repetindo em 429.
+        Devolve o retorno da função; outros erros são registrados e relançados.
+        """
+        balde = self._baldes[rota]
+        inicio = self._relogio()
+        tentativas = 0
+        while True:
+            tentativas += 1
+            await balde.adquirir()
+            try:
+                retorno = await funcao(*args, **kwargs)
+            except Exception as e:
+                espera = _retry_after(e)
+                if espera is not None and tentativas < self.max_tentativas:
+                    self.limitadas += 1
+                    logger.warning(f"429 na rota {rota}; aguardando {espera:.2f}s")
+                    balde.pausar(espera)
+                    continue
+                self.resultados.append(
+                    ResultadoAcao(rota, user_id, False, e, tentativas, self._relogio() - inicio)
+                )
+                raise
+            self.resultados.append(
+                ResultadoAcao(rota, user_id, True, None, tentativas, self._relogio() - inicio)
+            )
+            return retorno
+
+    async def executar_todas(self, tarefas):
+        """
+        Roda as corrotinas (uma por membro) com no máximo 'concorrencia' ao mesmo tempo.
+        Exceções não tratadas pelas tarefas são registradas e não derrubam as outras;
+        se a rodada for interrompida (cancelamento, queda), as tarefas restantes são canceladas.
+        """
+        semaforo = asyncio.Semaphore(self.concorrencia)
+
+        async def limitada(tarefa):
+            try:
+                async with semaforo:
+                    await tarefa
+            except Exception as e:
+                logger.error(f"Erro em tarefa despachada: {e}")
+            finally:
+                # Cancelada ainda na fila do semáforo: a corrotina nunca rodou
+                tarefa.close()
+
+        pendentes = [asyncio.ensure_future(limitada(tarefa)) for tarefa in tarefas]
+        try:
+            await asyncio.gather(*pendentes)
+        except BaseException:
+            for pendente in pendentes:
+                pendente.cancel()
+            raise
+
+    def resumo(self) -> dict:
+        """Totais por rota: {'rota': {'ok': n, 'falhas': n}} e contagem geral"""
+        por_rota = {}
+        for resultado in self.resultados:
+            contagem = por_rota.setdefault(resultado.rota, {'ok': 0, 'falhas': 0})
+            contagem['ok' if resultado.ok else 'falhas'] += 1
+        return {
+            'acoes': len(self.resultados),
+            'ok': sum(1 for r in self.resultados if r.ok),
+            'falhas': sum(1 for r in self.resultados if not r.ok),
+            'limitadas': self.limitadas,
+            'por_rota': por_rota,
+        }
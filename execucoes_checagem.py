@@ -0,0 +1,222 @@
+# execucoes_checagem.py
+"""
+Registro persistido das rodadas da checagem, para retomar uma rodada interrompida.
+
+Cada rodada grava o plano (membro, expiração e último aviso no momento do
+planejamento), um cursor (posição abaixo da qual todos os membros terminaram)
+e uma marca por decisão gravada no banco (aviso registrado, status EXPIRADA).
+Se o bot cair no meio, a próxima checagem do mesmo dia retoma os membros que
+faltam e pula as decisões já marcadas; rodadas de dias anteriores são
+abandonadas (a checagem seguinte reavalia tudo a partir do banco). Cada rodada
+guarda a instância (cog) que a iniciou: só rodadas de outra instância, que caiu,
+são retomadas ou abandonadas; uma rodada viva da própria instância nunca é.
+
+Os efeitos no Discord de cada decisão (DM, cargo, kick) ficam no outbox, com
+chave de idempotência: a rodada retomada só termina os que não foram concluídos.
+"""
+import datetime
+import json
+import logging
+import threading
+
+import database
+from database import DB_DATETIME_FORMAT, parse_datetime_db
+
+EM_ANDAMENTO = "EM_ANDAMENTO"
+CONCLUIDA = "CONCLUIDA"
+ABANDONADA = "ABANDONADA"
+
+# Decisões marcadas por membro
+AVISO_3_DIAS = "AVISO_3_DIAS"
+AVISO_HOJE = "AVISO_EXPIRA_HOJE"
+STATUS_EXPIRADA = "STATUS_EXPIRADA"
+
+# Rodadas encerradas mantidas no banco (as mais antigas são apagadas ao finalizar)
+EXECUCOES_MANTIDAS = 50
+
+logger = logging.getLogger(__name__)
+
+def _agora() -> str:
+    return datetime.datetime.now().strftime(DB_DATETIME_FORMAT)
+
+class ExecucaoChecagem:
+    """
+    Uma rodada em andamento. Sem id (falha ao gravar o plano) a rodada roda
+    normalmente, só sem checkpoint. Os métodos de escrita rodam no executor do banco.
+    """
+
+    def __init__(self, execucao_id, modo: str, dia: datetime.date, cursor: int = 0, feitas=None):
+        self.id = execucao_id
+        self.modo = modo
+        self.dia = dia
+        self.cursor = cursor
+        self._feitas = set(feitas or ())
+        self._concluidas = set()
+        self._lock = threading.Lock()
+
+    def feita(self, user_id: int, acao: str) -> bool:
+        """A decisão já foi gravada para o usuário (nesta rodada ou antes da queda)?"""
+        return (user_id, acao) in self._feitas
+
+    def marcar(self, user_id: int, acao: str) -> bool:
+        """Grava a marca da decisão"""
+        with self._lock:
+            self._feitas.add((user_id, acao))
+        if self.id is None:
+            return False
+        try:
+            with database.obter_gerenciador().escrita() as conn:
+                conn.execute('''
+                    INSERT OR IGNORE INTO execucoes_acoes (execucao_id, user_id, acao, concluida_em)
+                    VALUES (?, ?, ?, ?)
+                ''', (self.id, user_id, acao, _agora()))
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao marcar ação {acao} de {user_id} na execução {self.id}: {e}")
+            return False
+
+    def concluir_membro(self, posicao: int) -> bool:
+        """Marca o membro da posição como concluído e avança o cursor"""
+        with self._lock:
+            self._concluidas.add(posicao)
+            while self.cursor in self._concluidas:
+                self._concluidas.remove(self.cursor)
+                self.cursor += 1
+            cursor = self.cursor
+        if self.id is None:
+            return False
+        try:
+            with database.obter_gerenciador().escrita() as conn:
+                conn.execute('''
+                    UPDATE execucoes_membros SET concluido = 1
+                    WHERE execucao_id = ? AND posicao = ?
+                ''', (self.id, posicao))
+                conn.execute('''
+                    UPDATE execucoes_checagem SET cursor = MAX(cursor, ?) WHERE id = ?
+                ''', (cursor, self.id))
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao concluir posição {posicao} da execução {self.id}: {e}")
+            return False
+
+    def finalizar(self, resumo: dict = None, manter: int = EXECUCOES_MANTIDAS) -> bool:
+        """
+        Fecha a rodada com o resumo e apaga o plano e as marcas (não são mais necessários).
+        Das rodadas encerradas (concluídas ou abandonadas) ficam só as 'manter' últimas;
+        as abandonadas perdem o plano e as marcas, que não serão mais retomados.
+        """
+        if self.id is None:
+            return False
+        try:
+            contagens = {k: v for k, v in (resumo or {}).items() if isinstance(v, int)}
+            with database.obter_gerenciador().escrita() as conn:
+                conn.execute('''
+                    UPDATE execucoes_checagem SET status = ?, concluida_em = ?, resumo = ?
+                    WHERE id = ?
+                ''', (CONCLUIDA, _agora(), json.dumps(contagens), self.id))
+                conn.execute('''
+                    DELETE FROM execucoes_checagem WHERE status != ? AND id <= (
+                        SELECT id FROM execucoes_checagem WHERE status != ?
+                        ORDER BY id DESC LIMIT 1 OFFSET ?
+                    )
+                ''', (EM_ANDAMENTO, EM_ANDAMENTO, manter))
+                for tabela in ("execucoes_membros", "execucoes_acoes"):
+                    conn.execute(f'''
+                        DELETE FROM {tabela} WHERE execucao_id NOT IN (
+                            SELECT id FROM execucoes_checagem WHERE status = ?
+                        )
+                    ''', (EM_ANDAMENTO,))
+            logger.info(f"Execução {self.id} da checagem concluída")
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao finalizar execução {self.id}: {e}")
+            return False
+
+def iniciar_execucao(modo: str, dia: datetime.date, alvos, instancia: str = None) -> ExecucaoChecagem:
+    """
+    Grava uma rodada nova da instância com o plano [(user_id, data_expiracao: date, ultimo_aviso)],
+    numa única transação. A posição de cada membro é a ordem da lista.
+    """
+    try:
+        linhas = [
+            (
+                posicao,
+                user_id,
+                data_expiracao.isoformat(),
+                ultimo_aviso.strftime(DB_DATETIME_FORMAT) if ultimo_aviso else None,
+            )
+            for posicao, (user_id, data_expiracao, ultimo_aviso) in enumerate(alvos)
+        ]
+        with database.obter_gerenciador().escrita() as conn:
+            cursor = conn.execute('''
+                INSERT INTO execucoes_checagem (modo, dia, status, cursor, total, iniciada_em, instancia)
+                VALUES (?, ?, ?, 0, ?, ?, ?)
+            ''', (modo, dia.isoformat(), EM_ANDAMENTO, len(linhas), _agora(), instancia))
+            execucao_id = cursor.lastrowid
+            conn.executemany('''
+                INSERT INTO execucoes_membros (execucao_id, posicao, user_id, data_expiracao, ultimo_aviso)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(execucao_id,) + linha for linha in linhas])
+        return ExecucaoChecagem(execucao_id, modo, dia)
+    except Exception as e:
+        logger.error(f"Erro ao registrar execução da checagem: {e}")
+        return ExecucaoChecagem(None, modo, dia)
+
+def retomar_execucao(dia: datetime.date, instancia: str = None):
+    """
+    Rodada interrompida do dia: (ExecucaoChecagem, [(posicao, user_id, data_expiracao, ultimo_aviso)])
+    com os membros que faltam, ou None. Rodadas interrompidas de outros dias são abandonadas.
+    Com a instância, as rodadas dela (ainda vivas) não são retomadas nem abandonadas.
+    """
+    try:
+        # Rodadas de outra instância: a que as iniciou caiu (ou foi recarregada)
+        de_outra = ""
+        parametros = ()
+        if instancia is not None:
+            de_outra = "AND (instancia IS NULL OR instancia != ?)"
+            parametros = (instancia,)
+        with database.obter_gerenciador().escrita() as conn:
+            conn.execute(f'''
+                UPDATE execucoes_checagem SET status = ?, concluida_em = ?
+                WHERE status = ? AND dia != ? {de_outra}
+            ''', (ABANDONADA, _agora(), EM_ANDAMENTO, dia.isoformat(), *parametros))
+            linha = conn.execute(f'''
+                SELECT id, modo, cursor FROM execucoes_checagem
+                WHERE status = ? {de_outra} ORDER BY id DESC LIMIT 1
+            ''', (EM_ANDAMENTO, *parametros)).fetchone()
+            if linha is None:
+                return None
+            execucao_id, modo, cursor = linha
+            # Só uma rodada fica aberta: as mais antigas do dia também são abandonadas
+            conn.execute(f'''
+                UPDATE execucoes_checagem SET status = ?, concluida_em = ?
+                WHERE status = ? AND id != ? {de_outra}
+            ''', (ABANDONADA, _agora(), EM_ANDAMENTO, execucao_id, *parametros))
+            membros = conn.execute('''
+                SELECT posicao, user_id, data_expiracao, ultimo_aviso FROM execucoes_membros
+                WHERE execucao_id = ? AND posicao >= ? AND concluido = 0
+                ORDER BY posicao
+            ''', (execucao_id, cursor)).fetchall()
+            feitas = conn.execute('''
+                SELECT user_id, acao FROM execucoes_acoes WHERE execucao_id = ?
+            ''', (execucao_id,)).fetchall()
+
+        execucao = ExecucaoChecagem(execucao_id, modo, dia, cursor, feitas)
+        # Posições já concluídas acima do cursor entram no avanço do cursor
+        pendentes = {posicao for posicao, _, _, _ in membros}
+        execucao._concluidas = {
+            posicao for posicao in range(cursor, max(pendentes, default=cursor - 1) + 1)
+            if posicao not in pendentes
+        }
+        restantes = [
+            (posicao, user_id, datetime.date.fromisoformat(data_expiracao), parse_datetime_db(ultimo_aviso))
+            for posicao, user_id, data_expiracao, ultimo_aviso in membros
+        ]
+        logger.info(
+            f"Retomando execução {execucao_id} da checagem: {len(restantes)} membros restantes, "
+            f"{len(feitas)} decisões já gravadas"
+        )
+        return execucao, restantes
+    except Exception as e:
+        logger.error(f"Erro ao retomar execução da checagem: {e}")
+        return None
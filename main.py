@@ -6,7 +6,8 @@ import logging
 from logging.handlers import RotatingFileHandler
 from dotenv import load_dotenv
 from config import *
-from database import init_db
+from database_async import init_db
+import database_async
 from views import PlanoSelect
 
 # Configuração de logging
@@ -44,7 +45,7 @@ async def on_ready():
     logger.info(f"Bot conectado como {bot.user}")
     
     # Inicializar banco de dados
-    init_db()
+    await init_db()
     
     # Carregar extensions (cogs)
     await load_extensions()
@@ -88,17 +89,24 @@ async def on_member_join(member):
 async def on_member_update(before: discord.Member, after: discord.Member):
     """Evento quando um membro é atualizado"""
     logger = logging.getLogger(__name__)
-    from database import atualizar_status_assinatura
+    import datetime
+    import outbox
+    from database_async import atualizar_status_assinatura, obter_assinatura
     
     cargo = discord.utils.get(after.guild.roles, name=CARGO_ASSINANTE_NOME)
     if cargo in before.roles and cargo not in after.roles:
-        try:
-            await after.edit(nick=None)
-        except discord.Forbidden:
-            logger.error(f"Não foi possível resetar o apelido de {after}")
+        # A checagem grava EXPIRADA antes de o outbox remover o cargo: não é remoção manual
+        assinatura = await obter_assinatura(after.id)
+        if assinatura and assinatura["status"] == "EXPIRADA":
+            return
         
-        # Atualizar status no banco
-        atualizar_status_assinatura(after.id, "REMOVIDA", "Cargo removido manualmente")
+        # Atualizar status no banco; o reset do apelido vai para o outbox na mesma transação
+        agora = datetime.datetime.now().isoformat(timespec="seconds")
+        efeito = outbox.efeito_apelido(f"REMOVIDA:{after.id}:{agora}:APELIDO", after.id, None)
+        await atualizar_status_assinatura(after.id, "REMOVIDA", "Cargo removido manualmente", efeitos=[efeito])
+        resultados = await outbox.ExecutorEfeitos().processar_agora([efeito[0]], membro=after)
+        if isinstance(resultados[efeito[0]], discord.Forbidden):
+            logger.error(f"Não foi possível resetar o apelido de {after}")
         logger.info(f"O cargo de {after} foi removido manualmente; apelido resetado.")
 
 if __name__ == "__main__":
@@ -115,4 +123,7 @@ if __name__ == "__main__":
             raise
     else:
         logger.info("Arquivo 'assinaturas.db' encontrado. Pulando migração inicial.")
-    bot.run(TOKEN)
\ No newline at end of file
+    try:
+        bot.run(TOKEN)
+    finally:
+        database_async.encerrar()
\ No newline at end of file
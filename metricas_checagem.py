@@ -0,0 +1,219 @@
+# metricas_checagem.py
+"""
+Medição da checagem de assinaturas: tempo por fase (seleção dos alvos,
+despacho, histórico, resumo), por ação (rotas do Discord pelo despachante,
+escritas no SQLite, membro inteiro) com p50/p95/p99, e contagem por ramo
+(aviso de 3 dias, aviso do dia, vencida, importado do apelido).
+
+As métricas da rodada ficam numa ContextVar: as tarefas criadas durante a
+rodada herdam o contexto, então o código da checagem pega as métricas com
+atuais() sem recebê-las por parâmetro, e rodadas simultâneas não se misturam.
+Desligadas (METRICAS_CHECAGEM = False), atuais() devolve um objeto cujos
+métodos não fazem nada. O relatório de cada rodada é gravado no banco
+(tabela relatorios_checagem) e mostrado pelo !relatorio_checagem.
+"""
+import contextvars
+import datetime
+import json
+import logging
+import math
+import time
+
+import database
+from database import DB_DATETIME_FORMAT
+
+# Relatórios mantidos no banco (os mais antigos são apagados ao gravar)
+RELATORIOS_MANTIDOS = 50
+
+logger = logging.getLogger(__name__)
+
+def percentil(ordenadas, p: float) -> float:
+    """Percentil p (0-100) pelo posto mais próximo de uma lista já ordenada"""
+    if not ordenadas:
+        return 0.0
+    return ordenadas[max(0, math.ceil(p / 100 * len(ordenadas)) - 1)]
+
+def resumir_amostras(amostras) -> dict:
+    """{'n', 'total', 'p50', 'p95', 'p99', 'max'} de uma lista de durações (segundos)"""
+    ordenadas = sorted(amostras)
+    return {
+        'n': len(ordenadas),
+        'total': sum(ordenadas),
+        'p50': percentil(ordenadas, 50),
+        'p95': percentil(ordenadas, 95),
+        'p99': percentil(ordenadas, 99),
+        'max': ordenadas[-1] if ordenadas else 0.0,
+    }
+
+class _Cronometro:
+    """Context manager que grava a duração do bloco numa lista de amostras"""
+
+    __slots__ = ('_amostras', '_relogio', '_inicio')
+
+    def __init__(self, amostras, relogio):
+        self._amostras = amostras
+        self._relogio = relogio
+
+    def __enter__(self):
+        self._inicio = self._relogio()
+        return self
+
+    def __exit__(self, *_):
+        self._amostras.append(self._relogio() - self._inicio)
+        return False
+
+class MetricasChecagem:
+    """Métricas de uma rodada da checagem"""
+
+    ligadas = True
+
+    def __init__(self, modo: str = None, relogio=time.perf_counter):
+        self.modo = modo
+        self.iniciada_em = datetime.datetime.now()
+        self._relogio = relogio
+        self._inicio = relogio()
+        self.fases = {}
+        self.acoes = {}
+        self.ramos = {}
+
+    def fase(self, nome: str) -> _Cronometro:
+        return _Cronometro(self.fases.setdefault(nome, []), self._relogio)
+
+    def acao(self, nome: str) -> _Cronometro:
+        return _Cronometro(self.acoes.setdefault(nome, []), self._relogio)
+
+    def registrar_acao(self, nome: str, segundos: float):
+        self.acoes.setdefault(nome, []).append(segundos)
+
+    def registrar_despacho(self, resultados):
+        """Duração de cada chamada do despachante (espera no balde e 429 incluídos), por rota"""
+        for resultado in resultados:
+            self.registrar_acao(f"discord:{resultado.rota}", resultado.duracao)
+
+    def contar(self, ramo: str, quantidade: int = 1):
+        self.ramos[ramo] = self.ramos.get(ramo, 0) + quantidade
+
+    def relatorio(self, resumo: dict = None) -> dict:
+        """Relatório estruturado da rodada (serializável em JSON)"""
+        return {
+            'modo': self.modo,
+            'iniciada_em': self.iniciada_em.strftime(DB_DATETIME_FORMAT),
+            'duracao': self._relogio() - self._inicio,
+            'fases': {nome: resumir_amostras(amostras) for nome, amostras in self.fases.items()},
+            'acoes': {nome: resumir_amostras(amostras) for nome, amostras in self.acoes.items()},
+            'ramos': dict(self.ramos),
+            'resumo': {k: v for k, v in (resumo or {}).items() if isinstance(v, int)},
+        }
+
+class _NuloContexto:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+_NULO = _NuloContexto()
+
+class MetricasDesligadas:
+    """Mesma interface de MetricasChecagem, sem medir nada"""
+
+    ligadas = False
+
+    def fase(self, nome: str):
+        return _NULO
+
+    def acao(self, nome: str):
+        return _NULO
+
+    def registrar_acao(self, nome: str, segundos: float):
+        pass
+
+    def registrar_despacho(self, resultados):
+        pass
+
+    def contar(self, ramo: str, quantidade: int = 1):
+        pass
+
+DESLIGADAS = MetricasDesligadas()
+
+_atuais = contextvars.ContextVar("metricas_checagem", default=DESLIGADAS)
+
+def atuais():
+    """Métricas da rodada em andamento neste contexto (DESLIGADAS fora de uma rodada)"""
+    return _atuais.get()
+
+def ativar(metricas):
+    """Torna as métricas as atuais deste contexto; devolve o token para desativar"""
+    return _atuais.set(metricas)
+
+def desativar(token):
+    _atuais.reset(token)
+
+# =====================================================
+# RELATÓRIOS PERSISTIDOS
+# =====================================================
+
+def salvar_relatorio(relatorio: dict, manter: int = RELATORIOS_MANTIDOS):
+    """Grava o relatório e apaga os mais antigos que os 'manter' últimos. Retorna o id ou None."""
+    try:
+        with database.obter_gerenciador().escrita() as conn:
+            cursor = conn.execute('''
+                INSERT INTO relatorios_checagem (iniciada_em, modo, duracao, dados)
+                VALUES (?, ?, ?, ?)
+            ''', (relatorio['iniciada_em'], relatorio['modo'], relatorio['duracao'], json.dumps(relatorio)))
+            relatorio_id = cursor.lastrowid
+            conn.execute('''
+                DELETE FROM relatorios_checagem WHERE id <= (
+                    SELECT id FROM relatorios_checagem ORDER BY id DESC LIMIT 1 OFFSET ?
+                )
+            ''', (manter,))
+        return relatorio_id
+    except Exception as e:
+        logger.error(f"Erro ao salvar relatório da checagem: {e}")
+        return None
+
+def obter_relatorio(relatorio_id: int = None):
+    """(id, relatório) pelo id, ou o mais recente; None se não houver"""
+    try:
+        with database.obter_gerenciador().leitura() as conn:
+            if relatorio_id is None:
+                linha = conn.execute(
+                    "SELECT id, dados FROM relatorios_checagem ORDER BY id DESC LIMIT 1"
+                ).fetchone()
+            else:
+                linha = conn.execute(
+                    "SELECT id, dados FROM relatorios_checagem WHERE id = ?", (relatorio_id,)
+                ).fetchone()
+        if linha is None:
+            return None
+        return linha[0], json.loads(linha[1])
+    except Exception as e:
+        logger.error(f"Erro ao obter relatório da checagem: {e}")
+        return None
+
+def _formatar_tabela(titulo: str, medidas: dict) -> list:
+    linhas = [titulo, f"{'':<24}{'n':>7}{'total':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}"]
+    for nome, m in sorted(medidas.items(), key=lambda item: -item[1]['total']):
+        linhas.append(
+            f"{nome:<24}{m['n']:>7}{m['total']:>9.2f}s"
+            + "".join(f"{m[chave] * 1000:>7.0f}ms" for chave in ('p50', 'p95', 'p99', 'max'))
+        )
+    return linhas
+
+def formatar_relatorio(relatorio_id: int, relatorio: dict) -> str:
+    """Relatório em texto de largura fixa (para bloco de código ou arquivo)"""
+    linhas = [
+        f"Relatório #{relatorio_id} - checagem ({relatorio['modo']}) iniciada em {relatorio['iniciada_em']}",
+        f"Duração total: {relatorio['duracao']:.2f}s",
+        "",
+    ]
+    linhas += _formatar_tabela("FASES", relatorio['fases'])
+    linhas.append("")
+    linhas += _formatar_tabela("AÇÕES", relatorio['acoes'])
+    linhas.append("")
+    linhas.append("RAMOS: " + (", ".join(f"{r}={n}" for r, n in sorted(relatorio['ramos'].items())) or "nenhum"))
+    if relatorio.get('resumo'):
+        linhas.append("RESUMO: " + ", ".join(f"{k}={v}" for k, v in relatorio['resumo'].items()))
+    return "\n".join(linhas)
@@ -0,0 +1,321 @@
+# migracoes.py
+import datetime
+import logging
+import os
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# PASSOS DE MIGRAÇÃO
+# Cada passo recebe um cursor já dentro de uma transação e deve usar SQL
+# "em conjunto" (INSERT ... SELECT, UPDATE sem WHERE por linha), nunca
+# loops linha a linha em Python.
+# =====================================================
+
+def _colunas(cursor, tabela: str) -> set:
+    return {linha[1] for linha in cursor.execute(f"PRAGMA table_info({tabela})")}
+
+def sql_texto_iso(coluna: str) -> str:
+    """Expressão SQL que devolve a coluna TEXT em ISO, convertendo valores no formato legado dd/mm/YYYY"""
+    return f'''CASE
+        WHEN {coluna} LIKE '__/__/____%'
+        THEN substr({coluna}, 7, 4) || '-' || substr({coluna}, 4, 2) || '-' || substr({coluna}, 1, 2) || substr({coluna}, 11)
+        ELSE {coluna}
+    END'''
+
+def _sql_epoch(coluna: str) -> str:
+    """Expressão SQL que converte uma coluna TEXT (ISO ou legado dd/mm/YYYY) em epoch"""
+    return f"CAST(strftime('%s', {sql_texto_iso(coluna)}) AS INTEGER)"
+
+def _v1_schema_base(cursor):
+    """Tabelas assinaturas/historico; reconstrói a tabela do formato antigo (sem username)"""
+    colunas = _colunas(cursor, "assinaturas")
+    if colunas and "username" not in colunas:
+        cursor.execute("ALTER TABLE assinaturas RENAME TO assinaturas_antiga")
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS assinaturas(
+            user_id INTEGER PRIMARY KEY,
+            username TEXT NOT NULL,
+            data_expiracao TEXT NOT NULL,
+            plano TEXT NOT NULL,
+            data_ativacao TEXT NOT NULL,
+            status TEXT NOT NULL,
+            ultimo_aviso TEXT
+        )
+    ''')
+
+    if colunas and "username" not in colunas:
+        data_expiracao = "data_expiracao" if "data_expiracao" in colunas else "''"
+        plano = "plano" if "plano" in colunas else "''"
+        cursor.execute(f'''
+            INSERT INTO assinaturas (user_id, username, data_expiracao, plano, data_ativacao, status)
+            SELECT user_id, 'Usuario_' || user_id, COALESCE({data_expiracao}, ''), COALESCE({plano}, ''),
+                   strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime'), 'ATIVA'
+            FROM assinaturas_antiga
+        ''')
+        cursor.execute("DROP TABLE assinaturas_antiga")
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS historico(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            acao TEXT NOT NULL,
+            detalhes TEXT,
+            data_hora TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def _v2_colunas_epoch_e_indices(cursor):
+    """Colunas *_epoch preenchidas a partir do texto e índices de status/expiração/histórico"""
+    colunas = _colunas(cursor, "assinaturas")
+    for coluna in ("data_expiracao", "data_ativacao", "ultimo_aviso"):
+        coluna_epoch = f"{coluna}_epoch"
+        if coluna_epoch not in colunas:
+            cursor.execute(f"ALTER TABLE assinaturas ADD COLUMN {coluna_epoch} INTEGER")
+        cursor.execute(f'''
+            UPDATE assinaturas SET {coluna_epoch} = {_sql_epoch(coluna)}
+            WHERE {coluna_epoch} IS NULL AND {coluna} IS NOT NULL
+        ''')
+
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_assinaturas_status_expiracao
+        ON assinaturas(status, data_expiracao_epoch)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_assinaturas_expiracao
+        ON assinaturas(data_expiracao_epoch)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_historico_usuario_data
+        ON historico(user_id, data_hora)
+    ''')
+
+def _v3_indice_historico_data(cursor):
+    """Índice por data_hora para a retenção do histórico (compactação e arquivamento por idade)"""
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_historico_data
+        ON historico(data_hora)
+    ''')
+
+def _v4_membros_pendentes(cursor):
+    """Conjunto persistido de membros a reavaliar na próxima checagem (dirty set)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS membros_pendentes(
+            user_id INTEGER PRIMARY KEY,
+            motivo TEXT,
+            versao INTEGER NOT NULL DEFAULT 1,
+            marcado_em TEXT
+        )
+    ''')
+
+def _v5_execucoes_checagem(cursor):
+    """Rodadas da checagem com cursor, plano por membro e marcas de ações concluídas"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS execucoes_checagem(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            modo TEXT NOT NULL,
+            dia TEXT NOT NULL,
+            status TEXT NOT NULL,
+            cursor INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0,
+            iniciada_em TEXT,
+            concluida_em TEXT,
+            resumo TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_execucoes_checagem_status
+        ON execucoes_checagem(status)
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS execucoes_membros(
+            execucao_id INTEGER NOT NULL,
+            posicao INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            data_expiracao TEXT NOT NULL,
+            ultimo_aviso TEXT,
+            concluido INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (execucao_id, posicao)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS execucoes_acoes(
+            execucao_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            acao TEXT NOT NULL,
+            concluida_em TEXT,
+            PRIMARY KEY (execucao_id, user_id, acao)
+        )
+    ''')
+
+def _v6_outbox(cursor):
+    """Fila de efeitos no Discord (outbox), gravada na mesma transação da mudança de estado"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS outbox(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chave TEXT NOT NULL UNIQUE,
+            tipo TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            dados TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'PENDENTE',
+            tentativas INTEGER NOT NULL DEFAULT 0,
+            proxima_tentativa REAL NOT NULL DEFAULT 0,
+            dono TEXT,
+            reservado_ate REAL,
+            ultimo_erro TEXT,
+            criado_em TEXT,
+            concluido_em REAL
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_outbox_status_proxima
+        ON outbox(status, proxima_tentativa)
+    ''')
+
+def _v7_relatorios_checagem(cursor):
+    """Relatórios de tempo por fase/ação de cada rodada da checagem (JSON)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS relatorios_checagem(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            iniciada_em TEXT NOT NULL,
+            modo TEXT,
+            duracao REAL,
+            dados TEXT NOT NULL
+        )
+    ''')
+
+def _v8_calendario_expiracao(cursor):
+    """
+    Calendário de expiração: (dia, user_id, status) por assinatura, com dia =
+    data_expiracao_epoch / 86400. Mantido por triggers na mesma transação de
+    qualquer escrita em assinaturas; a coorte de um dia é uma faixa da chave.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS calendario_expiracao(
+            dia INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            PRIMARY KEY (dia, user_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_calendario_inserir
+        AFTER INSERT ON assinaturas
+        WHEN NEW.data_expiracao_epoch IS NOT NULL
+        BEGIN
+            INSERT OR REPLACE INTO calendario_expiracao (dia, user_id, status)
+            VALUES (NEW.data_expiracao_epoch / 86400, NEW.user_id, NEW.status);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_calendario_atualizar
+        AFTER UPDATE OF data_expiracao_epoch, status ON assinaturas
+        BEGIN
+            DELETE FROM calendario_expiracao
+            WHERE dia = OLD.data_expiracao_epoch / 86400 AND user_id = OLD.user_id;
+            INSERT OR REPLACE INTO calendario_expiracao (dia, user_id, status)
+            SELECT NEW.data_expiracao_epoch / 86400, NEW.user_id, NEW.status
+            WHERE NEW.data_expiracao_epoch IS NOT NULL;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_calendario_apagar
+        AFTER DELETE ON assinaturas
+        BEGIN
+            DELETE FROM calendario_expiracao
+            WHERE dia = OLD.data_expiracao_epoch / 86400 AND user_id = OLD.user_id;
+        END
+    ''')
+    cursor.execute('''
+        INSERT OR REPLACE INTO calendario_expiracao (dia, user_id, status)
+        SELECT data_expiracao_epoch / 86400, user_id, status FROM assinaturas
+        WHERE data_expiracao_epoch IS NOT NULL
+    ''')
+
+def _v9_instancia_execucoes(cursor):
+    """Instância (cog) dona de cada rodada: só rodadas de uma instância que caiu são retomadas"""
+    if "instancia" not in _colunas(cursor, "execucoes_checagem"):
+        cursor.execute("ALTER TABLE execucoes_checagem ADD COLUMN instancia TEXT")
+
+# (versão, descrição, função) — sempre em ordem crescente e nunca reescrever um passo já publicado
+MIGRACOES = [
+    (1, "schema base de assinaturas e historico", _v1_schema_base),
+    (2, "colunas epoch e índices", _v2_colunas_epoch_e_indices),
+    (3, "índice do histórico por data", _v3_indice_historico_data),
+    (4, "membros pendentes de reavaliação", _v4_membros_pendentes),
+    (5, "execuções da checagem com checkpoint", _v5_execucoes_checagem),
+    (6, "outbox de efeitos no Discord", _v6_outbox),
+    (7, "relatórios de tempo da checagem", _v7_relatorios_checagem),
+    (8, "calendário de expiração mantido por triggers", _v8_calendario_expiracao),
+    (9, "instância dona de cada rodada da checagem", _v9_instancia_execucoes),
+]
+
+# =====================================================
+# EXECUÇÃO
+# =====================================================
+
+def versao_atual(conn: sqlite3.Connection) -> int:
+    """Versão do schema gravada em PRAGMA user_version"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def versao_mais_recente() -> int:
+    return MIGRACOES[-1][0] if MIGRACOES else 0
+
+def fazer_backup(conn: sqlite3.Connection, destino: str) -> str:
+    """Copia o banco com a API de backup online do SQLite (não bloqueia leitores)"""
+    conn_destino = sqlite3.connect(destino)
+    try:
+        conn.backup(conn_destino)
+    finally:
+        conn_destino.close()
+    logger.info(f"Backup do banco criado em {destino}")
+    return destino
+
+def _caminho_backup(conn: sqlite3.Connection, versao: int):
+    """Arquivo de backup ao lado do banco principal (None para bancos em memória)"""
+    arquivo = conn.execute("PRAGMA database_list").fetchone()[2]
+    if not arquivo:
+        return None
+    base, _ = os.path.splitext(arquivo)
+    carimbo = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"{base}_backup_v{versao}_{carimbo}.db"
+
+def aplicar_migracoes(conn: sqlite3.Connection, backup: bool = True) -> int:
+    """
+    Aplica, em ordem, os passos com versão maior que PRAGMA user_version.
+    Cada passo roda numa transação própria junto com a atualização da versão,
+    então uma falha desfaz só aquele passo. Retorna a versão final.
+    """
+    versao = versao_atual(conn)
+    pendentes = [m for m in MIGRACOES if m[0] > versao]
+    if not pendentes:
+        return versao
+
+    if conn.in_transaction:
+        conn.commit()
+
+    tem_tabelas = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0] > 0
+    if backup and tem_tabelas:
+        destino = _caminho_backup(conn, versao)
+        if destino:
+            fazer_backup(conn, destino)
+
+    for numero, descricao, passo in pendentes:
+        inicio = datetime.datetime.now()
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            passo(cursor)
+            cursor.execute(f"PRAGMA user_version = {int(numero)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logger.error(f"Falha na migração v{numero} ({descricao}); versão mantida em {versao}")
+            raise
+        versao = numero
+        duracao = (datetime.datetime.now() - inicio).total_seconds()
+        logger.info(f"Migração v{numero} aplicada ({descricao}) em {duracao:.2f}s")
+
+    return versao
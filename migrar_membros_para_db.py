@@ -2,13 +2,13 @@
 
 import asyncio
 import datetime
-import re
 import logging
 
 import discord
 
+import apelidos
 from config import TOKEN, SERVER_ID, CARGO_ASSINANTE_NOME
-from database import adicionar_assinatura, registrar_aviso
+from database_async import adicionar_assinaturas_em_lote, descarregar_historico, init_db, registrar_aviso
 
 logger = logging.getLogger("migracao")
 logging.basicConfig(
@@ -32,6 +32,9 @@ class MigracaoClient(discord.Client):
             await self.close()
             return
 
+        # Garante que as tabelas existem antes de gravar (banco pode ser novo)
+        await init_db()
+
         hoje = datetime.date.today()
         total_processados = 0
         total_assinaturas_criadas = 0
@@ -39,28 +42,18 @@ class MigracaoClient(discord.Client):
 
         logger.info(f"Iniciando migração no servidor: {guild.name} ({guild.id})")
 
+        registros = []
+        avisos = []
         for member in guild.members:
             # pula bots
             if member.bot:
                 continue
 
-            # precisa ter nick e estar no formato "Nome | dd/mm/aaaa"
-            if not member.nick or " | " not in member.nick:
-                continue
-
-            partes = member.nick.split("|")
-            if len(partes) < 2:
-                continue
-
-            data_str = partes[1].strip()
-            if not re.match(r"\d{2}/\d{2}/\d{4}$", data_str):
-                continue
-
-            try:
-                data_expiracao_date = datetime.datetime.strptime(data_str, "%d/%m/%Y").date()
-            except ValueError:
-                logger.warning(f"Nick com data inválida para {member.nick}, pulando...")
+            # precisa ter nick no formato "Nome | dd/mm/aaaa" (índice compartilhado com a checagem)
+            data = apelidos.indice.data_do_membro(member)
+            if data is None:
                 continue
+            data_str, data_expiracao_date = data
 
             dias_restantes = (data_expiracao_date - hoje).days
 
@@ -70,59 +63,45 @@ class MigracaoClient(discord.Client):
             )
 
             plano = "Importado (nickname)"
+            registros.append((member.id, member.name, data_expiracao_dt, plano))
+            total_processados += 1
+            logger.info(
+                f"[ASSINATURA] {member.name} ({member.id}) -> expira em {data_str} "
+                f"({dias_restantes} dias restantes)"
+            )
 
-            # cria/atualiza assinatura no banco
-            ok = adicionar_assinatura(
-                user_id=member.id,
-                username=member.name,
-                data_expiracao=data_expiracao_dt,
-                plano=plano,
+            # ✅ Marcar que já foram avisados HOJE se estiverem em 3 ou 0 dias
+            if dias_restantes == 3:
+                avisos.append((member, "AVISO_3_DIAS", data_str))
+            elif dias_restantes == 0:
+                avisos.append((member, "AVISO_EXPIRA_HOJE", data_str))
+
+        # cria/atualiza todas as assinaturas numa única transação
+        total_assinaturas_criadas = await adicionar_assinaturas_em_lote(registros)
+        if registros and not total_assinaturas_criadas:
+            logger.error(
+                f"[ERRO ASSINATURA] Falha ao gravar {len(registros)} assinaturas em lote"
             )
+            avisos = []
 
-            total_processados += 1
-            if ok:
-                total_assinaturas_criadas += 1
+        for member, tipo, data_str in avisos:
+            ok_aviso = await registrar_aviso(member.id, tipo)
+            if ok_aviso:
+                total_avisos_marcados += 1
                 logger.info(
-                    f"[ASSINATURA] {member.name} ({member.id}) -> expira em {data_str} "
-                    f"({dias_restantes} dias restantes)"
+                    f"[AVISO MARCADO] {member.name} ({member.id}) marcado como {tipo} em {data_str}"
                 )
             else:
                 logger.error(
-                    f"[ERRO ASSINATURA] Falha ao adicionar/atualizar assinatura para {member.name} ({member.id})"
+                    f"[ERRO AVISO] Falha ao registrar aviso {tipo} para {member.name} ({member.id})"
                 )
-                continue
-
-            # ✅ Marcar que já foram avisados HOJE se estiverem em 5, 3 ou 1 dias
-            if dias_restantes == 3:
-                tipo = "AVISO_3_DIAS"
-
-                ok_aviso = registrar_aviso(member.id, tipo)
-                if ok_aviso:
-                    total_avisos_marcados += 1
-                    logger.info(
-                        f"[AVISO MARCADO] {member.name} ({member.id}) marcado como {tipo} em {data_str}"
-                    )
-                else:
-                    logger.error(
-                        f"[ERRO AVISO] Falha ao registrar aviso {tipo} para {member.name} ({member.id})"
-                    )
-            elif dias_restantes == 0:
-                tipo = "AVISO_EXPIRA_HOJE"
-                ok_aviso = registrar_aviso(member.id, tipo)
-                if ok_aviso:
-                    total_avisos_marcados += 1
-                    logger.info(
-                        f"[AVISO MARCADO] {member.name} ({member.id}) marcado como {tipo} em {data_str}"
-                    )
-                else:
-                    logger.error(
-                        f"[ERRO AVISO] Falha ao registrar aviso {tipo} para {member.name} ({member.id})"
-                    )
 
         logger.info("==== RESUMO MIGRAÇÃO ====")
         logger.info(f"Membros processados (com nick no formato esperado): {total_processados}")
         logger.info(f"Assinaturas criadas/atualizadas: {total_assinaturas_criadas}")
         logger.info(f"Avisos marcados hoje (3/0 dias): {total_avisos_marcados}")
+        # Os avisos vão para o buffer do histórico: grava tudo antes de sair
+        await descarregar_historico()
         logger.info("Migração concluída. Fechando o client.")
         await self.close()
 
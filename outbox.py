@@ -0,0 +1,353 @@
+# outbox.py
+"""
+Outbox dos efeitos no Discord (DM, cargo, apelido, kick).
+
+Quem muda o estado no banco grava, na mesma transação, os efeitos que essa
+mudança exige (database.atualizar_status_assinatura(..., efeitos=[...])).
+Depois o ExecutorEfeitos executa cada efeito pelo despachante: na hora, para
+quem acabou de enfileirar (processar_agora), e num loop de fundo (drenar)
+para o que ficou para trás. Assim o banco e o Discord não divergem quando o
+bot cai entre os dois: o efeito continua na fila até ser concluído.
+
+- Idempotência: a chave do efeito é UNIQUE; enfileirar de novo não faz nada
+  e um efeito concluído nunca volta para a fila.
+- Falha transitória: nova tentativa com backoff exponencial, até MAX_TENTATIVAS_OUTBOX.
+- Falha definitiva (Forbidden, NotFound) ou tentativas esgotadas: o efeito
+  fica MORTO (dead letter) até alguém reenfileirar.
+- Reserva: o executor marca os efeitos que pegou com o seu dono e um prazo;
+  efeitos de um processo que morreu voltam para a fila quando o prazo vence.
+  O dono é "<instância>:<executor>": a checagem e o loop de fundo da mesma
+  instância têm donos próprios e nunca tomam as reservas um do outro.
+"""
+import asyncio
+import datetime
+import json
+import logging
+import random
+import time
+import uuid
+
+import discord
+
+import database
+from config import SERVER_ID
+from database import DB_DATETIME_FORMAT
+from database_async import executar
+from despachante import Despachante
+from views import RenovarAssinaturaView
+
+PENDENTE = "PENDENTE"
+PROCESSANDO = "PROCESSANDO"
+CONCLUIDO = "CONCLUIDO"
+MORTO = "MORTO"
+
+# Tipos de efeito
+DM = "DM"
+ADICIONAR_CARGO = "ADICIONAR_CARGO"
+REMOVER_CARGO = "REMOVER_CARGO"
+APELIDO = "APELIDO"
+KICK = "KICK"
+
+MAX_TENTATIVAS_OUTBOX = 6
+BACKOFF_BASE = 30  # segundos; dobra a cada tentativa
+BACKOFF_MAXIMO = 3600
+# Prazo da reserva: depois disso o efeito de um executor que sumiu volta para a fila
+RESERVA_SEGUNDOS = 300
+LOTE_OUTBOX = 50
+RETENCAO_CONCLUIDOS_DIAS = 7
+TAMANHO_LOTE_LIMPEZA = 500
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# EFEITOS (tuplas (chave, tipo, user_id, dados) aceitas por database)
+# =====================================================
+
+def efeito_dm(chave: str, user_id: int, mensagem: str, renovar: bool = False) -> tuple:
+    """DM para o usuário; renovar=True anexa o botão de renovação"""
+    return (chave, DM, user_id, {"mensagem": mensagem, "renovar": renovar})
+
+def efeito_cargo(chave: str, user_id: int, cargo: str, remover: bool = True, motivo: str = None) -> tuple:
+    return (chave, REMOVER_CARGO if remover else ADICIONAR_CARGO, user_id, {"cargo": cargo, "motivo": motivo})
+
+def efeito_apelido(chave: str, user_id: int, apelido: str) -> tuple:
+    return (chave, APELIDO, user_id, {"apelido": apelido})
+
+def efeito_kick(chave: str, user_id: int, motivo: str = None) -> tuple:
+    return (chave, KICK, user_id, {"motivo": motivo})
+
+# =====================================================
+# FILA
+# =====================================================
+
+def atraso_backoff(tentativas: int) -> float:
+    """Espera antes da próxima tentativa (com um pouco de jitter)"""
+    atraso = min(BACKOFF_BASE * 2 ** max(tentativas - 1, 0), BACKOFF_MAXIMO)
+    return atraso * random.uniform(0.9, 1.1)
+
+def reservar_efeitos(dono: str, chaves=None, limite: int = LOTE_OUTBOX, agora: float = None) -> list:
+    """
+    Reserva para o dono os efeitos prontos (pendentes vencidos ou com reserva expirada),
+    na ordem em que foram enfileirados. Com chaves, só essas; e as reservadas por uma
+    outra instância também são pegas: quem enfileirou é o dono das chaves, então outra
+    instância só pode ser uma anterior que caiu no meio. Reservas de outro executor da
+    mesma instância são respeitadas (ele está executando o efeito agora).
+    Retorna [(id, chave, tipo, user_id, dados, tentativas)].
+    """
+    try:
+        agora = time.time() if agora is None else agora
+        condicao = "(status = ? AND proxima_tentativa <= ?) OR (status = ? AND reservado_ate < ?)"
+        parametros = [PENDENTE, agora, PROCESSANDO, agora]
+        filtro_chaves = ""
+        if chaves is not None:
+            chaves = list(chaves)
+            if not chaves:
+                return []
+            condicao += " OR (status = ? AND dono NOT LIKE ?)"
+            parametros += [PROCESSANDO, dono.split(":", 1)[0] + ":%"]
+            filtro_chaves = f"AND chave IN ({', '.join('?' * len(chaves))})"
+            parametros += chaves
+        with database.obter_gerenciador().escrita() as conn:
+            linhas = conn.execute(f'''
+                SELECT id, chave, tipo, user_id, dados, tentativas FROM outbox
+                WHERE ({condicao}) {filtro_chaves}
+                ORDER BY id LIMIT ?
+            ''', (*parametros, limite)).fetchall()
+            if linhas:
+                conn.executemany('''
+                    UPDATE outbox SET status = ?, dono = ?, reservado_ate = ? WHERE id = ?
+                ''', [(PROCESSANDO, dono, agora + RESERVA_SEGUNDOS, linha[0]) for linha in linhas])
+        return [
+            (efeito_id, chave, tipo, user_id, json.loads(dados), tentativas)
+            for efeito_id, chave, tipo, user_id, dados, tentativas in linhas
+        ]
+    except Exception as e:
+        logger.error(f"Erro ao reservar efeitos do outbox: {e}")
+        return []
+
+def situacao_efeitos(chaves) -> dict:
+    """{chave: status} das chaves que existem no outbox"""
+    try:
+        chaves = list(chaves)
+        if not chaves:
+            return {}
+        with database.obter_gerenciador().leitura() as conn:
+            return dict(conn.execute(
+                f"SELECT chave, status FROM outbox WHERE chave IN ({', '.join('?' * len(chaves))})",
+                chaves,
+            ).fetchall())
+    except Exception as e:
+        logger.error(f"Erro ao consultar efeitos do outbox: {e}")
+        return {}
+
+def concluir_efeito(efeito_id: int) -> bool:
+    try:
+        with database.obter_gerenciador().escrita() as conn:
+            conn.execute('''
+                UPDATE outbox SET status = ?, dono = NULL, reservado_ate = NULL, concluido_em = ?
+                WHERE id = ?
+            ''', (CONCLUIDO, time.time(), efeito_id))
+        return True
+    except Exception as e:
+        logger.error(f"Erro ao concluir efeito {efeito_id} do outbox: {e}")
+        return False
+
+def falhar_efeito(efeito_id: int, erro: str, definitivo: bool = False, agora: float = None):
+    """
+    Registra uma tentativa que falhou: volta para a fila com backoff exponencial,
+    ou fica MORTO (falha definitiva ou tentativas esgotadas). Retorna o novo status (None em erro).
+    """
+    try:
+        agora = time.time() if agora is None else agora
+        with database.obter_gerenciador().escrita() as conn:
+            linha = conn.execute("SELECT tentativas FROM outbox WHERE id = ?", (efeito_id,)).fetchone()
+            if linha is None:
+                return None
+            tentativas = linha[0] + 1
+            status = MORTO if definitivo or tentativas >= MAX_TENTATIVAS_OUTBOX else PENDENTE
+            conn.execute('''
+                UPDATE outbox SET status = ?, tentativas = ?, proxima_tentativa = ?,
+                    dono = NULL, reservado_ate = NULL, ultimo_erro = ?
+                WHERE id = ?
+            ''', (status, tentativas, agora + atraso_backoff(tentativas), erro[:500], efeito_id))
+        return status
+    except Exception as e:
+        logger.error(f"Erro ao registrar falha do efeito {efeito_id} do outbox: {e}")
+        return None
+
+def reenfileirar_mortos(user_id: int = None) -> int:
+    """Devolve os efeitos mortos (de um usuário ou todos) para a fila, com as tentativas zeradas"""
+    try:
+        filtro = "" if user_id is None else "AND user_id = ?"
+        with database.obter_gerenciador().escrita() as conn:
+            cursor = conn.execute(f'''
+                UPDATE outbox SET status = ?, tentativas = 0, proxima_tentativa = 0
+                WHERE status = ? {filtro}
+            ''', (PENDENTE, MORTO) + (() if user_id is None else (user_id,)))
+            return cursor.rowcount
+    except Exception as e:
+        logger.error(f"Erro ao reenfileirar efeitos mortos: {e}")
+        return 0
+
+def limpar_concluidos(dias: int = RETENCAO_CONCLUIDOS_DIAS, tamanho_lote: int = TAMANHO_LOTE_LIMPEZA) -> int:
+    """Apaga um lote de efeitos concluídos há mais de N dias. Retorna quantos (0 = nada a fazer)"""
+    try:
+        limite = time.time() - dias * 86400
+        with database.obter_gerenciador().escrita() as conn:
+            cursor = conn.execute('''
+                DELETE FROM outbox WHERE id IN (
+                    SELECT id FROM outbox WHERE status = ? AND concluido_em < ? LIMIT ?
+                )
+            ''', (CONCLUIDO, limite, tamanho_lote))
+            return cursor.rowcount
+    except Exception as e:
+        logger.error(f"Erro ao limpar efeitos concluídos do outbox: {e}")
+        return 0
+
+def estatisticas_outbox(janela_segundos: int = 3600) -> dict:
+    """
+    Profundidade da fila por status, idade do pendente mais antigo (segundos)
+    e vazão (efeitos concluídos na janela e por minuto).
+    """
+    try:
+        agora = time.time()
+        with database.obter_gerenciador().leitura() as conn:
+            contagens = dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            mais_antigo = conn.execute(
+                "SELECT MIN(criado_em) FROM outbox WHERE status IN (?, ?)", (PENDENTE, PROCESSANDO)
+            ).fetchone()[0]
+            concluidos_janela = conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE status = ? AND concluido_em >= ?",
+                (CONCLUIDO, agora - janela_segundos),
+            ).fetchone()[0]
+        idade = None
+        if mais_antigo:
+            criado = datetime.datetime.strptime(mais_antigo, DB_DATETIME_FORMAT)
+            idade = max((datetime.datetime.now() - criado).total_seconds(), 0.0)
+        return {
+            'pendentes': contagens.get(PENDENTE, 0),
+            'processando': contagens.get(PROCESSANDO, 0),
+            'mortos': contagens.get(MORTO, 0),
+            'concluidos': contagens.get(CONCLUIDO, 0),
+            'mais_antigo_segundos': idade,
+            'concluidos_janela': concluidos_janela,
+            'vazao_por_minuto': concluidos_janela / (janela_segundos / 60),
+        }
+    except Exception as e:
+        logger.error(f"Erro ao obter estatísticas do outbox: {e}")
+        return {}
+
+# =====================================================
+# EXECUÇÃO
+# =====================================================
+
+class _NaFila:
+    __slots__ = ()
+
+    def __repr__(self):
+        return "NA_FILA"
+
+# Resultado de processar_agora para um efeito que não foi executado agora (reservado
+# por outro executor, em backoff ou morto): não é sucesso nem erro, fica com o outbox
+NA_FILA = _NaFila()
+
+class ExecutorEfeitos:
+    """
+    Executa os efeitos do outbox no Discord pelo despachante. Cada executor
+    tem um dono próprio para as reservas; executores que trabalham juntos
+    recebem a mesma instância e nomes diferentes.
+    """
+
+    def __init__(self, bot=None, despachante: Despachante = None, instancia: str = None, nome: str = None):
+        self.bot = bot
+        self.despachante = despachante or Despachante()
+        self.dono = f"{instancia or uuid.uuid4().hex}:{nome or uuid.uuid4().hex}"
+
+    def _membro(self, user_id: int):
+        guild = self.bot.get_guild(SERVER_ID) if self.bot is not None else None
+        return guild.get_member(user_id) if guild is not None else None
+
+    async def _executar(self, despachante, tipo, user_id, dados, membro, cargo):
+        if tipo == DM:
+            destino = membro
+            if destino is None and self.bot is not None:
+                destino = await self.bot.fetch_user(user_id)
+            if destino is None:
+                raise LookupError(f"Usuário {user_id} não encontrado para a DM")
+            dm_channel = await despachante.chamar("dm_criar", destino.create_dm, user_id=user_id)
+            extras = {"view": RenovarAssinaturaView(destino)} if dados.get("renovar") else {}
+            await despachante.chamar("mensagem", dm_channel.send, dados["mensagem"], user_id=user_id, **extras)
+            return
+
+        if membro is None:
+            if tipo in (REMOVER_CARGO, KICK):
+                return  # já saiu do servidor: nada a desfazer
+            raise LookupError(f"Membro {user_id} não está no servidor")
+        try:
+            if tipo in (ADICIONAR_CARGO, REMOVER_CARGO):
+                cargo = cargo or discord.utils.get(membro.guild.roles, name=dados["cargo"])
+                if cargo is None:
+                    raise LookupError(f"Cargo '{dados['cargo']}' não encontrado")
+                metodo = membro.remove_roles if tipo == REMOVER_CARGO else membro.add_roles
+                await despachante.chamar("membro_editar", metodo, cargo, reason=dados.get("motivo"), user_id=user_id)
+            elif tipo == APELIDO:
+                await despachante.chamar("membro_editar", membro.edit, nick=dados["apelido"], user_id=user_id)
+            elif tipo == KICK:
+                await despachante.chamar("kick", membro.kick, reason=dados.get("motivo"), user_id=user_id)
+            else:
+                raise ValueError(f"Tipo de efeito desconhecido: {tipo}")
+        except discord.NotFound:
+            if tipo in (REMOVER_CARGO, KICK):
+                return
+            raise
+
+    async def _processar(self, linhas, despachante, membro=None, cargo=None) -> dict:
+        """Executa os efeitos reservados em ordem. Retorna {chave: None (ok) ou a exceção}"""
+        resultados = {}
+        for efeito_id, chave, tipo, user_id, dados, _tentativas in linhas:
+            alvo = membro if membro is not None and membro.id == user_id else self._membro(user_id)
+            try:
+                await self._executar(despachante, tipo, user_id, dados, alvo, cargo)
+            except Exception as e:
+                definitivo = isinstance(e, (discord.Forbidden, discord.NotFound, ValueError))
+                status = await asyncio.shield(
+                    executar(falhar_efeito, efeito_id, f"{e.__class__.__name__}: {e}", definitivo)
+                )
+                logger.warning(f"Efeito {chave} falhou ({status}): {e}")
+                resultados[chave] = e
+                continue
+            # A chamada ao Discord já aconteceu: a conclusão é gravada mesmo se a tarefa for cancelada
+            await asyncio.shield(executar(concluir_efeito, efeito_id))
+            resultados[chave] = None
+        return resultados
+
+    async def processar_agora(self, chaves, membro=None, cargo=None, despachante=None) -> dict:
+        """
+        Executa já os efeitos das chaves (acabaram de ser enfileirados), com o membro e o
+        cargo que quem chama já tem em mãos. Retorna {chave: None (ok), a exceção ou NA_FILA}:
+        efeito já concluído antes conta como ok; reservado por outro executor, em backoff
+        ou morto volta NA_FILA, e quem termina é o loop de fundo (ou o !reprocessar_efeitos).
+        """
+        chaves = list(chaves)
+        linhas = await executar(reservar_efeitos, self.dono, chaves=chaves)
+        resultados = await self._processar(linhas, despachante or self.despachante, membro, cargo) if linhas else {}
+        faltando = [chave for chave in chaves if chave not in resultados]
+        if faltando:
+            situacao = await executar(situacao_efeitos, faltando)
+            for chave in faltando:
+                resultados[chave] = None if situacao.get(chave) == CONCLUIDO else NA_FILA
+        return resultados
+
+    async def drenar(self, limite: int = LOTE_OUTBOX) -> int:
+        """
+        Executa um lote de efeitos prontos; usuários diferentes em paralelo,
+        os efeitos de um mesmo usuário na ordem da fila. Retorna quantos foram reservados.
+        """
+        linhas = await executar(reservar_efeitos, self.dono, limite=limite)
+        por_usuario = {}
+        for linha in linhas:
+            por_usuario.setdefault(linha[3], []).append(linha)
+        await self.despachante.executar_todas(
+            self._processar(grupo, self.despachante) for grupo in por_usuario.values()
+        )
+        return len(linhas)
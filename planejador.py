@@ -0,0 +1,139 @@
+# planejador.py
+"""
+Modo de planejamento (dry-run) da checagem de assinaturas.
+
+Calcula, sem efeito colateral nenhum, as ações que a checagem faria agora
+(aviso de 3 dias, aviso do dia, remoção), agrupadas por tipo, e estima o tempo
+de execução a partir dos limites por rota do despachante. Usa a mesma faixa
+do índice (status, data_expiracao_epoch) da checagem e só lê colunas inteiras,
+sem montar registros Assinatura.
+"""
+import datetime
+import logging
+import time
+from datetime import timedelta
+
+import database
+from database import para_epoch
+from despachante import estimar_duracao
+
+AVISO_3_DIAS = "AVISO_3_DIAS"
+AVISO_HOJE = "AVISO_HOJE"
+REMOCAO = "REMOCAO"
+
+# Chamadas ao Discord de cada ação, na ordem em que a checagem faz
+ROTAS_POR_ACAO = {
+    AVISO_3_DIAS: ("dm_criar", "mensagem"),
+    AVISO_HOJE: ("dm_criar", "mensagem"),
+    REMOCAO: ("dm_criar", "mensagem", "membro_editar", "kick"),
+}
+# Mesmo intervalo mínimo entre avisos usado pela checagem
+INTERVALO_MINIMO_AVISO = 12 * 3600
+DIA = 86400
+
+logger = logging.getLogger(__name__)
+
+def planejar_checagem(hoje: datetime.date = None, agora: datetime.datetime = None,
+                      dias_aviso: int = 3, presente=None) -> dict:
+    """
+    Plano da checagem no modo "banco":
+    {'dia', 'acoes': {tipo: [(user_id, data_expiracao_epoch)]}, 'avisos_recentes',
+     'fora_do_servidor', 'chamadas_por_rota', 'estimativa_segundos', 'duracao_planejamento'}.
+    presente: função user_id -> bool (ex.: membro está no servidor); None considera todos.
+    Retorna None em caso de erro.
+    """
+    try:
+        inicio_planejamento = time.perf_counter()
+        agora = agora or datetime.datetime.now()
+        hoje = hoje or agora.date()
+        inicio_dia = para_epoch(datetime.datetime.combine(hoje, datetime.time(0, 0)))
+        amanha = inicio_dia + DIA
+        aviso_de = inicio_dia + dias_aviso * DIA
+        aviso_ate = aviso_de + DIA
+        limite_aviso = para_epoch(agora) - INTERVALO_MINIMO_AVISO
+
+        with database.obter_gerenciador().leitura() as conn:
+            linhas = conn.execute('''
+                SELECT user_id, data_expiracao_epoch, ultimo_aviso_epoch FROM assinaturas
+                WHERE status = 'ATIVA' AND data_expiracao_epoch < ?
+                AND (data_expiracao_epoch < ? OR data_expiracao_epoch >= ?)
+                ORDER BY data_expiracao_epoch
+            ''', (aviso_ate, amanha, aviso_de)).fetchall()
+
+        acoes = {AVISO_3_DIAS: [], AVISO_HOJE: [], REMOCAO: []}
+        avisos_recentes = 0
+        fora_do_servidor = 0
+        for user_id, expiracao, ultimo_aviso in linhas:
+            if presente is not None and not presente(user_id):
+                fora_do_servidor += 1
+                continue
+            if expiracao < inicio_dia:
+                acoes[REMOCAO].append((user_id, expiracao))
+            elif ultimo_aviso is not None and ultimo_aviso > limite_aviso:
+                avisos_recentes += 1
+            elif expiracao < amanha:
+                acoes[AVISO_HOJE].append((user_id, expiracao))
+            else:
+                acoes[AVISO_3_DIAS].append((user_id, expiracao))
+
+        chamadas_por_rota = {}
+        for tipo, lista in acoes.items():
+            for rota in ROTAS_POR_ACAO[tipo]:
+                chamadas_por_rota[rota] = chamadas_por_rota.get(rota, 0) + len(lista)
+
+        return {
+            'dia': hoje,
+            'acoes': acoes,
+            'avisos_recentes': avisos_recentes,
+            'fora_do_servidor': fora_do_servidor,
+            'chamadas_por_rota': chamadas_por_rota,
+            'estimativa_segundos': estimar_duracao(chamadas_por_rota),
+            'duracao_planejamento': time.perf_counter() - inicio_planejamento,
+        }
+    except Exception as e:
+        logger.error(f"Erro ao planejar checagem: {e}")
+        return None
+
+def _formatar_duracao(segundos: float) -> str:
+    minutos, segundos = divmod(int(round(segundos)), 60)
+    horas, minutos = divmod(minutos, 60)
+    if horas:
+        return f"{horas}h{minutos:02d}min"
+    if minutos:
+        return f"{minutos}min{segundos:02d}s"
+    return f"{segundos}s"
+
+def formatar_plano(plano: dict) -> str:
+    """Resumo do plano para o canal (cabe numa mensagem)"""
+    acoes = plano['acoes']
+    total_chamadas = sum(plano['chamadas_por_rota'].values())
+    return (
+        f"🧭 **PLANO DA CHECAGEM DE ASSINATURAS** ({plano['dia'].strftime('%d/%m/%Y')}, nada foi executado)\n"
+        f"🔔 Avisos de 3 dias: **{len(acoes[AVISO_3_DIAS])}** | "
+        f"avisos de hoje: **{len(acoes[AVISO_HOJE])}**\n"
+        f"🚫 Remoções (DM + cargo + kick): **{len(acoes[REMOCAO])}**\n"
+        f"⏭️ Aviso recente (pulados): **{plano['avisos_recentes']}** | "
+        f"fora do servidor: **{plano['fora_do_servidor']}**\n"
+        f"📨 Chamadas ao Discord: **{total_chamadas}** | "
+        f"tempo estimado: **{_formatar_duracao(plano['estimativa_segundos'])}**\n"
+        f"⏱️ Planejado em {plano['duracao_planejamento'] * 1000:.0f} ms"
+    )
+
+def escrever_plano(plano: dict) -> str:
+    """Lista completa das ações, agrupada por tipo (conteúdo do arquivo anexado)"""
+    linhas = [
+        f"PLANO DA CHECAGEM DE ASSINATURAS - {plano['dia'].strftime('%d/%m/%Y')}",
+        "=" * 50,
+        "",
+    ]
+    for tipo, lista in plano['acoes'].items():
+        linhas.append(f"{tipo} ({len(lista)}):")
+        linhas.append("-" * 50)
+        for user_id, expiracao in lista:
+            data = (database._EPOCH + timedelta(seconds=expiracao)).strftime("%d/%m/%Y")
+            linhas.append(f"ID: {user_id} | Expira: {data}")
+        linhas.append("")
+    linhas.append("CHAMADAS POR ROTA:")
+    for rota, quantidade in sorted(plano['chamadas_por_rota'].items()):
+        linhas.append(f"{rota}: {quantidade}")
+    return "\n".join(linhas) + "\n"
@@ -0,0 +1,195 @@
+# publicador_resumo.py
+"""
+Publicação do resumo da checagem no canal de notificações.
+
+Os detalhes dos removidos chegam um a um durante a rodada. Enquanto cabem
+junto do resumo numa mensagem (limite de 2.000 caracteres do Discord), tudo
+sai numa mensagem só, como antes. Passando disso, os detalhes são publicados
+durante a rodada em páginas de embed; depois de MAX_PAGINAS_RESUMO páginas,
+a lista completa vai num arquivo anexado ao final. Nenhuma linha é perdida:
+se o envio de uma página falha, o erro é registrado no log, a rodada segue
+e a lista completa também vai no arquivo.
+
+Rodadas longas ganham uma mensagem de progresso, editada no máximo a cada
+INTERVALO_PROGRESSO_RESUMO segundos (as atualizações no meio são agrupadas),
+que no fim vira o resumo. Todas as chamadas passam pela rota "canal" do
+despachante, separada da rota "mensagem" das DMs: o resumo não disputa o
+balde com os avisos aos membros.
+"""
+import asyncio
+import io
+import logging
+import time
+
+import discord
+
+from config import INTERVALO_PROGRESSO_RESUMO, MAX_PAGINAS_RESUMO
+
+LIMITE_MENSAGEM = 2000
+# Descrição do embed aceita 4.096 caracteres; sobra margem para o rodapé
+LIMITE_PAGINA = 4000
+TITULO_DETALHES = "\n\n**Detalhes dos removidos:**\n"
+NOME_ARQUIVO = "removidos_checagem.txt"
+# Rota do despachante para as mensagens no canal de notificações
+ROTA = "canal"
+
+logger = logging.getLogger(__name__)
+
+class PublicadorResumo:
+    """Resumo de uma rodada da checagem: progresso, páginas de detalhes e mensagem final"""
+
+    def __init__(self, canal, despachante, intervalo: float = INTERVALO_PROGRESSO_RESUMO,
+                 max_paginas: int = MAX_PAGINAS_RESUMO, relogio=time.monotonic):
+        self.canal = canal
+        self.despachante = despachante
+        self.intervalo = intervalo
+        self.max_paginas = max_paginas
+        self._relogio = relogio
+        self._lock = asyncio.Lock()
+        self._inicio = relogio()
+        self._ultima_edicao = self._inicio
+        self._progresso = None
+        self.detalhes = []
+        self._linhas_publicadas = 0
+        self._pagina = []
+        self._tamanho_pagina = 0
+        self.paginas_enviadas = 0
+        self.falhas_envio = 0
+        self.edicoes = 0
+        self.total = 0
+        self.processados = 0
+        self.removidos = 0
+
+    @property
+    def iniciado(self) -> bool:
+        """Já publicou algo no canal (progresso ou página) durante a rodada"""
+        return self._progresso is not None or self.paginas_enviadas > 0
+
+    @property
+    def em_arquivo(self) -> bool:
+        """
+        Os detalhes já passaram do que cabe nas páginas (ou uma página falhou):
+        a lista completa vai em arquivo
+        """
+        return self.paginas_enviadas >= self.max_paginas or self.falhas_envio > 0
+
+    def esperar(self, quantidade: int):
+        """Mais membros a processar nesta rodada (para o progresso)"""
+        self.total += quantidade
+
+    async def adicionar_detalhe(self, linha: str):
+        """Um removido: guarda a linha e publica a página quando ela enche"""
+        self.removidos += 1
+        self.detalhes.append(linha)
+        if self.canal is None or self.em_arquivo:
+            return
+        if self._tamanho_pagina + len(linha) + 1 > LIMITE_PAGINA:
+            async with self._lock:
+                if self._tamanho_pagina + len(linha) + 1 > LIMITE_PAGINA:
+                    await self._publicar_pagina()
+        self._pagina.append(linha)
+        self._tamanho_pagina += len(linha) + 1
+
+    async def membro_concluido(self):
+        """Conta o membro e atualiza o progresso, se o intervalo mínimo já passou"""
+        self.processados += 1
+        if self.canal is None or self._relogio() - self._ultima_edicao < self.intervalo:
+            return
+        async with self._lock:
+            if self._relogio() - self._ultima_edicao >= self.intervalo:
+                await self._atualizar_progresso(self._texto_progresso())
+
+    def _texto_progresso(self) -> str:
+        return (
+            f"⏳ **CHECAGEM DE ASSINATURAS EM ANDAMENTO**\n"
+            f"👥 Processados: **{self.processados}** de **{self.total}** | "
+            f"🚫 removidos: **{self.removidos}**"
+        )
+
+    async def _atualizar_progresso(self, conteudo: str):
+        """Envia ou edita a mensagem de progresso; uma falha só vai para o log"""
+        self._ultima_edicao = self._relogio()
+        try:
+            if self._progresso is None:
+                self._progresso = await self.despachante.chamar(ROTA, self.canal.send, conteudo)
+            else:
+                await self.despachante.chamar(ROTA, self._progresso.edit, content=conteudo)
+                self.edicoes += 1
+        except Exception as e:
+            logger.error(f"Erro ao atualizar o progresso da checagem no canal: {e}")
+
+    async def _publicar_pagina(self):
+        """
+        Envia a página acumulada como embed (a mensagem de progresso vem antes).
+        As linhas só saem da página depois do envio; se ele falha, ficam para o arquivo.
+        """
+        if not self._pagina or self.em_arquivo:
+            return
+        if self._progresso is None:
+            await self._atualizar_progresso(self._texto_progresso())
+        # Linhas que chegarem durante o envio ficam na página para a próxima
+        pagina = list(self._pagina)
+        embed = discord.Embed(
+            title=f"Detalhes dos removidos (página {self.paginas_enviadas + 1})",
+            description="\n".join(pagina),
+            color=discord.Color.red(),
+        )
+        try:
+            await self.despachante.chamar(ROTA, self.canal.send, embed=embed)
+        except Exception as e:
+            self.falhas_envio += 1
+            logger.error(f"Erro ao publicar página de detalhes da checagem (vão no arquivo anexo): {e}")
+            return
+        del self._pagina[:len(pagina)]
+        self._tamanho_pagina = sum(len(linha) + 1 for linha in self._pagina)
+        self.paginas_enviadas += 1
+        self._linhas_publicadas += len(pagina)
+
+    def _arquivo(self) -> discord.File:
+        conteudo = ("\n".join(self.detalhes) + "\n").encode("utf-8")
+        return discord.File(io.BytesIO(conteudo), filename=NOME_ARQUIVO)
+
+    async def finalizar(self, resumo: str):
+        """
+        Publica o resumo final: numa mensagem só se os detalhes couberem, senão
+        as páginas que faltam (ou o arquivo com a lista completa, também quando
+        alguma página não pôde ser enviada).
+        """
+        if self.canal is None:
+            return
+        async with self._lock:
+            inline = TITULO_DETALHES + "\n".join(self.detalhes) if self.detalhes else ""
+            if self.paginas_enviadas == 0 and len(resumo) + len(inline) <= LIMITE_MENSAGEM:
+                await self._publicar_final(resumo + inline)
+                return
+
+            # A página em aberto nunca passa de LIMITE_PAGINA: falta no máximo uma
+            cabe_nas_paginas = (
+                not self.falhas_envio
+                and self.paginas_enviadas + (1 if self._pagina else 0) <= self.max_paginas
+                and self._linhas_publicadas + len(self._pagina) == len(self.detalhes)
+            )
+            if cabe_nas_paginas:
+                await self._publicar_pagina()
+                if not self.falhas_envio:
+                    await self._publicar_final(
+                        resumo + f"\n\n📄 Detalhes dos **{len(self.detalhes)}** removidos em "
+                        f"**{self.paginas_enviadas}** página(s) abaixo."
+                    )
+                    return
+
+            # Passou das páginas (ou uma delas falhou): a lista completa (inclusive o que já foi publicado) vai em arquivo
+            await self._publicar_final(
+                resumo + f"\n\n📎 Lista completa dos **{len(self.detalhes)}** removidos no arquivo anexo."
+            )
+            await self.despachante.chamar(
+                ROTA, self.canal.send,
+                f"📎 Detalhes dos removidos ({len(self.detalhes)})", file=self._arquivo(),
+            )
+
+    async def _publicar_final(self, conteudo: str):
+        if self._progresso is not None:
+            await self.despachante.chamar(ROTA, self._progresso.edit, content=conteudo)
+            self.edicoes += 1
+        else:
+            await self.despachante.chamar(ROTA, self.canal.send, conteudo)
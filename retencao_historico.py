@@ -0,0 +1,189 @@
+# retencao_historico.py
+"""
+Política de retenção da tabela historico.
+
+- Compactação: avisos (acao = 'AVISO') repetidos do mesmo usuário no mesmo dia
+  viram uma única linha 'AVISO_RESUMO' com a contagem e os tipos.
+- Arquivamento: linhas mais antigas que RETENCAO_DIAS saem da tabela quente e vão
+  para um arquivo SQLite por mês (historico_AAAA_MM.db), anexado com ATTACH só
+  durante a cópia ou quando uma auditoria pede.
+
+Tudo roda em lotes pequenos, cada um numa transação curta na conexão de escrita,
+para o bot continuar gravando entre um lote e outro.
+"""
+import datetime
+import glob
+import logging
+import os
+
+import database
+
+# Linhas mais antigas que isso (em dias) saem da tabela quente
+RETENCAO_DIAS = 90
+# Avisos só são compactados depois que o dia (UTC) terminou há pelo menos N dias
+COMPACTAR_AVISOS_APOS_DIAS = 1
+TAMANHO_LOTE_RETENCAO = 500
+PREFIXO_ARQUIVO = "historico_"
+
+logger = logging.getLogger(__name__)
+
+def pasta_arquivo() -> str:
+    """Pasta dos arquivos mensais: 'arquivo_historico' ao lado do banco principal"""
+    return os.path.join(os.path.dirname(os.path.abspath(database.DB_PATH)), "arquivo_historico")
+
+def caminho_arquivo(mes: str, pasta: str = None) -> str:
+    """Arquivo do mês no formato 'AAAA-MM'"""
+    return os.path.join(pasta or pasta_arquivo(), f"{PREFIXO_ARQUIVO}{mes.replace('-', '_')}.db")
+
+def meses_arquivados(pasta: str = None) -> list:
+    """Meses ('AAAA-MM') que já têm arquivo, em ordem"""
+    arquivos = glob.glob(os.path.join(pasta or pasta_arquivo(), f"{PREFIXO_ARQUIVO}*.db"))
+    meses = []
+    for arquivo in arquivos:
+        nome = os.path.basename(arquivo)[len(PREFIXO_ARQUIVO):-3]
+        meses.append(nome.replace("_", "-"))
+    return sorted(meses)
+
+def _limite_utc(dias: int) -> str:
+    """Início do dia (UTC) de N dias atrás, no formato da coluna data_hora"""
+    hoje = datetime.datetime.now(datetime.timezone.utc).date()
+    return f"{(hoje - datetime.timedelta(days=dias)).isoformat()} 00:00:00"
+
+def compactar_avisos(dias: int = COMPACTAR_AVISOS_APOS_DIAS, tamanho_lote: int = TAMANHO_LOTE_RETENCAO) -> int:
+    """
+    Junta até tamanho_lote grupos (usuário, dia) com mais de um AVISO numa linha
+    'AVISO_RESUMO' cada. Retorna quantas linhas foram removidas (0 = nada a fazer).
+    """
+    try:
+        limite = _limite_utc(dias)
+        removidas = 0
+        with database.obter_gerenciador().escrita() as conn:
+            grupos = conn.execute('''
+                SELECT user_id, substr(data_hora, 1, 10) AS dia, COUNT(*), MIN(id),
+                       GROUP_CONCAT(detalhes, ' | ')
+                FROM historico
+                WHERE data_hora < ? AND acao = 'AVISO'
+                GROUP BY user_id, dia
+                HAVING COUNT(*) > 1
+                LIMIT ?
+            ''', (limite, tamanho_lote)).fetchall()
+
+            for user_id, dia, quantidade, primeiro_id, detalhes in grupos:
+                dia_seguinte = (datetime.date.fromisoformat(dia) + datetime.timedelta(days=1)).isoformat()
+                conn.execute('''
+                    UPDATE historico SET acao = 'AVISO_RESUMO', detalhes = ? WHERE id = ?
+                ''', (f"{quantidade} avisos: {detalhes}", primeiro_id))
+                cursor = conn.execute('''
+                    DELETE FROM historico
+                    WHERE user_id = ? AND data_hora >= ? AND data_hora < ?
+                    AND acao = 'AVISO' AND id != ?
+                ''', (user_id, dia, dia_seguinte, primeiro_id))
+                removidas += cursor.rowcount
+
+        if removidas:
+            logger.info(f"Compactação do histórico: {removidas} avisos repetidos resumidos em {len(grupos)} linhas")
+        return removidas
+    except Exception as e:
+        logger.error(f"Erro ao compactar avisos do histórico: {e}")
+        return 0
+
+def arquivar_lote(dias: int = RETENCAO_DIAS, tamanho_lote: int = TAMANHO_LOTE_RETENCAO, pasta: str = None) -> int:
+    """
+    Move até tamanho_lote linhas mais antigas que 'dias' para os arquivos mensais.
+    A cópia usa INSERT OR IGNORE com o mesmo id, então repetir um lote que caiu
+    no meio (arquivo gravado, tabela quente não) só termina o DELETE.
+    Retorna quantas linhas saíram da tabela quente (0 = nada a fazer).
+    """
+    try:
+        pasta = pasta or pasta_arquivo()
+        limite = _limite_utc(dias)
+        movidas = 0
+        with database.obter_gerenciador().escrita() as conn:
+            linhas = conn.execute('''
+                SELECT id, substr(data_hora, 1, 7) FROM historico
+                WHERE data_hora < ?
+                ORDER BY data_hora LIMIT ?
+            ''', (limite, tamanho_lote)).fetchall()
+            if not linhas:
+                return 0
+
+            por_mes = {}
+            for id_linha, mes in linhas:
+                por_mes.setdefault(mes, []).append(id_linha)
+
+            os.makedirs(pasta, exist_ok=True)
+            # ATTACH/DETACH não podem rodar dentro de transação
+            if conn.in_transaction:
+                conn.commit()
+            for mes, ids in por_mes.items():
+                conn.execute("ATTACH DATABASE ? AS arquivo", (caminho_arquivo(mes, pasta),))
+                try:
+                    conn.execute('''
+                        CREATE TABLE IF NOT EXISTS arquivo.historico(
+                            id INTEGER PRIMARY KEY,
+                            user_id INTEGER NOT NULL,
+                            acao TEXT NOT NULL,
+                            detalhes TEXT,
+                            data_hora TEXT
+                        )
+                    ''')
+                    conn.execute('''
+                        CREATE INDEX IF NOT EXISTS arquivo.idx_historico_usuario_data
+                        ON historico(user_id, data_hora)
+                    ''')
+                    for inicio in range(0, len(ids), database.TAMANHO_LOTE_IN):
+                        parte = ids[inicio:inicio + database.TAMANHO_LOTE_IN]
+                        marcadores = ",".join("?" * len(parte))
+                        conn.execute(f'''
+                            INSERT OR IGNORE INTO arquivo.historico (id, user_id, acao, detalhes, data_hora)
+                            SELECT id, user_id, acao, detalhes, data_hora
+                            FROM main.historico WHERE id IN ({marcadores})
+                        ''', parte)
+                        cursor = conn.execute(
+                            f"DELETE FROM main.historico WHERE id IN ({marcadores})", parte
+                        )
+                        movidas += cursor.rowcount
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+                finally:
+                    conn.execute("DETACH DATABASE arquivo")
+
+        logger.info(f"Arquivamento do histórico: {movidas} linhas movidas ({', '.join(sorted(por_mes))})")
+        return movidas
+    except Exception as e:
+        logger.error(f"Erro ao arquivar histórico: {e}")
+        return 0
+
+def obter_historico_usuario(user_id: int, incluir_arquivo: bool = True, meses: list = None, pasta: str = None) -> list:
+    """
+    Histórico de um usuário (id, user_id, acao, detalhes, data_hora) em ordem cronológica.
+    Para auditoria, anexa os arquivos mensais (todos ou só os meses pedidos)
+    na conexão de leitura enquanto consulta.
+    """
+    try:
+        pasta = pasta or pasta_arquivo()
+        linhas = []
+        with database.obter_gerenciador().leitura() as conn:
+            if incluir_arquivo:
+                for mes in (meses if meses is not None else meses_arquivados(pasta)):
+                    caminho = caminho_arquivo(mes, pasta)
+                    if not os.path.exists(caminho):
+                        continue
+                    conn.execute("ATTACH DATABASE ? AS arquivo", (caminho,))
+                    try:
+                        linhas.extend(conn.execute('''
+                            SELECT id, user_id, acao, detalhes, data_hora FROM arquivo.historico
+                            WHERE user_id = ? ORDER BY data_hora, id
+                        ''', (user_id,)).fetchall())
+                    finally:
+                        conn.execute("DETACH DATABASE arquivo")
+            linhas.extend(conn.execute('''
+                SELECT id, user_id, acao, detalhes, data_hora FROM historico
+                WHERE user_id = ? ORDER BY data_hora, id
+            ''', (user_id,)).fetchall())
+        return linhas
+    except Exception as e:
+        logger.error(f"Erro ao obter histórico do usuário {user_id}: {e}")
+        return []
@@ -25,14 +25,22 @@ def use_temp_db(tmp_path, monkeypatch):
     original_connect = sqlite3.connect
 
     def fake_connect(_path, *args, **kwargs):
-        # Sempre aponta para o arquivo temporário,
-        # mas usa a função original do sqlite3 para evitar recursão
+        # Arquivos já dentro do diretório temporário (ex.: backups das migrações)
+        # são abertos como estão; qualquer outro caminho vai para o banco de teste.
+        # Usa a função original do sqlite3 para evitar recursão
+        if str(_path).startswith(str(tmp_path)):
+            return original_connect(_path, *args, **kwargs)
         return original_connect(db_file, *args, **kwargs)
 
     # Monkeypatch só o connect usado dentro do módulo database
     monkeypatch.setattr(database.sqlite3, "connect", fake_connect)
 
+    # Descarta conexões abertas por testes anteriores (pool é global)
+    database.fechar_conexoes()
+
     # Inicializa o schema no banco de teste
     database.init_db()
 
     yield
+
+    database.fechar_conexoes()
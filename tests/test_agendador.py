@@ -0,0 +1,133 @@
+# tests/test_agendador.py
+import datetime
+import random
+from collections import defaultdict
+from datetime import timedelta
+
+import database
+from agendador import AVISO_3_DIAS, AVISO_HOJE, REMOCAO, AgendaAssinaturas, reconstruir_do_banco
+
+
+def _registro(user_id, data_expiracao, status="ATIVA"):
+    return database.Assinatura(user_id, f"User{user_id}", data_expiracao, "Plano 30 dias", None, status, None)
+
+
+def test_agenda_eventos_renovacao_e_cancelamento():
+    """
+    Cada assinatura gera lembrete de 3 dias, lembrete do dia e remoção;
+    renovar troca os eventos, cancelar descarta, e prazos já passados
+    só valem no próprio dia (a remoção vale sempre).
+    """
+    agora = datetime.datetime(2025, 3, 10, 12, 0)
+    agenda = AgendaAssinaturas()
+
+    agenda.agendar(1, datetime.date(2025, 3, 20), agora=agora)
+    agenda.agendar(2, datetime.date(2025, 3, 10), agora=agora)  # vence hoje, já passou das 9h
+    agenda.agendar(3, datetime.date(2025, 3, 1), agora=agora)   # vencida há dias
+    assert len(agenda) == 3 + 2 + 1
+
+    assert agenda.proximo_prazo() == agora
+    assert sorted(agenda.retirar_vencidos(agora)) == [
+        (agora, AVISO_HOJE, 2),
+        (agora, REMOCAO, 3),
+    ]
+    assert agenda.proximo_prazo() == datetime.datetime(2025, 3, 11, 9, 0)
+
+    agenda.agendar(2, datetime.date(2025, 4, 10), agora=agora)  # renovou
+    agenda.cancelar(1)
+    assert agenda.proximo_prazo() == datetime.datetime(2025, 4, 7, 9, 0)
+    eventos = agenda.retirar_vencidos(datetime.datetime(2025, 5, 1))
+    assert [(tipo, user_id) for _, tipo, user_id in eventos] == [
+        (AVISO_3_DIAS, 2), (AVISO_HOJE, 2), (REMOCAO, 2),
+    ]
+    assert len(agenda) == 0
+    assert agenda.proximo_prazo() is None
+
+
+def test_agenda_acompanha_escritas_no_banco():
+    """
+    Montada do banco na inicialização e atualizada pelas escritas:
+    nova assinatura agenda, status diferente de ATIVA cancela.
+    """
+    agora = datetime.datetime.now()
+    database.adicionar_assinatura(1, "User1", agora + timedelta(days=10), "Plano 30 dias")
+    database.adicionar_assinatura(2, "User2", agora + timedelta(days=20), "Plano 30 dias")
+    database.atualizar_status_assinatura(2, "EXPIRADA", "teste")
+
+    avisos = []
+    agenda = AgendaAssinaturas(ao_mudar=lambda: avisos.append(1))
+    assert reconstruir_do_banco(agenda) == 3
+    database.registrar_ouvinte(agenda.atualizar)
+    try:
+        database.adicionar_assinaturas_em_lote([(3, "User3", agora + timedelta(days=5), "Plano 30 dias")])
+        assert len(agenda) == 6
+        assert avisos
+
+        database.atualizar_status_assinatura(1, "REMOVIDA", "cargo removido")
+        assert len(agenda) == 3
+        prazo = agenda.proximo_prazo()
+        assert prazo.date() == (agora + timedelta(days=2)).date()
+    finally:
+        database.remover_ouvinte(agenda.atualizar)
+
+
+def test_simulacao_mes_com_50_mil_assinaturas():
+    """
+    Simula um mês com 50 mil assinaturas: o loop acorda só nos prazos,
+    cada evento sai exatamente no horário, renovações e cancelamentos no meio
+    do mês trocam os eventos, e o número de despertares fica bem abaixo do
+    loop fixo de 12 horas.
+    """
+    rng = random.Random(42)
+    inicio = datetime.datetime(2025, 1, 1, 0, 0)
+    meio = inicio + timedelta(days=10)
+    fim = inicio + timedelta(days=30)
+    quantidade = 50_000
+
+    expiracoes = {uid: inicio.date() + timedelta(days=rng.randint(0, 40)) for uid in range(quantidade)}
+    agenda = AgendaAssinaturas()
+    agenda.reconstruir(
+        (_registro(uid, datetime.datetime.combine(data, datetime.time())) for uid, data in expiracoes.items()),
+        agora=inicio,
+    )
+
+    disparados = defaultdict(list)
+    despertares = 0
+
+    def rodar_ate(limite):
+        nonlocal despertares
+        while True:
+            prazo = agenda.proximo_prazo()
+            if prazo is None or prazo > limite:
+                return
+            despertares += 1
+            for quando, tipo, user_id in agenda.retirar_vencidos(prazo):
+                assert quando == prazo
+                disparados[user_id].append((quando, tipo))
+
+    rodar_ate(meio)
+    renovados = set(rng.sample(range(quantidade), 5_000))
+    cancelados = set(rng.sample(sorted(set(range(quantidade)) - renovados), 2_000))
+    novas_datas = {}
+    for uid in renovados:
+        novas_datas[uid] = max(expiracoes[uid], meio.date()) + timedelta(days=30)
+        agenda.agendar(uid, novas_datas[uid], agora=meio)
+    for uid in cancelados:
+        agenda.cancelar(uid)
+    rodar_ate(fim)
+
+    def esperados(data, de, ate):
+        return [(q, t) for q, t in agenda.eventos_de(data) if de < q <= ate]
+
+    for uid, data in expiracoes.items():
+        if uid in renovados:
+            previstos = esperados(data, inicio, meio) + esperados(novas_datas[uid], meio, fim)
+        elif uid in cancelados:
+            previstos = esperados(data, inicio, meio)
+        else:
+            previstos = esperados(data, inicio, fim)
+        assert disparados.get(uid, []) == previstos, uid
+
+    # todos os eventos caem às 9h: no máximo um despertar por dia
+    assert despertares <= 31
+    assert despertares < 30 * 2  # loop fixo de 12 horas
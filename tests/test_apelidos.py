@@ -0,0 +1,81 @@
+# tests/test_apelidos.py
+import datetime
+import re
+from types import SimpleNamespace
+
+import pytest
+
+import apelidos
+import cogs.tasks as tasks_module
+from cogs.tasks import ChecagemAssinaturas
+
+
+def _extrair_antigo(nick):
+    """Regra que a checagem e a migração usavam (regex + strptime)"""
+    if not nick or " | " not in nick:
+        return None
+    data_str = nick.split("|")[1].strip()
+    if not re.match(r"\d{2}/\d{2}/\d{4}$", data_str):
+        return None
+    try:
+        return data_str, datetime.datetime.strptime(data_str, "%d/%m/%Y").date()
+    except ValueError:
+        return None
+
+
+@pytest.mark.parametrize("nick", [
+    None,
+    "",
+    "Fulano",
+    "Fulano | 05/03/2025",
+    "Fulano|05/03/2025",
+    "Fulano |  29/02/2024 ",
+    "Fulano | 29/02/2025",
+    "Fulano | 31/04/2025",
+    "Fulano | 00/01/2025",
+    "Fulano | 5/3/2025",
+    "Fulano | 05-03-2025",
+    "Fulano | 05/03/2025 extra",
+    "Fulano | VIP | 05/03/2025",
+    "Fulano | 05/03/2025 | VIP",
+    "Fulano | ab/cd/efgh",
+])
+def test_parser_proprio_igual_ao_antigo(nick):
+    assert apelidos.extrair_data(nick) == _extrair_antigo(nick)
+
+
+def test_trocar_data_mantem_o_nome():
+    data = datetime.datetime(2025, 4, 1)
+    assert apelidos.apelido_com_data("Fulano | 05/03/2025", data) == "Fulano | 01/04/2025"
+    assert apelidos.apelido_com_data("Fulano", data) == "Fulano | 01/04/2025"
+
+
+def test_indice_so_le_de_novo_quando_o_apelido_muda():
+    indice = apelidos.IndiceApelidos()
+    assert indice.data_de(1, "A | 05/03/2025") == ("05/03/2025", datetime.date(2025, 3, 5))
+    assert indice.data_de(1, "A | 05/03/2025") == ("05/03/2025", datetime.date(2025, 3, 5))
+    assert indice.data_de(2, "B") is None
+    assert indice.data_de(2, "B") is None
+    assert (indice.acertos, indice.falhas) == (2, 2)
+
+    # Apelido novo (evento ou edição do bot): a entrada antiga não vale mais
+    indice.atualizar(1, "A | 10/04/2025")
+    assert indice.data_de(1, "A | 10/04/2025") == ("10/04/2025", datetime.date(2025, 4, 10))
+    assert indice.data_de(1, "A | 05/03/2025") == ("05/03/2025", datetime.date(2025, 3, 5))
+    assert indice.estatisticas()["tamanho"] == 2
+
+
+@pytest.mark.asyncio
+async def test_on_member_update_atualiza_o_indice(monkeypatch):
+    monkeypatch.setattr(tasks_module, "SERVER_ID", 123, raising=False)
+    apelidos.indice.limpar()
+    guild = SimpleNamespace(id=123)
+    antes = SimpleNamespace(id=77, bot=False, guild=guild, nick="X | 01/01/2025", roles=[])
+    depois = SimpleNamespace(id=77, bot=False, guild=guild, nick="X | 01/02/2025", roles=[])
+
+    cog = ChecagemAssinaturas.__new__(ChecagemAssinaturas)
+    await cog.on_member_update(antes, depois)
+
+    falhas = apelidos.indice.falhas
+    assert apelidos.indice.data_do_membro(depois) == ("01/02/2025", datetime.date(2025, 2, 1))
+    assert apelidos.indice.falhas == falhas
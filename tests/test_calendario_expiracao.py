@@ -0,0 +1,91 @@
+# tests/test_calendario_expiracao.py
+import datetime
+import sqlite3
+from datetime import timedelta
+
+import database
+import migracoes
+
+
+def _coortes(dia, status="ATIVA"):
+    return sorted(database.obter_coorte(dia, status=status))
+
+
+def test_triggers_mantem_o_calendario_em_cada_escrita():
+    hoje = datetime.date(2025, 3, 10)
+    meio_dia = datetime.datetime.combine(hoje, datetime.time(12, 0))
+    database.adicionar_assinaturas_em_lote([
+        (user_id, f"User{user_id}", meio_dia + timedelta(days=user_id % 3), "Plano 30 dias")
+        for user_id in range(1, 10)
+    ])
+    assert _coortes(hoje) == [3, 6, 9]
+    assert _coortes(hoje + timedelta(days=1)) == [1, 4, 7]
+
+    # Renovação: sai do dia antigo e entra no novo
+    database.adicionar_assinatura(3, "User3", meio_dia + timedelta(days=30), "Renovado 30 dias")
+    assert _coortes(hoje) == [6, 9]
+    assert _coortes(hoje + timedelta(days=30)) == [3]
+
+    # Mudança de status: continua no dia, com o novo status
+    database.atualizar_status_assinatura(6, "EXPIRADA", "teste")
+    assert _coortes(hoje) == [9]
+    assert _coortes(hoje, status="EXPIRADA") == [6]
+    assert _coortes(hoje, status=None) == [6, 9]
+
+    with database.obter_gerenciador().escrita() as conn:
+        conn.execute("DELETE FROM assinaturas WHERE user_id = 9")
+    assert _coortes(hoje, status=None) == [6]
+
+    assert database.contar_coortes(hoje, hoje + timedelta(days=2)) == {
+        hoje + timedelta(days=1): 3, hoje + timedelta(days=2): 3,
+    }
+    assert database.verificar_calendario() == {"faltando": 0, "sobrando": 0, "total": 8}
+
+
+def test_verificacao_detecta_divergencia_e_reconstrucao_corrige():
+    hoje = datetime.date(2025, 3, 10)
+    database.adicionar_assinaturas_em_lote([
+        (user_id, f"User{user_id}", datetime.datetime.combine(hoje, datetime.time(8, 0)), "Plano 30 dias")
+        for user_id in range(1, 6)
+    ])
+    with database.obter_gerenciador().escrita() as conn:
+        conn.execute("DELETE FROM calendario_expiracao WHERE user_id IN (1, 2)")
+        conn.execute("UPDATE calendario_expiracao SET status = 'EXPIRADA' WHERE user_id = 3")
+        conn.execute("INSERT INTO calendario_expiracao VALUES (1, 999, 'ATIVA')")
+
+    assert database.verificar_calendario() == {"faltando": 3, "sobrando": 2, "total": 4}
+    assert database.reconstruir_calendario() == 5
+    assert database.verificar_calendario() == {"faltando": 0, "sobrando": 0, "total": 5}
+    assert _coortes(hoje) == [1, 2, 3, 4, 5]
+
+
+def test_virada_do_dia_usa_as_coortes():
+    hoje = datetime.date(2025, 3, 10)
+    meio_dia = datetime.datetime.combine(hoje, datetime.time(12, 0))
+    database.adicionar_assinaturas_em_lote([
+        (1, "A", meio_dia + timedelta(days=3), "Plano 30 dias"),
+        (2, "B", meio_dia, "Plano 30 dias"),
+        (3, "C", meio_dia - timedelta(days=1), "Plano 30 dias"),
+        (4, "D", meio_dia + timedelta(days=2), "Plano 30 dias"),
+        (5, "E", meio_dia - timedelta(days=2), "Plano 30 dias"),
+    ])
+    database.atualizar_status_assinatura(2, "EXPIRADA", "teste")
+    assert database.marcar_pendentes_virada(hoje) == 2
+    assert sorted(user_id for user_id, _ in database.obter_pendentes()) == [1, 3]
+
+
+def test_migracao_preenche_calendario_de_banco_existente(tmp_path):
+    caminho = tmp_path / "antigo.db"
+    conn = sqlite3.connect(caminho)
+    conn.execute("CREATE TABLE assinaturas(user_id INTEGER PRIMARY KEY, data_expiracao TEXT, plano TEXT)")
+    conn.executemany(
+        "INSERT INTO assinaturas VALUES (?, ?, ?)",
+        [(1, "2025-12-31 00:00:00", "Plano 30 dias"), (2, "2025-12-31 23:59:59", "Plano 90 dias")],
+    )
+    conn.commit()
+    migracoes.aplicar_migracoes(conn, backup=False)
+
+    dia = database.dia_calendario(datetime.date(2025, 12, 31))
+    linhas = conn.execute("SELECT dia, user_id, status FROM calendario_expiracao ORDER BY user_id").fetchall()
+    assert linhas == [(dia, 1, "ATIVA"), (dia, 2, "ATIVA")]
+    conn.close()
@@ -2,8 +2,12 @@
 import datetime
 from datetime import timedelta
 
+from types import SimpleNamespace
+
 import pytest
 
+import database
+
 import cogs.tasks as tasks_module  # ajuste o caminho se sua ChecagemAssinaturas estiver em outro arquivo
 from cogs.tasks import ChecagemAssinaturas
 
@@ -39,6 +43,11 @@ class DummyMember:
         self.kicked = True
 
 
+class DummyHumano(DummyMember):
+    """Membro comum (não-bot), com os atributos que a checagem atual consulta."""
+    bot = False
+
+
 class DummyRole:
     def __init__(self, name):
         self.name = name
@@ -75,10 +84,25 @@ class DummyBot:
         return self._guild
 
 
+@pytest.fixture
+def criar_cog():
+    """Cria a cog e a descarrega no fim do teste (loops e ouvinte do banco)."""
+    cogs = []
+
+    def criar(bot):
+        cog = ChecagemAssinaturas(bot)
+        cogs.append(cog)
+        return cog
+
+    yield criar
+    for cog in cogs:
+        cog.cog_unload()
+
+
 # ---------- Testes ----------
 
 @pytest.mark.asyncio
-async def test_checagem_envia_aviso_5_dias(monkeypatch):
+async def test_checagem_envia_aviso_5_dias(monkeypatch, criar_cog):
     """
     Usuário com nick 'User5 | <data em 5 dias>' deve receber DM de aviso
     e registrar aviso de 5 dias.
@@ -96,9 +120,9 @@ async def test_checagem_envia_aviso_5_dias(monkeypatch):
     # monkeypatch SERVER_ID para qualquer valor
     monkeypatch.setattr(tasks_module, "SERVER_ID", 123, raising=False)
 
-    # obter_assinatura -> sem ultimo_aviso (primeiro aviso)
-    def fake_obter_assinatura(user_id):
-        return {
+    # obter_registros_por_ids -> sem ultimo_aviso (primeiro aviso)
+    async def fake_obter_registros_por_ids(user_ids):
+        return {user_id: database.Assinatura.do_dict({
             "user_id": user_id,
             "username": "User5",
             "data_expiracao": "",  # não usado aqui
@@ -106,21 +130,21 @@ async def test_checagem_envia_aviso_5_dias(monkeypatch):
             "data_ativacao": "",
             "status": "ATIVA",
             "ultimo_aviso": None,
-        }
+        }) for user_id in user_ids}
 
     avisos_registrados = []
 
-    def fake_registrar_aviso(user_id, tipo_aviso):
+    async def fake_registrar_aviso(user_id, tipo_aviso):
         avisos_registrados.append((user_id, tipo_aviso))
         return True
 
-    monkeypatch.setattr(tasks_module, "obter_assinatura", fake_obter_assinatura)
+    monkeypatch.setattr(tasks_module, "obter_registros_por_ids", fake_obter_registros_por_ids)
     monkeypatch.setattr(tasks_module, "registrar_aviso", fake_registrar_aviso)
 
-    cog = ChecagemAssinaturas(bot)
+    cog = criar_cog(bot)
 
     # em teste, chamamos só a versão "uma vez"
-    await cog._rodar_checar_assinaturas_uma_vez()
+    await cog._rodar_checar_assinaturas_uma_vez(modo="apelido")
 
     # Deve ter mandado 1 DM
     assert len(member._dm.sent_messages) == 1
@@ -133,7 +157,7 @@ async def test_checagem_envia_aviso_5_dias(monkeypatch):
 
 
 @pytest.mark.asyncio
-async def test_checagem_remove_usuario_expirado_1_dia(monkeypatch):
+async def test_checagem_remove_usuario_expirado_1_dia(monkeypatch, criar_cog):
     """
     Usuário com nick 'User | <data de ontem>' deve:
     - receber DM de expiração
@@ -156,8 +180,8 @@ async def test_checagem_remove_usuario_expirado_1_dia(monkeypatch):
     monkeypatch.setattr(tasks_module, "SERVER_ID", 123, raising=False)
     monkeypatch.setattr(tasks_module, "NOTIFICACAO_CHANNEL_ID", 999, raising=False)
 
-    def fake_obter_assinatura(user_id):
-        return {
+    async def fake_obter_registros_por_ids(user_ids):
+        return {user_id: database.Assinatura.do_dict({
             "user_id": user_id,
             "username": "UserExp",
             "data_expiracao": "",
@@ -165,19 +189,19 @@ async def test_checagem_remove_usuario_expirado_1_dia(monkeypatch):
             "data_ativacao": "",
             "status": "ATIVA",
             "ultimo_aviso": None,
-        }
+        }) for user_id in user_ids}
 
     status_atualizados = []
 
-    def fake_atualizar_status(user_id, status, motivo=""):
+    async def fake_atualizar_status(user_id, status, motivo=""):
         status_atualizados.append((user_id, status, motivo))
         return True
 
-    monkeypatch.setattr(tasks_module, "obter_assinatura", fake_obter_assinatura)
+    monkeypatch.setattr(tasks_module, "obter_registros_por_ids", fake_obter_registros_por_ids)
     monkeypatch.setattr(tasks_module, "atualizar_status_assinatura", fake_atualizar_status)
 
-    cog = ChecagemAssinaturas(bot)
-    await cog._rodar_checar_assinaturas_uma_vez()
+    cog = criar_cog(bot)
+    await cog._rodar_checar_assinaturas_uma_vez(modo="apelido")
 
     # Deve ter tentado enviar DM de expiração
     assert len(member._dm.sent_messages) == 1
@@ -201,3 +225,309 @@ async def test_checagem_remove_usuario_expirado_1_dia(monkeypatch):
     texto = canal_notificacao.sent_messages[0]["content"]
     assert "RELATÓRIO DE EXPIRAÇÃO" in texto
     assert "UserExp" in texto
+
+
+@pytest.mark.asyncio
+async def test_checagem_busca_assinaturas_em_lote(monkeypatch, criar_cog):
+    """
+    A checagem deve buscar as assinaturas de todos os membros numa única
+    chamada em lote, sem consultar o banco membro a membro.
+    """
+    hoje = datetime.date.today()
+    data_3 = (hoje + timedelta(days=3)).strftime("%d/%m/%Y")
+    data_20 = (hoje + timedelta(days=20)).strftime("%d/%m/%Y")
+
+    member_3 = DummyHumano(user_id=1, name="User3", nick=f"User3 | {data_3}")
+    member_20 = DummyHumano(user_id=2, name="User20", nick=f"User20 | {data_20}")
+    sem_data = DummyHumano(user_id=3, name="SemData", nick="SemData")
+    role_assinante = DummyRole(name=tasks_module.CARGO_ASSINANTE_NOME)
+    guild = DummyGuild(members=[member_3, member_20, sem_data], roles=[role_assinante])
+
+    monkeypatch.setattr(tasks_module, "SERVER_ID", 123, raising=False)
+
+    chamadas_lote = []
+
+    async def fake_obter_registros_por_ids(user_ids):
+        chamadas_lote.append(list(user_ids))
+        return {
+            1: database.Assinatura.do_dict({"user_id": 1, "ultimo_aviso": None}),
+            2: database.Assinatura.do_dict({"user_id": 2, "ultimo_aviso": None}),
+        }
+
+    avisos_registrados = []
+
+    async def fake_registrar_aviso(user_id, tipo_aviso, efeitos=None):
+        avisos_registrados.append((user_id, tipo_aviso))
+        # A DM do aviso vai para o outbox junto com o registro
+        return database.enfileirar_efeitos(efeitos or [])
+
+    monkeypatch.setattr(tasks_module, "obter_registros_por_ids", fake_obter_registros_por_ids)
+    monkeypatch.setattr(tasks_module, "registrar_aviso", fake_registrar_aviso)
+
+    cog = criar_cog(DummyBot(guild))
+    await cog._rodar_checar_assinaturas_uma_vez(modo="apelido")
+
+    assert chamadas_lote == [[1, 2]]
+    assert avisos_registrados == [(1, "AVISO_3_DIAS")]
+    assert len(member_3._dm.sent_messages) == 1
+    assert member_20._dm.sent_messages == []
+
+
+
+class DummyGuildIndexada(DummyGuild):
+    """Guild com get_member (cache por id), como o discord.Guild real."""
+    owner = None
+
+    def __init__(self, members, roles, notification_channel=None):
+        super().__init__(members, roles, notification_channel)
+        self._por_id = {m.id: m for m in members}
+        self.consultados = []
+
+    def get_member(self, user_id):
+        self.consultados.append(user_id)
+        return self._por_id.get(user_id)
+
+
+@pytest.mark.asyncio
+async def test_checagem_modo_banco_consulta_so_janelas_de_acao(monkeypatch, criar_cog):
+    """
+    No modo "banco" a checagem lê do banco só as assinaturas que vencem em 3 dias,
+    hoje ou já venceram, e resolve apenas esses membros com get_member;
+    o apelido dos demais membros não é lido.
+    """
+    agora = datetime.datetime.now()
+    hoje = datetime.datetime.combine(agora.date(), datetime.time(12, 0))
+    database.adicionar_assinaturas_em_lote([
+        (1, "Em3", hoje + timedelta(days=3), "Plano 30 dias"),
+        (2, "Em2", hoje + timedelta(days=2), "Plano 30 dias"),
+        (3, "Hoje", hoje, "Plano 30 dias"),
+        (4, "Vencida", hoje - timedelta(days=1), "Plano 30 dias"),
+        (5, "Em10", hoje + timedelta(days=10), "Plano 30 dias"),
+        (6, "Saiu", hoje - timedelta(days=2), "Plano 30 dias"),
+    ])
+
+    membros = {i: DummyHumano(user_id=i, name=f"User{i}", nick=None) for i in range(1, 6)}
+    # muitos membros sem assinatura: não devem ser consultados
+    outros = [DummyHumano(user_id=1000 + i, name=f"Outro{i}", nick="Sem data") for i in range(500)]
+    role_assinante = DummyRole(name=tasks_module.CARGO_ASSINANTE_NOME)
+    guild = DummyGuildIndexada(members=list(membros.values()) + outros, roles=[role_assinante])
+
+    monkeypatch.setattr(tasks_module, "SERVER_ID", 123, raising=False)
+
+    cog = criar_cog(DummyBot(guild))
+    await cog._rodar_checar_assinaturas_uma_vez(modo="banco")
+
+    assert guild.consultados == [6, 4, 3, 1]
+    assert "3 dias" in membros[1]._dm.sent_messages[0]["content"]
+    assert "VENCE HOJE" in membros[3]._dm.sent_messages[0]["content"]
+    assert membros[4].kicked is True
+    assert membros[2]._dm.sent_messages == []
+    assert membros[5]._dm.sent_messages == []
+
+    assert database.obter_assinatura(4)["status"] == "EXPIRADA"
+    assert database.obter_assinatura(1)["ultimo_aviso"] is not None
+    # guild sem o cache completo de membros: quem não foi encontrado não é encerrado
+    assert database.obter_assinatura(6)["status"] == "ATIVA"
+
+
+class DummyMembroServidor(DummyHumano):
+    """Membro com guild e cargos, para os listeners de eventos."""
+    guild = SimpleNamespace(id=123)
+    roles = ()
+
+
+@pytest.mark.asyncio
+async def test_checagem_incremental_so_pendentes_e_virada_do_dia(monkeypatch, criar_cog):
+    """
+    A rodada incremental reavalia só os membros marcados (aqui por on_member_update)
+    e as assinaturas que cruzaram uma janela na virada do dia; as marcações
+    processadas são apagadas.
+    """
+    agora = datetime.datetime.now()
+    hoje = datetime.datetime.combine(agora.date(), datetime.time(12, 0))
+    database.adicionar_assinaturas_em_lote([
+        (1, "Em3", hoje + timedelta(days=3), "Plano 30 dias"),
+        (2, "Em10", hoje + timedelta(days=10), "Plano 30 dias"),
+        (3, "Em2", hoje + timedelta(days=2), "Plano 30 dias"),
+        (4, "Ontem", hoje - timedelta(days=1), "Plano 30 dias"),
+    ])
+
+    membros = {i: DummyMembroServidor(user_id=i, name=f"User{i}", nick=None) for i in range(1, 5)}
+    role_assinante = DummyRole(name=tasks_module.CARGO_ASSINANTE_NOME)
+    guild = DummyGuildIndexada(members=list(membros.values()), roles=[role_assinante])
+
+    monkeypatch.setattr(tasks_module, "SERVER_ID", 123, raising=False)
+    monkeypatch.setattr(tasks_module, "HORA_EVENTOS", datetime.time(0, 0))
+
+    cog = criar_cog(DummyBot(guild))
+    cog._ultima_virada = agora.date() - timedelta(days=1)
+
+    antes = SimpleNamespace(nick="User2", roles=())
+    await cog.on_member_update(antes, membros[2])
+    assert database.contar_pendentes() == 1
+
+    await cog._rodar_incremental()
+
+    assert sorted(guild.consultados) == [1, 2, 4]
+    assert "3 dias" in membros[1]._dm.sent_messages[0]["content"]
+    assert membros[4].kicked is True
+    assert membros[2]._dm.sent_messages == []
+    assert database.contar_pendentes() == 0
+    assert cog._ultima_virada == agora.date()
+
+    # Virada já feita hoje e nada pendente: a próxima rodada não consulta ninguém
+    guild.consultados.clear()
+    await cog._rodar_incremental()
+    assert guild.consultados == []
+
+
+@pytest.mark.asyncio
+async def test_checagem_grava_relatorio_de_tempos(monkeypatch, criar_cog):
+    """A rodada grava o relatório com as fases, as ações e a contagem por ramo."""
+    import metricas_checagem
+
+    agora = datetime.datetime.now()
+    hoje = datetime.datetime.combine(agora.date(), datetime.time(12, 0))
+    prazos = {1 << 22: 3, 2 << 22: 0, 3 << 22: -1}
+    database.adicionar_assinaturas_em_lote([
+        (user_id, f"User{user_id}", hoje + timedelta(days=dias), "Plano 30 dias")
+        for user_id, dias in prazos.items()
+    ])
+    membros = [DummyHumano(user_id=user_id, name=f"User{user_id}", nick=None) for user_id in prazos]
+    guild = DummyGuildIndexada(
+        members=membros,
+        roles=[DummyRole(name=tasks_module.CARGO_ASSINANTE_NOME)],
+        notification_channel=DummyChannel(),
+    )
+
+    monkeypatch.setattr(tasks_module, "SERVER_ID", 123, raising=False)
+    monkeypatch.setattr(tasks_module, "METRICAS_CHECAGEM", True)
+
+    cog = criar_cog(DummyBot(guild))
+    await cog._rodar_checar_assinaturas_uma_vez(modo="banco")
+
+    _, relatorio = metricas_checagem.obter_relatorio()
+    assert relatorio["ramos"] == {"aviso_3_dias": 1, "aviso_hoje": 1, "vencida": 1}
+    assert {"retomada", "alvos", "plano", "despacho", "historico", "resumo"} <= set(relatorio["fases"])
+    assert relatorio["acoes"]["membro"]["n"] == 3
+    assert relatorio["acoes"]["discord:kick"]["n"] == 1
+    assert relatorio["acoes"]["discord:dm_criar"]["n"] == 3
+    assert relatorio["acoes"]["discord:canal"]["n"] == 1
+    assert relatorio["acoes"]["sqlite"]["n"] >= 6
+    assert relatorio["resumo"]["removidos"] == 1
+
+    # Rodada incremental sem nenhum membro processado: nenhum relatório novo
+    antes = metricas_checagem.obter_relatorio()[0]
+    await cog._rodar_checar_assinaturas_uma_vez(modo="banco", user_ids=[999])
+    assert metricas_checagem.obter_relatorio()[0] == antes
+
+    # Desligadas: nenhum relatório novo
+    monkeypatch.setattr(tasks_module, "METRICAS_CHECAGEM", False)
+    antes = metricas_checagem.obter_relatorio()[0]
+    await cog._rodar_checar_assinaturas_uma_vez(modo="banco")
+    assert metricas_checagem.obter_relatorio()[0] == antes
+
+
+@pytest.mark.asyncio
+async def test_checagem_nao_conta_como_feito_o_efeito_reservado_pela_drenagem(monkeypatch, criar_cog):
+    """
+    Se o loop de fundo reserva os efeitos antes da checagem, eles ficam pendentes
+    no resumo: nem removido, nem DM dada como enviada.
+    """
+    import outbox
+
+    agora = datetime.datetime.now()
+    hoje = datetime.datetime.combine(agora.date(), datetime.time(12, 0))
+    database.adicionar_assinaturas_em_lote([
+        (1, "Aviso", hoje + timedelta(days=3), "Plano 30 dias"),
+        (2, "Vencida", hoje - timedelta(days=1), "Plano 30 dias"),
+    ])
+    membros = {i: DummyHumano(user_id=i, name=f"User{i}", nick=None) for i in (1, 2)}
+    canal = DummyChannel()
+    guild = DummyGuildIndexada(
+        members=list(membros.values()),
+        roles=[DummyRole(name=tasks_module.CARGO_ASSINANTE_NOME)],
+        notification_channel=canal,
+    )
+    monkeypatch.setattr(tasks_module, "SERVER_ID", 123, raising=False)
+
+    cog = criar_cog(DummyBot(guild))
+    reservar = outbox.reservar_efeitos
+
+    def drenagem_chega_antes(dono, chaves=None, **kwargs):
+        if chaves is not None:
+            reservar(cog._drenagem.dono)
+        return reservar(dono, chaves=chaves, **kwargs)
+
+    monkeypatch.setattr(outbox, "reservar_efeitos", drenagem_chega_antes)
+    await cog._rodar_checar_assinaturas_uma_vez(modo="banco")
+
+    assert membros[1]._dm.sent_messages == []
+    assert membros[2].kicked is False
+    assert database.obter_assinatura(2)["status"] == "EXPIRADA"
+    texto = canal.sent_messages[0]["content"]
+    assert "expiração (1 dia após vencer): **0**" in texto
+    assert "com efeitos na fila do outbox: **2**" in texto
+    # Os efeitos continuam com o loop de fundo, que termina o trabalho
+    with database.obter_gerenciador().leitura() as conn:
+        donos = {linha[0] for linha in conn.execute("SELECT dono FROM outbox")}
+    assert donos == {cog._drenagem.dono}
+
+
+@pytest.mark.asyncio
+async def test_checagens_simultaneas_nao_repetem_acoes(monkeypatch, criar_cog):
+    """
+    Duas checagens disparadas ao mesmo tempo rodam uma depois da outra:
+    a segunda não retoma a rodada viva da primeira e cada membro é tratado uma vez.
+    """
+    import asyncio
+
+    agora = datetime.datetime.now()
+    hoje = datetime.datetime.combine(agora.date(), datetime.time(12, 0))
+    database.adicionar_assinaturas_em_lote([
+        (1, "Aviso", hoje + timedelta(days=3), "Plano 30 dias"),
+        (2, "Vencida", hoje - timedelta(days=1), "Plano 30 dias"),
+    ])
+    membros = {i: DummyHumano(user_id=i, name=f"User{i}", nick=None) for i in (1, 2)}
+    guild = DummyGuildIndexada(
+        members=list(membros.values()),
+        roles=[DummyRole(name=tasks_module.CARGO_ASSINANTE_NOME)],
+    )
+    monkeypatch.setattr(tasks_module, "SERVER_ID", 123, raising=False)
+
+    cog = criar_cog(DummyBot(guild))
+    rodada = cog._rodada_checagem
+    em_curso = []
+    sobrepostas = []
+
+    async def rodada_vigiada(*args, **kwargs):
+        sobrepostas.append(len(em_curso))
+        em_curso.append(True)
+        try:
+            return await rodada(*args, **kwargs)
+        finally:
+            em_curso.pop()
+
+    monkeypatch.setattr(cog, "_rodada_checagem", rodada_vigiada)
+    await asyncio.gather(
+        cog._rodar_checar_assinaturas_uma_vez(modo="banco"),
+        cog._rodar_checar_assinaturas_uma_vez(modo="banco"),
+    )
+
+    assert sobrepostas == [0, 0]
+    assert len(membros[1]._dm.sent_messages) == 1
+    assert len(membros[2]._dm.sent_messages) == 1
+    assert len(membros[2].roles_removed) == 1
+    with database.obter_gerenciador().leitura() as conn:
+        status = [linha[0] for linha in conn.execute("SELECT status FROM execucoes_checagem ORDER BY id")]
+    assert status == ["CONCLUIDA", "CONCLUIDA"]
+
+
+@pytest.mark.asyncio
+async def test_descarregar_a_cog_remove_o_ouvinte_do_banco():
+    """Cada cog registra um ouvinte das escritas no banco e o remove ao ser descarregada."""
+    antes = list(database._ouvintes)
+    cog = ChecagemAssinaturas(DummyBot(None))
+    assert len(database._ouvintes) == len(antes) + 1
+    cog.cog_unload()
+    assert database._ouvintes == antes
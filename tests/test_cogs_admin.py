@@ -1,4 +1,7 @@
 # tests/test_cogs_admin.py
+import datetime
+from datetime import timedelta
+
 import pytest
 from types import SimpleNamespace
 
@@ -57,6 +60,8 @@ async def test_assinaturas_resumo_basico(bot, monkeypatch, tmp_path):
     }
 
     monkeypatch.setattr(database, "obter_resumo_assinaturas", lambda: resumo_fake)
+    # o relatório TXT é gravado no diretório atual
+    monkeypatch.chdir(tmp_path)
 
     ctx = DummyCtx()
     cog = AdminCog(bot)
@@ -75,3 +80,61 @@ async def test_assinaturas_resumo_basico(bot, monkeypatch, tmp_path):
     # Deve ter um campo com ESTATÍSTICAS GERAIS
     names = [f.name for f in embed.fields]
     assert any("ESTATÍSTICAS GERAIS" in n for n in names)
+
+
+@pytest.mark.asyncio
+async def test_planejar_checagem_publica_plano_com_arquivo(bot):
+    """
+    !planejar_checagem não executa nada: publica o resumo no canal de notificações
+    e, com muitas ações, anexa a lista completa como arquivo.
+    """
+    ontem = datetime.datetime.now() - timedelta(days=1)
+    database.adicionar_assinaturas_em_lote(
+        [(i, f"User{i}", ontem, "Plano 30 dias") for i in range(1, 21)]
+    )
+
+    canal = DummyCtx()
+    canal.mention = "#notificacoes"
+    membros = {i: SimpleNamespace(id=i, bot=False) for i in range(1, 21)}
+    ctx = DummyCtx()
+    ctx.channel = None
+    ctx.guild = SimpleNamespace(get_member=membros.get, get_channel=lambda _id: canal)
+
+    cog = AdminCog(bot)
+    await cog.planejar_checagem.callback(cog, ctx)
+
+    assert len(canal.sent_messages) == 1
+    enviado = canal.sent_messages[0]
+    assert "Remoções (DM + cargo + kick): **20**" in enviado["args"][0]
+    assert isinstance(enviado["kwargs"]["file"], discord.File)
+    assert database.obter_assinatura(1)["status"] == "ATIVA"
+    assert "Plano publicado" in ctx.sent_messages[0]["args"][0]
+
+
+@pytest.mark.asyncio
+async def test_historico_mostra_eventos_do_membro(bot):
+    """
+    !historico lista os eventos do membro, inclusive os que ainda estavam
+    no buffer, e manda a lista completa como arquivo quando é longa.
+    """
+    database.adicionar_assinatura(7, "User7", datetime.datetime.now() + timedelta(days=30), "Plano 30 dias")
+    database.registrar_aviso(7, "AVISO_3_DIAS")
+    usuario = SimpleNamespace(id=7, mention="<@7>")
+
+    ctx = DummyCtx()
+    cog = AdminCog(bot)
+    await cog.historico.callback(cog, ctx, usuario)
+
+    texto = ctx.sent_messages[0]["args"][0]
+    assert "<@7>" in texto
+    assert "AVISO" in texto
+
+    for _ in range(30):
+        database.registrar_aviso(7, "AVISO_HOJE")
+    ctx = DummyCtx()
+    await cog.historico.callback(cog, ctx, usuario)
+    assert isinstance(ctx.sent_messages[0]["kwargs"]["file"], discord.File)
+
+    ctx = DummyCtx()
+    await cog.historico.callback(cog, ctx, SimpleNamespace(id=999, mention="<@999>"))
+    assert "Nenhum registro" in ctx.sent_messages[0]["args"][0]
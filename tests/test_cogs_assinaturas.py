@@ -43,7 +43,10 @@ async def test_minha_assinatura_sem_registro(bot, monkeypatch):
     o comando deve avisar isso claramente.
     """
     # monkeypatch: nenhuma assinatura encontrada
-    monkeypatch.setattr(assinaturas_module, "obter_assinatura", lambda _id: None)
+    async def fake_obter_assinatura(_id):
+        return None
+
+    monkeypatch.setattr(assinaturas_module, "obter_registro_assinatura", fake_obter_assinatura)
 
     cog = assinaturas_module.AssinaturasCog(bot)
     ctx = DummyCtx()
@@ -78,7 +81,10 @@ async def test_minha_assinatura_com_registro(bot, monkeypatch):
         "ultimo_aviso": None,
     }
 
-    monkeypatch.setattr(assinaturas_module, "obter_assinatura", lambda _id: assinatura_fake)
+    async def fake_obter_assinatura(_id):
+        return database.Assinatura.do_dict(assinatura_fake)
+
+    monkeypatch.setattr(assinaturas_module, "obter_registro_assinatura", fake_obter_assinatura)
 
     cog = assinaturas_module.AssinaturasCog(bot)
     command = cog.minha_assinatura
@@ -1,7 +1,10 @@
 # tests/test_database.py
 import datetime
+import time
 from datetime import timedelta
 
+import pytest
+
 import database
 
 
@@ -114,3 +117,484 @@ def test_obter_resumo_assinaturas_pendentes_ate_5_dias():
     assert "User10" not in pendentes_nomes
     assert "User5" in pendentes_nomes
     assert "User1" in pendentes_nomes
+
+
+def test_obter_resumo_limita_linhas_mas_conta_tudo():
+    """
+    As listas do resumo trazem só as primeiras linhas pedidas, mas os totais
+    continuam contando todas as assinaturas; o relatório completo vem de
+    iterar_assinaturas em lotes.
+    """
+    agora = datetime.datetime.now()
+    database.adicionar_assinaturas_em_lote(
+        [(i, f"User{i}", agora + timedelta(days=i), "Plano 30 dias") for i in range(1, 26)]
+    )
+    for i in (1, 2, 3):
+        database.atualizar_status_assinatura(i, "EXPIRADA", "teste")
+
+    resumo = database.obter_resumo_assinaturas(limite_ativas=10, limite_pendentes=2, limite_expiradas=0)
+
+    assert resumo["total_ativas"] == 22
+    assert resumo["total_expiradas"] == 3
+    # 4 e 5 dias à frente ainda são pendentes; 1-3 já estão expiradas
+    assert resumo["total_pendentes"] == 2
+    assert [row[0] for row in resumo["ativas"]] == list(range(4, 14))
+    assert [row[0] for row in resumo["pendentes"]] == [4, 5]
+    assert resumo["expiradas"] == []
+
+    ativas = list(database.iterar_assinaturas(status="ATIVA", tamanho_lote=7))
+    assert [row[0] for row in ativas] == list(range(4, 26))
+    assert len(list(database.iterar_assinaturas())) == 25
+
+
+def test_iterar_todas_assinaturas_com_filtros_no_sql():
+    """
+    O iterador aplica status, janela de expiração, plano e ordenação na consulta
+    e devolve os mesmos dicionários de obter_todas_assinaturas.
+    """
+    agora = datetime.datetime.now()
+    database.adicionar_assinaturas_em_lote(
+        [(i, f"User{i}", agora + timedelta(days=i), "Plano 90 dias" if i % 2 else "Plano 30 dias")
+         for i in range(1, 21)]
+    )
+    database.atualizar_status_assinatura(3, "EXPIRADA", "teste")
+
+    todas = list(database.iterar_todas_assinaturas(tamanho_lote=4))
+    assert todas == database.obter_todas_assinaturas()
+
+    filtradas = database.iterar_todas_assinaturas(
+        status="ATIVA",
+        expira_de=agora + timedelta(days=2),
+        expira_ate=agora + timedelta(days=10),
+        plano="Plano 90 dias",
+        decrescente=True,
+        tamanho_lote=2,
+    )
+    assert [a["user_id"] for a in filtradas] == [9, 7, 5]
+
+    with pytest.raises(ValueError):
+        list(database.iterar_assinaturas(ordem="username"))
+
+
+def test_gerenciador_configura_wal_e_reaproveita_conexoes():
+    """
+    O gerenciador deve abrir as conexões com WAL/synchronous=NORMAL
+    e devolver sempre a mesma conexão de escrita.
+    """
+    gerenciador = database.obter_gerenciador()
+
+    with gerenciador.escrita() as conn1:
+        modo = conn1.execute("PRAGMA journal_mode").fetchone()[0]
+        sync = conn1.execute("PRAGMA synchronous").fetchone()[0]
+    with gerenciador.escrita() as conn2:
+        pass
+
+    assert modo.lower() == "wal"
+    assert sync == 1  # NORMAL
+    assert conn1 is conn2
+
+
+def test_pool_de_leitura_respeita_limite():
+    """
+    Chamadas repetidas de leitura não devem abrir mais conexões
+    que o tamanho do pool.
+    """
+    gerenciador = database.obter_gerenciador()
+    for user_id in range(50):
+        database.obter_assinatura(user_id)
+
+    leitores = len(gerenciador._todas) - (gerenciador._conn_escrita is not None)
+    assert 1 <= leitores <= gerenciador.tamanho_pool
+
+
+def test_escrita_faz_rollback_em_erro():
+    """
+    Se algo falhar dentro do bloco de escrita, nada deve ser gravado.
+    """
+    gerenciador = database.obter_gerenciador()
+    try:
+        with gerenciador.escrita() as conn:
+            conn.execute(
+                "INSERT INTO historico (user_id, acao, detalhes) VALUES (?, ?, ?)",
+                (1, "TESTE", "deve sumir"),
+            )
+            raise RuntimeError("falha simulada")
+    except RuntimeError:
+        pass
+
+    with gerenciador.leitura() as conn:
+        total = conn.execute("SELECT COUNT(*) FROM historico WHERE acao = 'TESTE'").fetchone()[0]
+    assert total == 0
+
+
+def test_obter_assinaturas_por_ids_em_lotes(monkeypatch):
+    """
+    Busca em lote deve devolver um dict por user_id, ignorar ids inexistentes
+    e funcionar mesmo quando a lista passa do tamanho de um lote.
+    """
+    monkeypatch.setattr(database, "TAMANHO_LOTE_IN", 3)
+    data_exp = datetime.datetime.now() + timedelta(days=30)
+    for user_id in range(1, 8):
+        database.adicionar_assinatura(user_id, f"User{user_id}", data_exp, "Plano 30 dias")
+
+    resultado = database.obter_assinaturas_por_ids([1, 2, 3, 4, 5, 6, 7, 999, 2])
+
+    assert set(resultado) == {1, 2, 3, 4, 5, 6, 7}
+    assert resultado[5]["username"] == "User5"
+    assert resultado[5] == database.obter_assinatura(5)
+    assert database.obter_assinaturas_por_ids([]) == {}
+
+
+def test_adicionar_assinatura_renova_e_zera_ultimo_aviso():
+    """
+    Chamar adicionar_assinatura de novo para o mesmo usuário deve
+    atualizar os dados (upsert) e limpar o ultimo_aviso.
+    """
+    data_exp = datetime.datetime.now() + timedelta(days=3)
+    database.adicionar_assinatura(55, "Antigo", data_exp, "Plano 30 dias")
+    database.registrar_aviso(55, "AVISO_3_DIAS")
+    database.atualizar_status_assinatura(55, "EXPIRADA", "teste")
+
+    nova_data = datetime.datetime.now() + timedelta(days=90)
+    assert database.adicionar_assinatura(55, "Novo", nova_data, "Plano 90 dias") is True
+
+    assinatura = database.obter_assinatura(55)
+    assert assinatura["username"] == "Novo"
+    assert assinatura["plano"] == "Plano 90 dias"
+    assert assinatura["status"] == "ATIVA"
+    assert assinatura["ultimo_aviso"] is None
+    assert assinatura["data_expiracao"] == nova_data.strftime(database.DB_DATETIME_FORMAT)
+
+
+def test_adicionar_assinaturas_em_lote():
+    """
+    O lote grava registros novos e atualiza os existentes numa só transação.
+    """
+    data_exp = datetime.datetime.now() + timedelta(days=10)
+    database.adicionar_assinatura(1, "Existente", data_exp, "Plano 30 dias")
+
+    registros = [(user_id, f"Lote{user_id}", data_exp, "Importado (nickname)") for user_id in range(1, 101)]
+    gravados = database.adicionar_assinaturas_em_lote(registros)
+
+    assert gravados == 100
+    assert len(database.obter_todas_assinaturas()) == 100
+    assert database.obter_assinatura(1)["username"] == "Lote1"
+    assert database.adicionar_assinaturas_em_lote([]) == 0
+
+
+def test_consultas_usam_indices(monkeypatch):
+    """
+    Captura todo SQL executado pelas funções do database.py e confere,
+    via EXPLAIN QUERY PLAN, que nenhuma consulta faz varredura completa da tabela.
+    """
+    executados = []
+    connect_atual = database.sqlite3.connect
+
+    def connect_com_trace(*args, **kwargs):
+        conn = connect_atual(*args, **kwargs)
+        conn.set_trace_callback(executados.append)
+        return conn
+
+    database.fechar_conexoes()
+    monkeypatch.setattr(database.sqlite3, "connect", connect_com_trace)
+
+    data_exp = datetime.datetime.now() + timedelta(days=2)
+    database.adicionar_assinatura(1, "User1", data_exp, "Plano 30 dias")
+    database.adicionar_assinaturas_em_lote([(2, "User2", data_exp, "Plano 30 dias")])
+    database.registrar_aviso(1, "AVISO_3_DIAS")
+    database.atualizar_status_assinatura(2, "EXPIRADA", "teste")
+    database.obter_assinatura(1)
+    database.obter_assinaturas_por_ids([1, 2])
+    database.obter_todas_assinaturas()
+    database.obter_resumo_assinaturas()
+    list(database.iterar_assinaturas(status="ATIVA"))
+    database.obter_assinaturas_acionaveis()
+
+    consultas = {
+        sql.strip() for sql in executados
+        if sql.strip().upper().startswith(("SELECT", "UPDATE", "DELETE"))
+    }
+    assert consultas
+
+    conn = connect_atual("qualquer_coisa.db")
+    try:
+        for sql in consultas:
+            plano = [linha[3] for linha in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+            for detalhe in plano:
+                if detalhe.startswith("SCAN"):
+                    assert "INDEX" in detalhe, f"Varredura sem índice em: {sql}\n{plano}"
+    finally:
+        conn.close()
+
+
+def test_init_db_preenche_epoch_de_banco_antigo():
+    """
+    Bancos criados antes das colunas *_epoch (inclusive com datas no formato
+    legado) devem ser migrados pelo init_db.
+    """
+    conn = database.sqlite3.connect("qualquer_coisa.db")
+    conn.execute("PRAGMA user_version = 0")
+    conn.execute("DROP TABLE assinaturas")
+    conn.execute("""
+        CREATE TABLE assinaturas(
+            user_id INTEGER PRIMARY KEY,
+            username TEXT NOT NULL,
+            data_expiracao TEXT NOT NULL,
+            plano TEXT NOT NULL,
+            data_ativacao TEXT NOT NULL,
+            status TEXT NOT NULL,
+            ultimo_aviso TEXT
+        )
+    """)
+    conn.execute(
+        "INSERT INTO assinaturas VALUES (1, 'Iso', '2025-12-31 00:00:00', 'P', '2025-12-01 10:00:00', 'ATIVA', NULL)"
+    )
+    conn.execute(
+        "INSERT INTO assinaturas VALUES (2, 'Legado', '15/01/2024 10:30:00', 'P', '01/01/2024 08:00:00', 'ATIVA', '14/01/2024 09:00:00')"
+    )
+    conn.commit()
+    conn.close()
+
+    database.fechar_conexoes()
+    assert database.init_db() is True
+
+    with database.obter_gerenciador().leitura() as conn:
+        linhas = dict(
+            (row[0], row[1:])
+            for row in conn.execute(
+                "SELECT user_id, data_expiracao_epoch, data_ativacao_epoch, ultimo_aviso_epoch FROM assinaturas"
+            )
+        )
+
+    assert linhas[1][0] == database.para_epoch(datetime.datetime(2025, 12, 31))
+    assert linhas[1][2] is None
+    assert linhas[2][0] == database.para_epoch(datetime.datetime(2024, 1, 15, 10, 30))
+    assert linhas[2][1] == database.para_epoch(datetime.datetime(2024, 1, 1, 8, 0))
+    assert linhas[2][2] == database.para_epoch(datetime.datetime(2024, 1, 14, 9, 0))
+
+
+def test_parse_datetime_db_iso_legado_e_invalido(monkeypatch):
+    """
+    ISO é o caminho normal; o formato legado ainda é aceito mas conta no contador.
+    """
+    monkeypatch.setattr(database, "_contador_formato_legado", 0)
+
+    assert database.parse_datetime_db("2025-12-31 23:59:59") == datetime.datetime(2025, 12, 31, 23, 59, 59)
+    assert database.contador_formato_legado() == 0
+
+    assert database.parse_datetime_db("15/01/2024 10:30:00") == datetime.datetime(2024, 1, 15, 10, 30)
+    assert database.parse_datetime_db("15/01/2024") == datetime.datetime(2024, 1, 15)
+    assert database.contador_formato_legado() == 2
+
+    assert database.parse_datetime_db("valor_estranho") is None
+    assert database.parse_datetime_db(None) is None
+    assert database.parse_datetime_db("") is None
+
+
+def test_normalizar_datas_legadas_em_lotes():
+    """
+    A normalização reescreve as datas legadas em ISO, lote a lote,
+    até não restar nada (retorno 0).
+    """
+    with database.obter_gerenciador().escrita() as conn:
+        conn.executemany(
+            "INSERT INTO assinaturas (user_id, username, data_expiracao, plano, data_ativacao, status, ultimo_aviso) "
+            "VALUES (?, ?, ?, 'P', ?, 'ATIVA', ?)",
+            [
+                (1, "A", "15/01/2024 10:30:00", "01/01/2024 08:00:00", None),
+                (2, "B", "2025-12-31 00:00:00", "2025-12-01 00:00:00", "14/01/2024 09:00:00"),
+                (3, "C", "20/02/2024 00:00:00", "2024-01-20 00:00:00", None),
+                (4, "D", "2025-06-30 00:00:00", "2025-06-01 00:00:00", None),
+            ],
+        )
+
+    assert database.normalizar_datas_legadas(tamanho_lote=2) == 2
+    assert database.normalizar_datas_legadas(tamanho_lote=2) == 1
+    assert database.normalizar_datas_legadas(tamanho_lote=2) == 0
+
+    a = database.obter_assinatura(1)
+    assert a["data_expiracao"] == "2024-01-15 10:30:00"
+    assert a["data_ativacao"] == "2024-01-01 08:00:00"
+    assert database.obter_assinatura(2)["ultimo_aviso"] == "2024-01-14 09:00:00"
+    assert database.obter_assinatura(4)["data_expiracao"] == "2025-06-30 00:00:00"
+
+
+def test_cache_serve_leituras_repetidas_sem_ir_ao_banco(monkeypatch):
+    """
+    Depois da primeira leitura, obter_assinatura deve vir do cache
+    (acerto) sem pedir conexão de leitura ao gerenciador.
+    """
+    data_exp = datetime.datetime.now() + timedelta(days=30)
+    database.adicionar_assinatura(10, "Cacheado", data_exp, "Plano 30 dias")
+    database.obter_assinatura(10)  # já está em cache pela escrita
+
+    def leitura_proibida():
+        raise AssertionError("não deveria consultar o banco")
+
+    monkeypatch.setattr(database.obter_gerenciador(), "leitura", leitura_proibida)
+    antes = database.estatisticas_cache()["acertos"]
+
+    assert database.obter_assinatura(10)["username"] == "Cacheado"
+    assert database.obter_assinaturas_por_ids([10]) == {10: database.obter_assinatura(10)}
+    assert database.estatisticas_cache()["acertos"] >= antes + 2
+
+
+def test_cache_write_through_em_status_e_aviso():
+    """
+    Escritas devem refletir imediatamente no que o cache devolve.
+    """
+    data_exp = datetime.datetime.now() + timedelta(days=3)
+    assert database.obter_assinatura(20) is None  # "não existe" fica em cache
+
+    database.adicionar_assinatura(20, "WriteThrough", data_exp, "Plano 30 dias")
+    assert database.obter_assinatura(20)["status"] == "ATIVA"
+
+    database.registrar_aviso(20, "AVISO_3_DIAS")
+    assert database.obter_assinatura(20)["ultimo_aviso"] is not None
+
+    database.atualizar_status_assinatura(20, "EXPIRADA", "teste")
+    assinatura = database.obter_assinatura(20)
+    assert assinatura["status"] == "EXPIRADA"
+
+    # o que está em cache é exatamente o que está no banco
+    with database.obter_gerenciador().leitura() as conn:
+        linha = conn.execute(
+            f"SELECT {database.COLUNAS_ASSINATURA} FROM assinaturas WHERE user_id = 20"
+        ).fetchone()
+    assert database._linha_para_dict(linha) == assinatura
+
+
+def test_cache_lru_e_ttl():
+    """
+    O cache descarta o item menos usado ao passar do limite
+    e considera expirado o que passou do TTL.
+    """
+    agora = [0.0]
+    cache = database.CacheAssinaturas(tamanho_maximo=2, ttl=10, relogio=lambda: agora[0])
+
+    cache.guardar(1, ("a",))
+    cache.guardar(2, ("b",))
+    assert cache.obter(1) == (True, ("a",))  # 1 passa a ser o mais recente
+    cache.guardar(3, ("c",))                 # despeja o 2
+
+    assert cache.obter(2) == (False, None)
+    assert cache.obter(3) == (True, ("c",))
+    assert cache.estatisticas()["despejos"] == 1
+
+    agora[0] = 11
+    assert cache.obter(1) == (False, None)
+
+
+def _contar_historico():
+    with database.obter_gerenciador().leitura() as conn:
+        return conn.execute("SELECT COUNT(*) FROM historico").fetchone()[0]
+
+
+def test_historico_bufferizado_grava_por_tamanho_e_no_fechamento(monkeypatch):
+    """
+    Eventos do histórico ficam no buffer até o lote encher (uma transação só)
+    e o que sobrou é gravado quando as conexões são fechadas.
+    """
+    buffer = database.BufferHistorico(lote_maximo=3, intervalo=60)
+    monkeypatch.setattr(database, "_historico", buffer)
+    data_exp = datetime.datetime.now() + timedelta(days=2)
+    database.adicionar_assinaturas_em_lote(
+        [(i, f"User{i}", data_exp, "Plano 30 dias") for i in range(1, 5)]
+    )
+
+    database.registrar_aviso(1, "AVISO_3_DIAS")
+    database.atualizar_status_assinatura(2, "EXPIRADA", "teste")
+    assert _contar_historico() == 0
+    assert buffer.estatisticas()["pendentes"] == 2
+
+    database.registrar_aviso(3, "AVISO_3_DIAS")  # completa o lote
+    assert _contar_historico() == 3
+    stats = buffer.estatisticas()
+    assert stats["pendentes"] == 0
+    assert stats["descargas"] == 1
+    assert stats["maior_lote"] == 3
+
+    database.registrar_aviso(4, "AVISO_HOJE")
+    database.fechar_conexoes()
+    assert _contar_historico() == 4
+
+    with database.obter_gerenciador().leitura() as conn:
+        acoes = conn.execute("SELECT user_id, acao FROM historico ORDER BY id").fetchall()
+    assert acoes == [(1, "AVISO"), (2, "STATUS_EXPIRADA"), (3, "AVISO"), (4, "AVISO")]
+
+
+def test_historico_imediato_e_por_tempo(monkeypatch):
+    """
+    imediato=True grava o evento na mesma transação da mudança de status;
+    os demais são gravados pelo timer depois do intervalo.
+    """
+    buffer = database.BufferHistorico(lote_maximo=100, intervalo=0.05)
+    monkeypatch.setattr(database, "_historico", buffer)
+    data_exp = datetime.datetime.now() + timedelta(days=2)
+    database.adicionar_assinatura(1, "User1", data_exp, "Plano 30 dias")
+
+    database.atualizar_status_assinatura(1, "EXPIRADA", "kick", imediato=True)
+    assert _contar_historico() == 1
+    assert buffer.estatisticas()["pendentes"] == 0
+
+    database.registrar_aviso(1, "AVISO_HOJE")
+    assert _contar_historico() == 1
+
+    limite = time.monotonic() + 2
+    while _contar_historico() < 2 and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert _contar_historico() == 2
+    assert buffer.estatisticas()["descargas"] == 1
+
+
+def test_registros_assinatura_vem_com_datas_convertidas():
+    """
+    O row factory monta registros Assinatura (com __slots__) já com datetime;
+    resumo, iteração e busca por ids devolvem o mesmo registro.
+    """
+    data_exp = datetime.datetime.now().replace(microsecond=0) + timedelta(days=2)
+    database.adicionar_assinatura(1, "User1", data_exp, "Plano 30 dias")
+    database.registrar_aviso(1, "AVISO_3_DIAS")
+
+    registro = database.obter_registro_assinatura(1)
+    assert isinstance(registro, database.Assinatura)
+    assert not hasattr(registro, "__dict__")
+    assert registro.data_expiracao == data_exp
+    assert isinstance(registro.data_ativacao, datetime.datetime)
+    assert isinstance(registro.ultimo_aviso, datetime.datetime)
+    assert registro[1] == "User1"
+
+    resumo = database.obter_resumo_assinaturas()
+    assert resumo["ativas"] == [registro]
+    assert list(database.iterar_assinaturas(como_registro=True)) == [registro]
+    assert database.obter_registros_por_ids([1, 2]) == {1: registro}
+    assert database.como_assinatura(database.obter_assinatura(1)) == registro
+    assert database.obter_registro_assinatura(2) is None
+
+
+def test_membros_pendentes_versao_protege_marcacao_durante_rodada():
+    """
+    Remarcar um usuário enquanto a rodada roda muda a versão: limpar a versão lida
+    não apaga a marcação nova. A virada marca só quem entrou numa janela de ação.
+    """
+    database.init_db()
+    assert database.marcar_pendentes([1, 2, 2], "ENTRADA") == 2
+    lidos = database.obter_pendentes()
+    assert sorted(lidos) == [(1, 1), (2, 1)]
+
+    database.marcar_pendentes([2], "ATUALIZACAO_MEMBRO")
+    assert database.limpar_pendentes(lidos) == 1
+    assert database.obter_pendentes() == [(2, 2)]
+    database.limpar_pendentes(database.obter_pendentes())
+
+    hoje = datetime.date(2025, 3, 10)
+    meio_dia = datetime.datetime.combine(hoje, datetime.time(12, 0))
+    database.adicionar_assinaturas_em_lote([
+        (10, "Em3", meio_dia + timedelta(days=3), "Plano 30 dias"),
+        (11, "Hoje", meio_dia, "Plano 30 dias"),
+        (12, "Ontem", meio_dia - timedelta(days=1), "Plano 30 dias"),
+        (13, "Em2", meio_dia + timedelta(days=2), "Plano 30 dias"),
+        (14, "Anteontem", meio_dia - timedelta(days=2), "Plano 30 dias"),
+    ])
+    assert database.marcar_pendentes_virada(hoje) == 3
+    assert sorted(user_id for user_id, _ in database.obter_pendentes()) == [10, 11, 12]
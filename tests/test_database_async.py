@@ -0,0 +1,136 @@
+# tests/test_database_async.py
+import asyncio
+import datetime
+import threading
+import time
+from datetime import timedelta
+
+import pytest
+
+import database
+import database_async
+
+
+@pytest.mark.asyncio
+async def test_versao_assincrona_grava_e_le_no_banco():
+    """
+    As funções awaitable devem ter o mesmo resultado das síncronas.
+    """
+    data_exp = datetime.datetime.now() + timedelta(days=30)
+    ok = await database_async.adicionar_assinatura(77, "AsyncUser", data_exp, "Plano 30 dias")
+    assert ok is True
+
+    assinatura = await database_async.obter_assinatura(77)
+    assert assinatura is not None
+    assert assinatura["username"] == "AsyncUser"
+    assert assinatura == database.obter_assinatura(77)
+
+
+@pytest.mark.asyncio
+async def test_chamadas_rodam_fora_da_thread_do_event_loop(monkeypatch):
+    """
+    O trabalho de banco deve acontecer nas threads do executor,
+    nunca na thread que roda o event loop.
+    """
+    threads = []
+
+    def fake_obter_assinatura(user_id):
+        threads.append(threading.current_thread())
+        return None
+
+    monkeypatch.setattr(database, "obter_assinatura", fake_obter_assinatura)
+
+    await database_async.obter_assinatura(1)
+
+    assert len(threads) == 1
+    assert threads[0] is not threading.current_thread()
+    assert threads[0].name.startswith("database")
+
+
+@pytest.mark.asyncio
+async def test_escrita_lenta_nao_trava_o_event_loop(monkeypatch):
+    """
+    Enquanto uma operação de banco demora, outras corrotinas
+    (como o heartbeat do gateway) continuam rodando.
+    """
+    def escrita_lenta(user_id, status, motivo=""):
+        time.sleep(0.3)
+        return True
+
+    monkeypatch.setattr(database, "atualizar_status_assinatura", escrita_lenta)
+
+    batidas = 0
+
+    async def heartbeat():
+        nonlocal batidas
+        while True:
+            await asyncio.sleep(0.01)
+            batidas += 1
+
+    tarefa = asyncio.create_task(heartbeat())
+    ok = await database_async.atualizar_status_assinatura(1, "EXPIRADA", "teste")
+    tarefa.cancel()
+
+    assert ok is True
+    # Com o loop travado teríamos 0 batidas durante os 300 ms
+    assert batidas >= 10
+
+
+@pytest.mark.asyncio
+async def test_iterar_assinaturas_assincrono_em_lotes_e_devolve_conexao():
+    """
+    O iterador assíncrono entrega as linhas buscando os lotes no executor,
+    e parar no meio devolve a conexão de leitura ao pool.
+    """
+    data_exp = datetime.datetime.now() + timedelta(days=30)
+    await database_async.adicionar_assinaturas_em_lote(
+        [(i, f"User{i}", data_exp + timedelta(days=i), "Plano 30 dias") for i in range(1, 11)]
+    )
+
+    ids = [linha[0] async for linha in database_async.iterar_assinaturas(tamanho_lote=3)]
+    assert ids == list(range(1, 11))
+
+    iterador = database_async.iterar_assinaturas(tamanho_lote=3, ordem="user_id", decrescente=True)
+    primeiros = []
+    async for linha in iterador:
+        primeiros.append(linha[0])
+        if len(primeiros) == 4:
+            break
+    await iterador.aclose()
+    assert primeiros == [10, 9, 8, 7]
+
+    gerenciador = database.obter_gerenciador()
+    leitores_abertos = len(gerenciador._todas) - (gerenciador._conn_escrita is not None)
+    assert gerenciador._leitores.qsize() == leitores_abertos
+
+
+@pytest.mark.asyncio
+async def test_pool_de_leitura_esgotado_vira_erro_e_escritas_seguem(monkeypatch):
+    """
+    Com todos os leitores presos em iteradores abertos, uma leitura a mais
+    desiste depois do timeout em vez de travar, e as escritas continuam
+    tendo thread no executor.
+    """
+    monkeypatch.setattr(database, "TIMEOUT_POOL_LEITURA", 0.2)
+    data_exp = datetime.datetime.now() + timedelta(days=30)
+    await database_async.adicionar_assinaturas_em_lote(
+        [(i, f"User{i}", data_exp, "Plano 30 dias") for i in range(1, 6)]
+    )
+
+    iteradores = [database_async.iterar_assinaturas(tamanho_lote=1) for _ in range(database.TAMANHO_POOL_LEITURA)]
+    for iterador in iteradores:
+        await iterador.__anext__()
+
+    with pytest.raises(TimeoutError):
+        with database.obter_gerenciador().leitura():
+            pass
+    # As funções do módulo tratam o erro como sempre: log e valor neutro
+    assert await asyncio.wait_for(database_async.obter_todas_assinaturas(), timeout=5) == []
+    assert await asyncio.wait_for(
+        database_async.atualizar_status_assinatura(1, "EXPIRADA", "teste"), timeout=5
+    ) is True
+
+    for iterador in iteradores:
+        await iterador.aclose()
+    assinatura = await database_async.obter_assinatura(1)
+    assert assinatura["status"] == "EXPIRADA"
@@ -0,0 +1,123 @@
+# tests/test_despachante.py
+import asyncio
+from types import SimpleNamespace
+
+import discord
+import pytest
+
+from despachante import BaldeTokens, Despachante, criar_baldes
+
+
+class RelogioFalso:
+    """Tempo virtual: dormir só avança o relógio (e cede a vez às outras tarefas)."""
+
+    def __init__(self):
+        self.agora = 0.0
+
+    def __call__(self):
+        return self.agora
+
+    async def dormir(self, segundos):
+        self.agora += max(segundos, 0)
+        await asyncio.sleep(0)
+
+
+def _erro_429(retry_after):
+    resposta = SimpleNamespace(status=429, reason="Too Many Requests", headers={"Retry-After": str(retry_after)})
+    return discord.HTTPException(resposta, "rate limited")
+
+
+@pytest.mark.asyncio
+async def test_balde_respeita_taxa_da_rota():
+    """Depois da rajada inicial (capacidade), as chamadas saem na taxa configurada."""
+    relogio = RelogioFalso()
+    balde = BaldeTokens(taxa=2.0, capacidade=5, relogio=relogio, dormir=relogio.dormir)
+
+    momentos = []
+    for _ in range(15):
+        await balde.adquirir()
+        momentos.append(relogio.agora)
+
+    assert momentos[:5] == [0.0] * 5
+    # 10 chamadas além da rajada a 2/s -> 5 segundos
+    assert momentos[-1] == pytest.approx(5.0)
+
+
+@pytest.mark.asyncio
+async def test_despachante_repete_429_e_registra_resultados():
+    """Um 429 pausa a rota pelo retry-after e a chamada é repetida; outros erros são relançados."""
+    relogio = RelogioFalso()
+    despachante = Despachante(concorrencia=4, relogio=relogio, dormir=relogio.dormir)
+    chamadas = []
+
+    async def enviar(texto):
+        chamadas.append((texto, relogio.agora))
+        if len(chamadas) == 1:
+            raise _erro_429(2.5)
+        return texto.upper()
+
+    async def proibido():
+        resposta = SimpleNamespace(status=403, reason="Forbidden")
+        raise discord.Forbidden(resposta, "sem permissão")
+
+    assert await despachante.chamar("mensagem", enviar, "oi", user_id=10) == "OI"
+    assert chamadas[1][1] == pytest.approx(2.5)
+
+    with pytest.raises(discord.Forbidden):
+        await despachante.chamar("kick", proibido, user_id=11)
+
+    ok, falha = despachante.resultados
+    assert (ok.rota, ok.user_id, ok.ok, ok.tentativas) == ("mensagem", 10, True, 2)
+    assert (falha.rota, falha.user_id, falha.ok) == ("kick", 11, False)
+    assert isinstance(falha.erro, discord.Forbidden)
+
+    resumo = despachante.resumo()
+    assert resumo["acoes"] == 2 and resumo["ok"] == 1 and resumo["falhas"] == 1
+    assert resumo["limitadas"] == 1
+    assert resumo["por_rota"]["kick"] == {"ok": 0, "falhas": 1}
+
+
+@pytest.mark.asyncio
+async def test_despachante_limita_concorrencia():
+    """Nunca há mais tarefas rodando do que a concorrência configurada."""
+    despachante = Despachante(concorrencia=3)
+    rodando = 0
+    maximo = 0
+
+    async def tarefa():
+        nonlocal rodando, maximo
+        rodando += 1
+        maximo = max(maximo, rodando)
+        await asyncio.sleep(0.001)
+        rodando -= 1
+
+    async def falha():
+        raise RuntimeError("erro isolado")
+
+    await despachante.executar_todas([tarefa() for _ in range(20)] + [falha()])
+
+    assert maximo == 3
+    assert rodando == 0
+
+
+@pytest.mark.asyncio
+async def test_despachantes_com_os_mesmos_baldes_dividem_o_limite():
+    """Despachantes que compartilham os baldes somam as chamadas no mesmo limite da rota."""
+    relogio = RelogioFalso()
+    baldes = criar_baldes({"kick": (2.0, 5)}, relogio, relogio.dormir)
+    checagem = Despachante(relogio=relogio, dormir=relogio.dormir, baldes=baldes)
+    drenagem = Despachante(relogio=relogio, dormir=relogio.dormir, baldes=baldes)
+
+    async def kick():
+        return relogio.agora
+
+    momentos = await asyncio.gather(
+        *(checagem.chamar("kick", kick) for _ in range(10)),
+        *(drenagem.chamar("kick", kick) for _ in range(10)),
+    )
+
+    # Rajada de 5 e depois 2/s para as 20 chamadas juntas: 15 além da rajada -> 7,5 s
+    assert sorted(momentos)[:5] == [0.0] * 5
+    assert max(momentos) == pytest.approx(7.5)
+    # Cada despachante guarda só os próprios resultados
+    assert len(checagem.resultados) == len(drenagem.resultados) == 10
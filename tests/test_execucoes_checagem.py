@@ -0,0 +1,218 @@
+# tests/test_execucoes_checagem.py
+import asyncio
+import datetime
+import random
+from collections import Counter
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import database
+import execucoes_checagem
+import cogs.tasks as tasks_module
+from cogs.tasks import ChecagemAssinaturas
+
+
+class Queda(BaseException):
+    """Simula o processo morrendo: não é capturada pelos except Exception da checagem."""
+
+
+class Falhas:
+    """Conta as chamadas ao Discord e derruba tudo a partir da chamada 'limite'."""
+
+    def __init__(self):
+        self.limite = None
+        self.chamadas = 0
+        self.morto = False
+
+    def checar(self):
+        if self.morto:
+            raise Queda()
+        self.chamadas += 1
+        if self.limite is not None and self.chamadas >= self.limite:
+            self.morto = True
+            raise Queda()
+
+
+class DM:
+    def __init__(self, membro):
+        self.membro = membro
+
+    async def send(self, content=None, **kwargs):
+        self.membro.falhas.checar()
+        self.membro.efeitos["dm"] += 1
+
+
+class Membro:
+    bot = False
+
+    def __init__(self, user_id, guild, falhas):
+        self.id = user_id
+        self.name = f"User{user_id}"
+        self.mention = f"<@{user_id}>"
+        self.guild = guild
+        self.falhas = falhas
+        self.efeitos = Counter()
+
+    async def create_dm(self):
+        self.falhas.checar()
+        return DM(self)
+
+    async def remove_roles(self, role, **kwargs):
+        self.falhas.checar()
+        self.efeitos["cargo"] += 1
+
+    async def kick(self, **kwargs):
+        self.falhas.checar()
+        self.efeitos["kick"] += 1
+        self.guild.presentes.pop(self.id, None)
+
+
+class Guild:
+    owner = None
+
+    def __init__(self):
+        self.presentes = {}
+        self.roles = [SimpleNamespace(name=tasks_module.CARGO_ASSINANTE_NOME)]
+
+    def get_member(self, user_id):
+        return self.presentes.get(user_id)
+
+    def get_channel(self, channel_id):
+        return None
+
+
+class Bot:
+    def __init__(self, guild):
+        self.guild = guild
+
+    def get_guild(self, _server_id):
+        return self.guild
+
+    async def wait_until_ready(self):
+        # Os loops da cog ficam parados; o teste chama a checagem diretamente
+        await asyncio.Event().wait()
+
+
+def test_execucao_cursor_e_retomada():
+    """O cursor avança só até a primeira posição não concluída; a retomada traz o resto e as marcas."""
+    hoje = datetime.date(2025, 3, 10)
+    alvos = [(10 + i, hoje, None) for i in range(5)]
+    execucao = execucoes_checagem.iniciar_execucao("banco", hoje, alvos)
+    execucao.concluir_membro(0)
+    execucao.concluir_membro(2)
+    execucao.marcar(11, execucoes_checagem.STATUS_EXPIRADA)
+    assert execucao.cursor == 1
+
+    retomada, restantes = execucoes_checagem.retomar_execucao(hoje)
+    assert retomada.id == execucao.id
+    assert [posicao for posicao, *_ in restantes] == [1, 3, 4]
+    assert retomada.feita(11, execucoes_checagem.STATUS_EXPIRADA)
+    retomada.concluir_membro(1)
+    assert retomada.cursor == 3
+
+    retomada.finalizar({"processados": 5})
+    assert execucoes_checagem.retomar_execucao(hoje) is None
+
+    # Rodada interrompida de outro dia é abandonada, não retomada
+    execucoes_checagem.iniciar_execucao("banco", hoje, alvos)
+    assert execucoes_checagem.retomar_execucao(hoje + timedelta(days=1)) is None
+    assert execucoes_checagem.retomar_execucao(hoje) is None
+
+
+def test_retomada_ignora_a_rodada_viva_da_propria_instancia():
+    """Uma instância não retoma (nem abandona) a própria rodada em andamento; outra instância retoma."""
+    hoje = datetime.date(2025, 3, 10)
+    alvos = [(10 + i, hoje, None) for i in range(3)]
+    execucao = execucoes_checagem.iniciar_execucao("banco", hoje, alvos, instancia="a")
+    execucao.concluir_membro(0)
+
+    assert execucoes_checagem.retomar_execucao(hoje, instancia="a") is None
+    assert execucoes_checagem.retomar_execucao(hoje + timedelta(days=1), instancia="a") is None
+
+    retomada, restantes = execucoes_checagem.retomar_execucao(hoje, instancia="b")
+    assert retomada.id == execucao.id
+    assert [posicao for posicao, *_ in restantes] == [1, 2]
+
+
+def test_finalizar_apaga_rodadas_encerradas_antigas():
+    """Ao finalizar ficam só as últimas rodadas encerradas; a rodada aberta e seu plano não são tocados."""
+    hoje = datetime.date(2025, 3, 10)
+    alvos = [(10 + i, hoje, None) for i in range(3)]
+    for _ in range(4):
+        execucoes_checagem.iniciar_execucao("banco", hoje, alvos).finalizar(manter=2)
+    # Abandonada (de outro dia) com plano e marcas
+    abandonada = execucoes_checagem.iniciar_execucao("banco", hoje - timedelta(days=1), alvos)
+    abandonada.marcar(10, execucoes_checagem.AVISO_HOJE)
+    assert execucoes_checagem.retomar_execucao(hoje) is None
+    aberta = execucoes_checagem.iniciar_execucao("banco", hoje, alvos)
+    aberta.marcar(11, execucoes_checagem.AVISO_HOJE)
+
+    ultima = execucoes_checagem.iniciar_execucao("banco", hoje, alvos)
+    ultima.finalizar(manter=2)
+
+    with database.obter_gerenciador().leitura() as conn:
+        rodadas = conn.execute("SELECT id, status FROM execucoes_checagem ORDER BY id").fetchall()
+        planos = {linha[0] for linha in conn.execute("SELECT execucao_id FROM execucoes_membros")}
+        marcas = {linha[0] for linha in conn.execute("SELECT execucao_id FROM execucoes_acoes")}
+    assert rodadas == [
+        (abandonada.id, execucoes_checagem.ABANDONADA),
+        (aberta.id, execucoes_checagem.EM_ANDAMENTO),
+        (ultima.id, execucoes_checagem.CONCLUIDA),
+    ]
+    assert planos == {aberta.id}
+    assert marcas == {aberta.id}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("semente", [1, 2, 3, 4, 5])
+async def test_checagem_derrubada_em_pontos_aleatorios_nao_repete_acoes(monkeypatch, semente):
+    """
+    A checagem é derrubada em chamadas aleatórias ao Discord e reiniciada até terminar.
+    Cada DM, remoção de cargo e kick acontece exatamente uma vez.
+    """
+    rng = random.Random(semente)
+    agora = datetime.datetime.now()
+    meio_dia = datetime.datetime.combine(agora.date(), datetime.time(12, 0))
+    prazos = {}
+    for user_id in range(1, 31):
+        prazos[user_id] = rng.choice([3, 0, -1, -4, 10])
+    database.adicionar_assinaturas_em_lote([
+        (user_id, f"User{user_id}", meio_dia + timedelta(days=dias), "Plano 30 dias")
+        for user_id, dias in prazos.items()
+    ])
+
+    falhas = Falhas()
+    guild = Guild()
+    membros = {user_id: Membro(user_id, guild, falhas) for user_id in prazos}
+    guild.presentes.update(membros)
+    bot = Bot(guild)
+
+    quedas = 0
+    for tentativa in range(100):
+        falhas.chamadas = 0
+        falhas.morto = False
+        falhas.limite = rng.randint(1, 12) if tentativa < 99 else None
+        cog = ChecagemAssinaturas(bot)
+        try:
+            await cog._rodar_checar_assinaturas_uma_vez(modo="banco")
+            break
+        except Queda:
+            quedas += 1
+            # Deixa as tarefas ainda em voo baterem na queda antes do "reinício"
+            await asyncio.sleep(0.02)
+        finally:
+            cog.cog_unload()
+
+    assert quedas > 0
+    for user_id, dias in prazos.items():
+        efeitos = membros[user_id].efeitos
+        if dias in (3, 0):
+            assert efeitos == Counter(dm=1), (user_id, dias, efeitos)
+        elif dias < 0:
+            assert efeitos == Counter(dm=1, cargo=1, kick=1), (user_id, dias, efeitos)
+            assert database.obter_assinatura(user_id)["status"] == "EXPIRADA"
+        else:
+            assert not efeitos
+    assert execucoes_checagem.retomar_execucao(agora.date()) is None
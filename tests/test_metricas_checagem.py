@@ -0,0 +1,77 @@
+# tests/test_metricas_checagem.py
+import asyncio
+
+import pytest
+
+import metricas_checagem
+from metricas_checagem import DESLIGADAS, MetricasChecagem
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 0.0
+
+    def __call__(self):
+        return self.agora
+
+
+def test_percentis_e_cronometro():
+    resumo = metricas_checagem.resumir_amostras([i / 1000 for i in range(100, 0, -1)])
+    assert resumo["n"] == 100
+    assert (resumo["p50"], resumo["p95"], resumo["p99"], resumo["max"]) == (0.05, 0.095, 0.099, 0.1)
+    assert metricas_checagem.resumir_amostras([])["p99"] == 0.0
+
+    relogio = Relogio()
+    metricas = MetricasChecagem("banco", relogio=relogio)
+    for duracao in (1.0, 2.0, 3.0):
+        with metricas.acao("sqlite"):
+            relogio.agora += duracao
+    with metricas.fase("alvos"):
+        relogio.agora += 0.5
+    metricas.contar("vencida")
+    metricas.contar("importado_apelido", 4)
+
+    relatorio = metricas.relatorio({"removidos": 1, "detalhes": ["x"]})
+    assert relatorio["acoes"]["sqlite"]["total"] == 6.0
+    assert relatorio["acoes"]["sqlite"]["p50"] == 2.0
+    assert relatorio["fases"]["alvos"]["n"] == 1
+    assert relatorio["ramos"] == {"vencida": 1, "importado_apelido": 4}
+    assert relatorio["resumo"] == {"removidos": 1}
+    assert relatorio["duracao"] == 6.5
+
+
+@pytest.mark.asyncio
+async def test_metricas_por_contexto_nao_se_misturam():
+    """Cada rodada ativa as suas métricas; as tarefas criadas nela herdam o contexto."""
+    assert metricas_checagem.atuais() is DESLIGADAS
+    with DESLIGADAS.fase("x"):
+        DESLIGADAS.contar("vencida")
+
+    async def rodada(nome, quantidade):
+        metricas = MetricasChecagem(nome)
+        token = metricas_checagem.ativar(metricas)
+        try:
+            async def membro():
+                await asyncio.sleep(0)
+                metricas_checagem.atuais().contar(nome)
+            await asyncio.gather(*(membro() for _ in range(quantidade)))
+        finally:
+            metricas_checagem.desativar(token)
+        return metricas.ramos
+
+    assert await asyncio.gather(rodada("a", 3), rodada("b", 5)) == [{"a": 3}, {"b": 5}]
+    assert metricas_checagem.atuais() is DESLIGADAS
+
+
+def test_relatorio_persistido_e_retencao():
+    ids = [
+        metricas_checagem.salvar_relatorio(MetricasChecagem(f"rodada{i}").relatorio(), manter=3)
+        for i in range(5)
+    ]
+    relatorio_id, relatorio = metricas_checagem.obter_relatorio()
+    assert relatorio_id == ids[-1]
+    assert relatorio["modo"] == "rodada4"
+    assert metricas_checagem.obter_relatorio(ids[0]) is None
+    assert metricas_checagem.obter_relatorio(ids[2])[1]["modo"] == "rodada2"
+    texto = metricas_checagem.formatar_relatorio(relatorio_id, relatorio)
+    assert texto.startswith(f"Relatório #{relatorio_id}")
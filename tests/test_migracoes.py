@@ -0,0 +1,88 @@
+# tests/test_migracoes.py
+import sqlite3
+
+import pytest
+
+import database
+import migracoes
+
+
+def _conectar_banco_teste():
+    return database.sqlite3.connect("qualquer_coisa.db")  # redirecionado pelo monkeypatch
+
+
+def test_init_db_grava_versao_mais_recente():
+    """
+    Depois do init_db o PRAGMA user_version deve estar na última migração
+    e rodar de novo não deve alterar nada.
+    """
+    conn = _conectar_banco_teste()
+    assert migracoes.versao_atual(conn) == migracoes.versao_mais_recente()
+    conn.close()
+
+    assert database.init_db() is True
+
+    conn = _conectar_banco_teste()
+    assert migracoes.versao_atual(conn) == migracoes.versao_mais_recente()
+    conn.close()
+
+
+def test_migracao_reconstroi_tabela_antiga_e_faz_backup(tmp_path):
+    """
+    Um banco no formato antigo (sem username) é reconstruído com INSERT ... SELECT
+    e um backup é criado antes, ao lado do arquivo do banco.
+    """
+    caminho = tmp_path / "antigo.db"
+    conn = sqlite3.connect(caminho)
+    conn.execute("CREATE TABLE assinaturas(user_id INTEGER PRIMARY KEY, data_expiracao TEXT, plano TEXT)")
+    conn.executemany(
+        "INSERT INTO assinaturas VALUES (?, ?, ?)",
+        [(1, "2025-12-31 00:00:00", "Plano 30 dias"), (2, "31/01/2026 00:00:00", "Plano 90 dias")],
+    )
+    conn.commit()
+
+    versao = migracoes.aplicar_migracoes(conn)
+
+    assert versao == migracoes.versao_mais_recente()
+    linhas = conn.execute(
+        "SELECT user_id, username, plano, status, data_expiracao_epoch FROM assinaturas ORDER BY user_id"
+    ).fetchall()
+    assert [linha[:4] for linha in linhas] == [
+        (1, "Usuario_1", "Plano 30 dias", "ATIVA"),
+        (2, "Usuario_2", "Plano 90 dias", "ATIVA"),
+    ]
+    assert all(linha[4] is not None for linha in linhas)
+    conn.close()
+
+    backups = list(tmp_path.glob("antigo_backup_v0_*.db"))
+    assert len(backups) == 1
+    conn_backup = sqlite3.connect(backups[0])
+    assert conn_backup.execute("SELECT COUNT(*) FROM assinaturas").fetchone()[0] == 2
+    assert "username" not in {c[1] for c in conn_backup.execute("PRAGMA table_info(assinaturas)")}
+    conn_backup.close()
+
+
+def test_falha_em_um_passo_desfaz_o_passo_e_mantem_a_versao(monkeypatch, tmp_path):
+    """
+    Se um passo falhar, a transação daquele passo é desfeita e a versão
+    continua sendo a do último passo concluído.
+    """
+    def passo_quebrado(cursor):
+        cursor.execute("CREATE TABLE tabela_temporaria(x INTEGER)")
+        raise RuntimeError("falha simulada")
+
+    monkeypatch.setattr(
+        migracoes,
+        "MIGRACOES",
+        migracoes.MIGRACOES + [(migracoes.versao_mais_recente() + 1, "passo quebrado", passo_quebrado)],
+    )
+
+    conn = sqlite3.connect(tmp_path / "falha.db")
+    with pytest.raises(RuntimeError):
+        migracoes.aplicar_migracoes(conn, backup=False)
+
+    assert migracoes.versao_atual(conn) == migracoes.versao_mais_recente() - 1
+    tabelas = {linha[0] for linha in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert "tabela_temporaria" not in tabelas
+    assert "assinaturas" in tabelas
+    conn.close()
@@ -0,0 +1,227 @@
+# tests/test_outbox.py
+import datetime
+import time
+from types import SimpleNamespace
+
+import discord
+import pytest
+
+import database
+import outbox
+
+
+class DM:
+    def __init__(self, membro):
+        self.membro = membro
+
+    async def send(self, content=None, **kwargs):
+        self.membro.chamadas.append(("dm", content))
+
+
+class Membro:
+    def __init__(self, user_id, guild, falhar_kick=None):
+        self.id = user_id
+        self.name = f"User{user_id}"
+        self.guild = guild
+        self.falhar_kick = falhar_kick
+        self.chamadas = []
+
+    async def create_dm(self):
+        return DM(self)
+
+    async def remove_roles(self, cargo, reason=None):
+        self.chamadas.append(("cargo", cargo.name))
+
+    async def kick(self, reason=None):
+        if self.falhar_kick is not None:
+            raise self.falhar_kick
+        self.chamadas.append(("kick", reason))
+
+
+class Guild:
+    def __init__(self):
+        self.membros = {}
+        self.roles = [SimpleNamespace(name="ASSINANTE")]
+
+    def get_member(self, user_id):
+        return self.membros.get(user_id)
+
+
+def _status(chave):
+    with database.obter_gerenciador().leitura() as conn:
+        return conn.execute("SELECT status, tentativas FROM outbox WHERE chave = ?", (chave,)).fetchone()
+
+
+def _efeitos_remocao(user_id):
+    return [
+        outbox.efeito_dm(f"REMOCAO:{user_id}:DM", user_id, "Sua assinatura expirou"),
+        outbox.efeito_cargo(f"REMOCAO:{user_id}:CARGO", user_id, "ASSINANTE"),
+        outbox.efeito_kick(f"REMOCAO:{user_id}:KICK", user_id, "Expirada"),
+    ]
+
+
+def test_efeitos_gravados_com_o_status_e_chave_idempotente():
+    """Os efeitos entram na transação da mudança de status; a mesma chave não é enfileirada duas vezes."""
+    database.adicionar_assinatura(1, "User1", datetime.datetime.now(), "Plano 30 dias")
+    assert database.atualizar_status_assinatura(1, "EXPIRADA", "teste", efeitos=_efeitos_remocao(1))
+    assert database.atualizar_status_assinatura(1, "EXPIRADA", "de novo", efeitos=_efeitos_remocao(1))
+    assert database.enfileirar_efeitos(_efeitos_remocao(1)) == 0
+
+    assert database.obter_assinatura(1)["status"] == "EXPIRADA"
+    with database.obter_gerenciador().leitura() as conn:
+        linhas = conn.execute("SELECT chave, tipo, status FROM outbox ORDER BY id").fetchall()
+    assert linhas == [
+        ("REMOCAO:1:DM", outbox.DM, outbox.PENDENTE),
+        ("REMOCAO:1:CARGO", outbox.REMOVER_CARGO, outbox.PENDENTE),
+        ("REMOCAO:1:KICK", outbox.KICK, outbox.PENDENTE),
+    ]
+
+
+def test_backoff_exponencial_e_dead_letter():
+    """Falha transitória volta com espera crescente; esgotadas as tentativas (ou falha definitiva) o efeito morre."""
+    database.enfileirar_efeitos([
+        outbox.efeito_dm("A", 1, "oi"),
+        outbox.efeito_dm("B", 2, "oi"),
+    ])
+    agora = time.time()
+    esperas = []
+    for tentativa in range(1, outbox.MAX_TENTATIVAS_OUTBOX + 1):
+        reservados = outbox.reservar_efeitos("w1", chaves=["A"], agora=agora)
+        assert [linha[1] for linha in reservados] == ["A"]
+        status = outbox.falhar_efeito(reservados[0][0], "timeout", agora=agora)
+        with database.obter_gerenciador().leitura() as conn:
+            proxima = conn.execute("SELECT proxima_tentativa FROM outbox WHERE chave = 'A'").fetchone()[0]
+        if tentativa < outbox.MAX_TENTATIVAS_OUTBOX:
+            assert status == outbox.PENDENTE
+            # Ainda em backoff: não é reservado
+            assert outbox.reservar_efeitos("w1", chaves=["A"], agora=agora) == []
+            esperas.append(proxima - agora)
+            agora = proxima
+        else:
+            assert status == outbox.MORTO
+    assert all(b > a for a, b in zip(esperas, esperas[1:]))
+    assert _status("A") == (outbox.MORTO, outbox.MAX_TENTATIVAS_OUTBOX)
+
+    (efeito_b,) = outbox.reservar_efeitos("w1", chaves=["B"])
+    assert outbox.falhar_efeito(efeito_b[0], "Forbidden", definitivo=True) == outbox.MORTO
+
+    assert outbox.estatisticas_outbox()["mortos"] == 2
+    assert outbox.reenfileirar_mortos(user_id=1) == 1
+    assert _status("A") == (outbox.PENDENTE, 0)
+
+
+def test_reserva_de_outro_dono_so_volta_com_prazo_vencido_ou_pela_chave():
+    database.enfileirar_efeitos([outbox.efeito_kick("K", 1)])
+    agora = time.time()
+    assert len(outbox.reservar_efeitos("morto", agora=agora)) == 1
+    # O loop de fundo de outro executor respeita a reserva até ela vencer
+    assert outbox.reservar_efeitos("vivo", agora=agora) == []
+    assert len(outbox.reservar_efeitos("vivo", agora=agora + outbox.RESERVA_SEGUNDOS + 1)) == 1
+    # Quem enfileirou a chave a reassume direto (instância anterior caiu)
+    assert len(outbox.reservar_efeitos("novo", chaves=["K"], agora=agora)) == 1
+
+
+@pytest.mark.asyncio
+async def test_drenar_executa_em_ordem_e_conta_vazao():
+    guild = Guild()
+    membro = Membro(1, guild)
+    sem_permissao = Membro(2, guild, falhar_kick=discord.Forbidden(
+        SimpleNamespace(status=403, reason="Forbidden"), "Missing Permissions"
+    ))
+    guild.membros = {1: membro, 2: sem_permissao}
+    bot = SimpleNamespace(get_guild=lambda _id: guild)
+    database.enfileirar_efeitos(_efeitos_remocao(1) + _efeitos_remocao(2))
+
+    executor = outbox.ExecutorEfeitos(bot)
+    assert await executor.drenar() == 6
+    assert await executor.drenar() == 0
+
+    assert membro.chamadas == [("dm", "Sua assinatura expirou"), ("cargo", "ASSINANTE"), ("kick", "Expirada")]
+    assert _status("REMOCAO:2:KICK") == (outbox.MORTO, 1)
+    estatisticas = outbox.estatisticas_outbox()
+    assert estatisticas["pendentes"] == 0
+    assert estatisticas["concluidos"] == 5
+    assert estatisticas["concluidos_janela"] == 5
+    assert estatisticas["mortos"] == 1
+
+
+@pytest.mark.asyncio
+async def test_processar_agora_informa_efeito_com_outro_executor():
+    """
+    Efeito reservado por outro executor da mesma instância não é tomado: volta NA_FILA.
+    Efeito já concluído conta como ok.
+    """
+    guild = Guild()
+    membro = Membro(1, guild)
+    guild.membros = {1: membro}
+    bot = SimpleNamespace(get_guild=lambda _id: guild)
+    database.enfileirar_efeitos(_efeitos_remocao(1))
+    chaves = ["REMOCAO:1:DM", "REMOCAO:1:CARGO", "REMOCAO:1:KICK"]
+
+    checagem = outbox.ExecutorEfeitos(bot, instancia="i1", nome="checagem")
+    drenagem = outbox.ExecutorEfeitos(bot, instancia="i1", nome="drenagem")
+    outbox.reservar_efeitos(drenagem.dono, chaves=chaves[2:])
+
+    resultados = await checagem.processar_agora(chaves, membro=membro)
+    assert resultados == {"REMOCAO:1:DM": None, "REMOCAO:1:CARGO": None, "REMOCAO:1:KICK": outbox.NA_FILA}
+    assert ("kick", "Expirada") not in membro.chamadas
+
+    assert await checagem.processar_agora(chaves[:1], membro=membro) == {"REMOCAO:1:DM": None}
+    assert len(membro.chamadas) == 2
+
+
+@pytest.mark.asyncio
+async def test_remocao_do_cargo_pelo_outbox_nao_vira_remocao_manual():
+    """
+    A checagem grava EXPIRADA com o efeito de remover o cargo; quando o efeito roda,
+    o on_member_update do bot não marca a assinatura como REMOVIDA nem mexe no apelido.
+    Uma remoção manual (assinatura ATIVA) continua sendo registrada.
+    """
+    import main
+
+    guild = Guild()
+    cargo = guild.roles[0]
+    apelidos = []
+
+    class MembroComCargo(Membro):
+        async def edit(self, nick=None, **kwargs):
+            apelidos.append((self.id, nick))
+
+        async def remove_roles(self, cargo, reason=None):
+            await super().remove_roles(cargo, reason=reason)
+            antes = SimpleNamespace(id=self.id, guild=guild, roles=[cargo])
+            await main.on_member_update(antes, self)
+
+    membros = {user_id: MembroComCargo(user_id, guild) for user_id in (1, 2)}
+    for membro in membros.values():
+        membro.roles = []
+    guild.membros = membros
+    bot = SimpleNamespace(get_guild=lambda _id: guild)
+    expiracao = datetime.datetime.now() - datetime.timedelta(days=1)
+    for user_id in membros:
+        database.adicionar_assinatura(user_id, f"User{user_id}", expiracao, "Plano 30 dias")
+
+    database.atualizar_status_assinatura(
+        1, "EXPIRADA", "Assinatura expirada", imediato=True,
+        efeitos=[outbox.efeito_cargo("REMOCAO:1:CARGO", 1, cargo.name)],
+    )
+    executor = outbox.ExecutorEfeitos(bot, instancia="i1", nome="checagem")
+    assert await executor.processar_agora(["REMOCAO:1:CARGO"], membro=membros[1]) == {"REMOCAO:1:CARGO": None}
+
+    # Cargo tirado à mão de quem ainda está ATIVA
+    await membros[2].remove_roles(cargo)
+    database.descarregar_historico()
+
+    assert database.obter_assinatura(1)["status"] == "EXPIRADA"
+    assert database.obter_assinatura(2)["status"] == "REMOVIDA"
+    assert apelidos == [(2, None)]
+    with database.obter_gerenciador().leitura() as conn:
+        manuais = [linha[0] for linha in conn.execute(
+            "SELECT user_id FROM historico WHERE detalhes LIKE '%removido manualmente%'"
+        )]
+    assert manuais == [2]
+    # O reset do apelido da remoção manual também saiu pelo outbox
+    with database.obter_gerenciador().leitura() as conn:
+        assert conn.execute("SELECT tipo, status FROM outbox WHERE user_id = 2").fetchall() == [
+            (outbox.APELIDO, outbox.CONCLUIDO)
+        ]
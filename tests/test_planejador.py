@@ -0,0 +1,61 @@
+# tests/test_planejador.py
+import datetime
+from datetime import timedelta
+
+import database
+import planejador
+from despachante import LIMITES_ROTAS, estimar_duracao
+
+
+def _contar_historico():
+    with database.obter_gerenciador().leitura() as conn:
+        return conn.execute("SELECT COUNT(*) FROM historico").fetchone()[0]
+
+
+def test_plano_agrupa_acoes_sem_efeito_colateral():
+    """
+    O plano segue as mesmas regras da checagem (janela de 3 dias, hoje, vencidas;
+    aviso recente pula o lembrete) e não grava nada no banco.
+    """
+    agora = datetime.datetime(2025, 3, 10, 15, 0)
+    meio_dia = datetime.datetime(2025, 3, 10, 12, 0)
+    database.adicionar_assinaturas_em_lote([
+        (1, "Em3", meio_dia + timedelta(days=3), "Plano 30 dias"),
+        (2, "Hoje", meio_dia, "Plano 30 dias"),
+        (3, "Ontem", meio_dia - timedelta(days=1), "Plano 30 dias"),
+        (4, "Em3Avisado", meio_dia + timedelta(days=3), "Plano 30 dias"),
+        (5, "Em10", meio_dia + timedelta(days=10), "Plano 30 dias"),
+        (6, "Saiu", meio_dia - timedelta(days=5), "Plano 30 dias"),
+        (7, "Encerrada", meio_dia - timedelta(days=2), "Plano 30 dias"),
+    ])
+    database.atualizar_status_assinatura(7, "EXPIRADA", imediato=True)
+    with database.obter_gerenciador().escrita() as conn:
+        conn.execute(
+            "UPDATE assinaturas SET ultimo_aviso_epoch = ? WHERE user_id = 4",
+            (database.para_epoch(agora - timedelta(hours=2)),),
+        )
+    historico_antes = _contar_historico()
+
+    plano = planejador.planejar_checagem(agora=agora, presente=lambda user_id: user_id != 6)
+
+    assert [u for u, _ in plano["acoes"][planejador.AVISO_3_DIAS]] == [1]
+    assert [u for u, _ in plano["acoes"][planejador.AVISO_HOJE]] == [2]
+    assert [u for u, _ in plano["acoes"][planejador.REMOCAO]] == [3]
+    assert plano["avisos_recentes"] == 1
+    assert plano["fora_do_servidor"] == 1
+    assert plano["chamadas_por_rota"] == {"dm_criar": 3, "mensagem": 3, "membro_editar": 1, "kick": 1}
+    assert _contar_historico() == historico_antes
+    assert database.obter_assinatura(3)["status"] == "ATIVA"
+
+    texto = planejador.formatar_plano(plano)
+    assert "Remoções (DM + cargo + kick): **1**" in texto
+    arquivo = planejador.escrever_plano(plano)
+    assert "ID: 3 | Expira: 09/03/2025" in arquivo
+
+
+def test_estimativa_usa_rota_mais_lenta():
+    """Com muitas chamadas, a estimativa é dominada pela taxa do balde da rota mais lenta."""
+    taxa, capacidade = LIMITES_ROTAS["kick"]
+    chamadas = {"kick": 1000 + capacidade, "mensagem": 10}
+    assert estimar_duracao(chamadas) == 1000 / taxa
+    assert estimar_duracao({}) == 0
@@ -0,0 +1,144 @@
+# tests/test_publicador_resumo.py
+import pytest
+
+from despachante import Despachante
+from publicador_resumo import LIMITE_MENSAGEM, PublicadorResumo
+
+
+class Relogio:
+    """Tempo virtual: o despachante 'dorme' avançando o relógio"""
+
+    def __init__(self):
+        self.agora = 0.0
+
+    def __call__(self):
+        return self.agora
+
+    async def dormir(self, segundos):
+        self.agora += segundos
+
+
+class Mensagem:
+    def __init__(self, canal, content):
+        self.canal = canal
+        self.content = content
+
+    async def edit(self, content=None, **kwargs):
+        self.canal.edicoes.append(self.canal.relogio())
+        self.content = content
+
+
+class Canal:
+    def __init__(self, relogio):
+        self.relogio = relogio
+        self.enviadas = []
+        self.edicoes = []
+
+    async def send(self, content=None, embed=None, file=None):
+        mensagem = Mensagem(self, content)
+        self.enviadas.append((mensagem, embed, file))
+        return mensagem
+
+
+def _publicador(intervalo=10):
+    relogio = Relogio()
+    canal = Canal(relogio)
+    despachante = Despachante(relogio=relogio, dormir=relogio.dormir)
+    return relogio, canal, PublicadorResumo(canal, despachante, intervalo=intervalo, relogio=relogio)
+
+
+async def _simular(relogio, publicador, quantidade, segundos_por_membro=0.05):
+    publicador.esperar(quantidade)
+    linhas = [f"👤 <@{100000 + i}> (user{i}) | Expirou em 01/03/2025 | {i % 30 + 1} dia(s) de atraso"
+              for i in range(quantidade)]
+    for linha in linhas:
+        await relogio.dormir(segundos_por_membro)
+        await publicador.adicionar_detalhe(linha)
+        await publicador.membro_concluido()
+    await publicador.finalizar(f"📋 **RESUMO DA CHECAGEM DE ASSINATURAS**\n🚫 Removidos: **{quantidade}**")
+    return linhas
+
+
+@pytest.mark.asyncio
+async def test_5000_removidos_paginas_arquivo_e_progresso_limitado():
+    relogio, canal, publicador = _publicador()
+    linhas = await _simular(relogio, publicador, 5000)
+
+    progresso, *resto = canal.enviadas
+    paginas = [embed for _, embed, _ in resto if embed is not None]
+    arquivos = [arquivo for _, _, arquivo in resto if arquivo is not None]
+
+    # Páginas publicadas durante a rodada, dentro do limite do embed, sem repetir linhas
+    assert len(paginas) == publicador.max_paginas
+    assert all(len(embed.description) <= 4096 for embed in paginas)
+    publicadas = [linha for embed in paginas for linha in embed.description.split("\n")]
+    assert publicadas == linhas[:len(publicadas)]
+
+    # O arquivo tem a lista completa: nenhum detalhe se perde
+    (arquivo,) = arquivos
+    assert arquivo.fp.read().decode("utf-8").splitlines() == linhas
+
+    # Mensagem de progresso editada no máximo a cada 'intervalo' segundos; no fim vira o resumo
+    intermediarias = canal.edicoes[:-1]
+    assert all(b - a >= publicador.intervalo for a, b in zip(intermediarias, intermediarias[1:]))
+    assert len(intermediarias) <= relogio.agora / publicador.intervalo + 1
+    assert progresso[0].content.startswith("📋 **RESUMO DA CHECAGEM")
+    assert "5000" in progresso[0].content
+    assert all(len(mensagem.content or "") <= LIMITE_MENSAGEM for mensagem, _, _ in canal.enviadas)
+    # Tudo pela rota do canal, fora do balde das DMs aos membros
+    assert {resultado.rota for resultado in publicador.despachante.resultados} == {"canal"}
+
+
+@pytest.mark.asyncio
+async def test_detalhes_medios_em_paginas_sem_arquivo():
+    relogio, canal, publicador = _publicador(intervalo=3600)
+    linhas = await _simular(relogio, publicador, 150)
+
+    resumo, *paginas = canal.enviadas
+    assert all(arquivo is None for _, _, arquivo in canal.enviadas)
+    assert [linha for _, embed, _ in paginas for linha in embed.description.split("\n")] == linhas
+    assert f"em **{len(paginas)}** página(s)" in resumo[0].content
+
+
+@pytest.mark.asyncio
+async def test_poucos_detalhes_numa_mensagem_so():
+    relogio, canal, publicador = _publicador()
+    linhas = await _simular(relogio, publicador, 3)
+
+    ((mensagem, embed, arquivo),) = canal.enviadas
+    assert embed is None and arquivo is None
+    assert mensagem.content.endswith("**Detalhes dos removidos:**\n" + "\n".join(linhas))
+
+
+class CanalInstavel(Canal):
+    """Canal em que o envio das páginas (embeds) falha a partir da 'falhar_em'-ésima"""
+
+    def __init__(self, relogio, falhar_em):
+        super().__init__(relogio)
+        self.falhar_em = falhar_em
+        self.paginas = 0
+
+    async def send(self, content=None, embed=None, file=None):
+        if embed is not None:
+            self.paginas += 1
+            if self.paginas >= self.falhar_em:
+                raise RuntimeError("503 Service Unavailable")
+        return await super().send(content, embed=embed, file=file)
+
+
+@pytest.mark.asyncio
+async def test_pagina_que_falha_nao_perde_linhas_e_vai_no_arquivo():
+    """O erro no envio de uma página não sobe para a checagem; a lista completa vai no arquivo."""
+    relogio = Relogio()
+    canal = CanalInstavel(relogio, falhar_em=2)
+    despachante = Despachante(relogio=relogio, dormir=relogio.dormir)
+    publicador = PublicadorResumo(canal, despachante, intervalo=3600, relogio=relogio)
+
+    linhas = await _simular(relogio, publicador, 150)
+
+    assert publicador.paginas_enviadas == 1
+    assert publicador.falhas_envio == 1
+    resumo = canal.enviadas[0][0]
+    assert "arquivo anexo" in resumo.content
+    (arquivo,) = [arquivo for _, _, arquivo in canal.enviadas if arquivo is not None]
+    assert arquivo.fp.read().decode("utf-8").splitlines() == linhas
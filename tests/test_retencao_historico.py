@@ -0,0 +1,77 @@
+# tests/test_retencao_historico.py
+import datetime
+import os
+
+import database
+import retencao_historico
+
+
+def _inserir(linhas):
+    """linhas: (user_id, acao, detalhes, data_hora)"""
+    with database.obter_gerenciador().escrita() as conn:
+        conn.executemany(database.SQL_INSERIR_HISTORICO, linhas)
+
+
+def _dia(dias_atras, hora="10:00:00"):
+    dia = datetime.datetime.now(datetime.timezone.utc).date() - datetime.timedelta(days=dias_atras)
+    return f"{dia.isoformat()} {hora}"
+
+
+def _hot():
+    with database.obter_gerenciador().leitura() as conn:
+        return conn.execute("SELECT user_id, acao, detalhes FROM historico ORDER BY id").fetchall()
+
+
+def test_compactar_avisos_resume_por_usuario_e_dia():
+    """
+    Avisos repetidos do mesmo usuário no mesmo dia (já encerrado) viram uma linha só;
+    avisos de hoje, avisos únicos e mudanças de status ficam como estão.
+    """
+    _inserir([
+        (1, "AVISO", "Tipo: AVISO_3_DIAS", _dia(3, "08:00:00")),
+        (1, "AVISO", "Tipo: AVISO_3_DIAS", _dia(3, "20:00:00")),
+        (1, "STATUS_EXPIRADA", "kick", _dia(3, "21:00:00")),
+        (1, "AVISO", "Tipo: AVISO_HOJE", _dia(2)),
+        (2, "AVISO", "Tipo: AVISO_HOJE", _dia(0, "00:00:01")),
+        (2, "AVISO", "Tipo: AVISO_HOJE", _dia(0, "00:00:02")),
+    ])
+
+    assert retencao_historico.compactar_avisos(tamanho_lote=1) == 1
+    assert retencao_historico.compactar_avisos() == 0
+
+    linhas = _hot()
+    assert len(linhas) == 5
+    assert linhas[0] == (1, "AVISO_RESUMO", "2 avisos: Tipo: AVISO_3_DIAS | Tipo: AVISO_3_DIAS")
+    assert [acao for _, acao, _ in linhas[1:]] == ["STATUS_EXPIRADA", "AVISO", "AVISO", "AVISO"]
+
+
+def test_arquivar_lote_move_linhas_antigas_para_arquivo_mensal(tmp_path):
+    """
+    Linhas mais antigas que a retenção vão para um arquivo por mês, em lotes,
+    e continuam visíveis na consulta de auditoria do usuário.
+    """
+    pasta = str(tmp_path / "arquivo")
+    _inserir([
+        (1, "STATUS_ATIVA", "", "2024-01-05 10:00:00"),
+        (1, "AVISO", "Tipo: AVISO_3_DIAS", "2024-01-28 10:00:00"),
+        (2, "AVISO", "Tipo: AVISO_HOJE", "2024-02-01 10:00:00"),
+        (1, "STATUS_EXPIRADA", "kick", _dia(1)),
+    ])
+
+    assert retencao_historico.arquivar_lote(dias=90, tamanho_lote=2, pasta=pasta) == 2
+    assert retencao_historico.arquivar_lote(dias=90, tamanho_lote=2, pasta=pasta) == 1
+    assert retencao_historico.arquivar_lote(dias=90, tamanho_lote=2, pasta=pasta) == 0
+
+    assert _hot() == [(1, "STATUS_EXPIRADA", "kick")]
+    assert retencao_historico.meses_arquivados(pasta) == ["2024-01", "2024-02"]
+    assert os.path.exists(os.path.join(pasta, "historico_2024_01.db"))
+
+    auditoria = retencao_historico.obter_historico_usuario(1, pasta=pasta)
+    assert [linha[2] for linha in auditoria] == ["STATUS_ATIVA", "AVISO", "STATUS_EXPIRADA"]
+    so_janeiro = retencao_historico.obter_historico_usuario(2, meses=["2024-01"], pasta=pasta)
+    assert so_janeiro == []
+    assert len(retencao_historico.obter_historico_usuario(1, incluir_arquivo=False, pasta=pasta)) == 1
+
+    # nenhum banco anexado fica pendurado na conexão de escrita
+    with database.obter_gerenciador().escrita() as conn:
+        assert [linha[1] for linha in conn.execute("PRAGMA database_list")] == ["main"]
@@ -7,6 +7,7 @@ import discord
 
 import utils
 import database
+from database_async import adicionar_assinatura
 
 
 class DummyRole:
@@ -89,12 +90,13 @@ async def test_liberar_usuario_cria_cargo_e_atualiza_nick(monkeypatch):
     # interceptar chamadas ao adicionar_assinatura
     called = {}
 
-    def fake_adicionar_assinatura(user_id, username, data_expiracao, plano):
+    async def fake_adicionar_assinatura(user_id, username, data_expiracao, plano, efeitos=None):
         called["user_id"] = user_id
         called["username"] = username
         called["plano"] = plano
         called["data_expiracao"] = data_expiracao
-        return True
+        # Grava de verdade: apelido e cargo saem pelo outbox gravado junto
+        return await adicionar_assinatura(user_id, username, data_expiracao, plano, efeitos=efeitos)
 
     monkeypatch.setattr(utils, "adicionar_assinatura", fake_adicionar_assinatura)
 
@@ -130,12 +132,13 @@ async def test_atualizar_nickname_renova_data(monkeypatch):
 
     called = {}
 
-    def fake_adicionar_assinatura(user_id, username, data_expiracao, plano):
+    async def fake_adicionar_assinatura(user_id, username, data_expiracao, plano, efeitos=None):
         called["user_id"] = user_id
         called["username"] = username
         called["plano"] = plano
         called["data_expiracao"] = data_expiracao
-        return True
+        # Grava de verdade: apelido e cargo saem pelo outbox gravado junto
+        return await adicionar_assinatura(user_id, username, data_expiracao, plano, efeitos=efeitos)
 
     monkeypatch.setattr(utils, "adicionar_assinatura", fake_adicionar_assinatura)
 
@@ -145,3 +148,50 @@ async def test_atualizar_nickname_renova_data(monkeypatch):
     assert member.nick.startswith("UserTeste | ")
     # plano deve conter "Renovado 30 dias"
     assert "Renovado 30 dias" in called["plano"]
+
+
+class MembroSemPermissao(DummyMember):
+    async def edit(self, **kwargs):
+        raise discord.Forbidden(SimpleNamespace(status=403, reason="Forbidden"), "Missing Permissions")
+
+
+class MembroInstavel(DummyMember):
+    async def edit(self, **kwargs):
+        raise discord.HTTPException(SimpleNamespace(status=503, reason="Service Unavailable"), "indisponível")
+
+
+def _efeitos_gravados(user_id):
+    with database.obter_gerenciador().leitura() as conn:
+        return sorted(conn.execute(
+            "SELECT tipo, status FROM outbox WHERE user_id = ?", (user_id,)
+        ).fetchall())
+
+
+@pytest.mark.asyncio
+async def test_liberar_usuario_sem_permissao_de_apelido_grava_e_da_o_cargo():
+    """
+    Apelido e cargo saem pelo outbox gravado com a assinatura: sem permissão para o
+    apelido, o admin recebe o aviso, mas a assinatura e o cargo ficam.
+    """
+    member = MembroSemPermissao()
+    guild = DummyGuild(member, DummyChannel(), existing_roles=[DummyRole("ASSINANTE")])
+
+    msg = await utils.liberar_usuario(guild, member, dias=30)
+
+    assert msg == "⚠ Não tenho permissão para mudar o apelido desse usuário."
+    assert database.obter_assinatura(member.id)["status"] == "ATIVA"
+    assert len(member.roles_added) == 1
+    assert _efeitos_gravados(member.id) == [("ADICIONAR_CARGO", "CONCLUIDO"), ("APELIDO", "MORTO")]
+
+
+@pytest.mark.asyncio
+async def test_atualizar_nickname_com_falha_transitoria_deixa_apelido_no_outbox():
+    """A renovação é gravada e o apelido que falhou fica pendente para o loop de fundo."""
+    member = MembroInstavel(display_name="UserTeste | 01/01/2024")
+
+    await utils.atualizar_nickname(member, dias=30)
+
+    assinatura = database.obter_assinatura(member.id)
+    assert assinatura["plano"] == "Renovado 30 dias"
+    assert member.nick == "UserTeste | 01/01/2024"
+    assert _efeitos_gravados(member.id) == [("APELIDO", "PENDENTE")]
@@ -2,31 +2,39 @@
 import discord
 import datetime
 from datetime import timedelta
-import re
 import logging
-from database import DB_DATETIME_FORMAT, DISPLAY_FORMAT, LEGACY_DATETIME_FORMAT, adicionar_assinatura
+import apelidos
+import database
+from database import DISPLAY_FORMAT, como_assinatura, parse_datetime_db
+import outbox
+from database_async import adicionar_assinatura, executar, marcar_pendentes
 from config import CARGO_ASSINANTE_NOME, APOSTAS_CHANNEL_ID
 
 logger = logging.getLogger(__name__)
 
+def formatar_data_display(dt) -> str:
+    """datetime já convertido (ex.: campos de Assinatura) para dd/mm/YYYY"""
+    return dt.strftime(DISPLAY_FORMAT) if dt else "N/D"
+
+async def _executar_efeitos(member, efeitos, cargo=None) -> dict:
+    """
+    Executa já os efeitos recém-gravados no outbox para o membro.
+    Retorna {chave: None (ok), a exceção ou NA_FILA}; falhas transitórias ficam com o loop de fundo.
+    """
+    return await outbox.ExecutorEfeitos().processar_agora(
+        [chave for chave, *_ in efeitos], membro=member, cargo=cargo
+    )
+
 def parse_db_datetime_to_display(raw: str) -> str:
     """
     Converte string de data/hora do banco (ISO ou legado) para dd/mm/YYYY.
     """
     if not raw:
         return "N/D"
-    for fmt in (DB_DATETIME_FORMAT, LEGACY_DATETIME_FORMAT):
-        try:
-            dt = datetime.datetime.strptime(raw, fmt)
-            return dt.strftime(DISPLAY_FORMAT)
-        except ValueError:
-            continue
-    # tentativa final com só a parte da data no formato legado
-    try:
-        dt = datetime.datetime.strptime(raw[:10], "%d/%m/%Y")
-        return dt.strftime(DISPLAY_FORMAT)
-    except Exception:
+    dt = parse_datetime_db(raw)
+    if dt is None:
         return raw  # devolve como veio, pra não perder informação
+    return dt.strftime(DISPLAY_FORMAT)
 
 
 async def liberar_usuario(guild: discord.Guild, user: discord.User, dias: int) -> str:
@@ -49,17 +57,7 @@ async def liberar_usuario(guild: discord.Guild, user: discord.User, dias: int) -
     if member is None:
         return "⚠ O usuário não está no servidor ou não foi encontrado."
     
-    nickname_atual = member.display_name
-    nickname_limpo = re.sub(r"\s*\|\s*\d{2}/\d{2}/\d{4}$", "", nickname_atual).strip()
-    novo_apelido = f"{nickname_limpo} | {data_formatada}"
-    
-    try:
-        await member.edit(nick=novo_apelido)
-        logger.info(f"Nickname de {member.name} atualizado para {novo_apelido}.")
-    except discord.Forbidden:
-        return "⚠ Não tenho permissão para mudar o apelido desse usuário."
-    except Exception as e:
-        return f"⚠ Erro ao editar apelido: {e}"
+    novo_apelido = apelidos.apelido_com_data(member.display_name, data_expiracao)
     
     cargo_assinante = discord.utils.get(guild.roles, name=CARGO_ASSINANTE_NOME)
     if cargo_assinante is None:
@@ -70,13 +68,31 @@ async def liberar_usuario(guild: discord.Guild, user: discord.User, dias: int) -
         )
         logger.info(f"Criado cargo '{CARGO_ASSINANTE_NOME}' no servidor.")
         
-    await member.add_roles(cargo_assinante, reason=f"Usuário liberado ({nome_plano})")
-    
     canal_assinantes = guild.get_channel(APOSTAS_CHANNEL_ID)
     if canal_assinantes:
         await canal_assinantes.set_permissions(cargo_assinante, view_channel=True, send_messages=True)
     
-    adicionar_assinatura(member.id, member.name, data_expiracao, nome_plano)
+    # Apelido e cargo vão para o outbox junto com a assinatura e são executados já;
+    # falhas transitórias ficam para o loop de fundo
+    chave = f"LIBERACAO:{member.id}:{data_expiracao.isoformat(timespec='seconds')}"
+    efeitos = [
+        outbox.efeito_apelido(f"{chave}:APELIDO", member.id, novo_apelido),
+        outbox.efeito_cargo(
+            f"{chave}:CARGO", member.id, cargo_assinante.name, remover=False,
+            motivo=f"Usuário liberado ({nome_plano})",
+        ),
+    ]
+    if not await adicionar_assinatura(member.id, member.name, data_expiracao, nome_plano, efeitos=efeitos):
+        return "⚠ Erro ao registrar a assinatura no banco."
+    await marcar_pendentes([member.id], "LIBERACAO")
+    
+    resultados = await _executar_efeitos(member, efeitos, cargo_assinante)
+    erro_apelido = resultados.get(f"{chave}:APELIDO")
+    if erro_apelido is None:
+        apelidos.indice.atualizar(member.id, novo_apelido)
+        logger.info(f"Nickname de {member.name} atualizado para {novo_apelido}.")
+    elif isinstance(erro_apelido, discord.Forbidden):
+        return "⚠ Não tenho permissão para mudar o apelido desse usuário."
     
     return f"✅ {member.mention} foi liberado no *{nome_plano}! Expira em *{data_formatada}."
 
@@ -84,14 +100,23 @@ async def atualizar_nickname(member: discord.Member, dias: int) -> None:
     """Atualiza o nickname com nova data de expiração"""
     try:
         nova_data = datetime.datetime.now() + timedelta(days=dias)
-        novo_nick = re.sub(r"\s*\|\s*\d{2}/\d{2}/\d{4}$", "", member.display_name).strip() + " | " + nova_data.strftime("%d/%m/%Y")
-        await member.edit(nick=novo_nick)
-        
-        logger.info(f"Nickname de {member.name} atualizado para {novo_nick}.")
+        novo_nick = apelidos.apelido_com_data(member.display_name, nova_data)
+        # O apelido entra no outbox na mesma transação da renovação e é executado já
+        efeitos = [outbox.efeito_apelido(
+            f"APELIDO:{member.id}:{nova_data.isoformat(timespec='seconds')}", member.id, novo_nick
+        )]
+        if not await adicionar_assinatura(member.id, member.name, nova_data, f"Renovado {dias} dias", efeitos=efeitos):
+            return
+        await marcar_pendentes([member.id], "RENOVACAO")
         
-        adicionar_assinatura(member.id, member.name, nova_data, f"Renovado {dias} dias")
-    except discord.Forbidden:
-        logger.error(f"Permissão negada para atualizar o nickname de {member.name}.")
+        (erro,) = (await _executar_efeitos(member, efeitos)).values()
+        if erro is None:
+            apelidos.indice.atualizar(member.id, novo_nick)
+            logger.info(f"Nickname de {member.name} atualizado para {novo_nick}.")
+        elif isinstance(erro, discord.Forbidden):
+            logger.error(f"Permissão negada para atualizar o nickname de {member.name}.")
+        else:
+            logger.warning(f"Falha ao editar o nickname de {member.name} ({erro}); nova tentativa pelo outbox.")
     except Exception as e:
         logger.error(f"Erro ao atualizar o nickname de {member.name}: {e}")
 
@@ -120,20 +145,14 @@ def criar_embed_assinaturas(resumo, author):
     if resumo['ativas']:
         ativas_text = ""
         for i, assinatura in enumerate(resumo['ativas'][:10], 1):
-            username = assinatura[1]
-            raw_data_exp = assinatura[2]
-            plano = assinatura[3]
+            assinatura = como_assinatura(assinatura)
+            username = assinatura.username
+            dt_exp = assinatura.data_expiracao
+            plano = assinatura.plano
             
-            data_exp_display = parse_db_datetime_to_display(raw_data_exp)
+            data_exp_display = formatar_data_display(dt_exp)
             
             try:
-                dt_exp = None
-                for fmt in (DB_DATETIME_FORMAT, LEGACY_DATETIME_FORMAT):
-                    try:
-                        dt_exp = datetime.datetime.strptime(raw_data_exp, fmt)
-                        break
-                    except ValueError:
-                        continue
                 if dt_exp:
                     data_expiracao = dt_exp.date()
                     hoje = datetime.datetime.now().date()
@@ -151,11 +170,12 @@ def criar_embed_assinaturas(resumo, author):
             
             ativas_text += f"{emoji} `{username[:20]:20}` | {data_exp_display} | {plano} | {status}\n"
         
-        if len(resumo['ativas']) > 10:
-            ativas_text += f"\n... e mais {len(resumo['ativas']) - 10} assinaturas ativas"
+        # O resumo traz só as primeiras linhas; o total vem da contagem agregada
+        if resumo['total_ativas'] > 10:
+            ativas_text += f"\n... e mais {resumo['total_ativas'] - 10} assinaturas ativas"
         
         embed.add_field(
-            name=f"✅ ASSINATURAS ATIVAS ({len(resumo['ativas'])})",
+            name=f"✅ ASSINATURAS ATIVAS ({resumo['total_ativas']})",
             value=ativas_text or "Nenhuma assinatura ativa",
             inline=False
         )
@@ -164,22 +184,16 @@ def criar_embed_assinaturas(resumo, author):
     if resumo['pendentes']:
         pendentes_text = ""
         for assinatura in resumo['pendentes'][:5]:
-            username = assinatura[1]
-            raw_data_exp = assinatura[2]
-            plano = assinatura[3]
+            assinatura = como_assinatura(assinatura)
+            username = assinatura.username
+            dt_exp = assinatura.data_expiracao
+            plano = assinatura.plano
             
-            data_exp_display = parse_db_datetime_to_display(raw_data_exp)
+            data_exp_display = formatar_data_display(dt_exp)
             
             try:
-                dt_exp = None
-                for fmt in (DB_DATETIME_FORMAT, LEGACY_DATETIME_FORMAT):
-                    try:
-                        dt_exp = datetime.datetime.strptime(raw_data_exp, fmt)
-                        break
-                    except ValueError:
-                        continue
                 if dt_exp:
-                    data_expiracao = datetime.datetime.strptime(dt_exp, "%d/%m/%Y").date()
+                    data_expiracao = dt_exp.date()
                     hoje = datetime.datetime.now().date()
                     dias_restantes = (data_expiracao - hoje).days
                     
@@ -195,7 +209,7 @@ def criar_embed_assinaturas(resumo, author):
             pendentes_text += f"🔴 `{username[:20]:20}` | {data_exp_display} | {plano} | Vence {status}\n"
         
         embed.add_field(
-            name=f"⚠️ PRÓXIMAS A VENCER ({len(resumo['pendentes'])})",
+            name=f"⚠️ PRÓXIMAS A VENCER ({resumo['total_pendentes']})",
             value=pendentes_text,
             inline=False
         )
@@ -204,16 +218,16 @@ def criar_embed_assinaturas(resumo, author):
     if resumo['expiradas']:
         expiradas_text = ""
         for assinatura in resumo['expiradas'][:5]:
-            username = assinatura[1]
-            raw_data_exp = assinatura[2]
-            plano = assinatura[3]
-            data_exp_display = parse_db_datetime_to_display(raw_data_exp)
+            assinatura = como_assinatura(assinatura)
+            username = assinatura.username
+            plano = assinatura.plano
+            data_exp_display = formatar_data_display(assinatura.data_expiracao)
             expiradas_text += f"❌ `{username[:20]:20}` | {data_exp_display} | {plano}\n"
         
         
         
         embed.add_field(
-            name=f"❌ EXPIRADAS RECENTES ({len(resumo['expiradas'])})",
+            name=f"❌ EXPIRADAS RECENTES ({resumo['total_expiradas']})",
             value=expiradas_text,
             inline=False
         )
@@ -223,26 +237,32 @@ def criar_embed_assinaturas(resumo, author):
     
     return embed
 
-async def gerar_arquivo_assinaturas(resumo, filename='relatorio_assinaturas.txt'):
-    """Gera arquivo TXT com relatório detalhado"""
+def _escrever_relatorio_assinaturas(filename):
+    """Escreve o relatório lendo as assinaturas do banco em lotes (roda no executor do banco)"""
     with open(filename, 'w', encoding='utf-8') as f:
         f.write("RELATÓRIO COMPLETO DE ASSINATURAS\n")
         f.write("=" * 50 + "\n\n")
         
         f.write("ASSINATURAS ATIVAS:\n")
         f.write("-" * 50 + "\n")
-        for assinatura in resumo['ativas']:
-            data_exp_display = parse_db_datetime_to_display(assinatura[2])
+        for assinatura in database.iterar_assinaturas(status='ATIVA', como_registro=True):
+            data_exp_display = formatar_data_display(assinatura.data_expiracao)
             f.write(
-                f"ID: {assinatura[0]} | Usuário: {assinatura[1]} | Expira: {data_exp_display} | Plano: {assinatura[3]}\n"
+                f"ID: {assinatura.user_id} | Usuário: {assinatura.username} | Expira: {data_exp_display} | Plano: {assinatura.plano}\n"
             )
         
         f.write("\nASSINATURAS EXPIRADAS:\n")
         f.write("-" * 50 + "\n")
-        for assinatura in resumo['expiradas']:
-            data_exp_display = parse_db_datetime_to_display(assinatura[2])
+        for assinatura in database.iterar_assinaturas(status='EXPIRADA', como_registro=True):
+            data_exp_display = formatar_data_display(assinatura.data_expiracao)
             f.write(
-                f"ID: {assinatura[0]} | Usuário: {assinatura[1]} | Expirou: {data_exp_display} | Plano: {assinatura[3]}\n"
+                f"ID: {assinatura.user_id} | Usuário: {assinatura.username} | Expirou: {data_exp_display} | Plano: {assinatura.plano}\n"
             )
-    
-    return discord.File(filename)
\ No newline at end of file
+
+async def gerar_arquivo_assinaturas(resumo, filename='relatorio_assinaturas.txt'):
+    """
+    Gera arquivo TXT com relatório detalhado.
+    As linhas vêm do banco em streaming; o resumo só decide se há algo a listar.
+    """
+    await executar(_escrever_relatorio_assinaturas, filename)
+    return discord.File(filename)
@@ -3,7 +3,7 @@ import discord
 from discord.ui import Button, View, Select
 import asyncio
 from config import *
-from database import registrar_aviso, adicionar_assinatura
+from database_async import registrar_aviso, adicionar_assinatura
 import re
 import datetime
 